@@ -0,0 +1,123 @@
+"""Debounced notebook saving on a background thread."""
+import threading
+import time
+from typing import Any, Optional
+
+
+# Changes are written at most once per interval; a burst of edits within it
+# becomes a single save
+SAVE_INTERVAL = 0.5
+
+
+class NotebookSaver:
+    """
+    Collects notebook changes and writes them to a store off the caller's thread.
+
+    save_cell(), delete_cell() and set_order() only record what changed
+    and return immediately, so they can be called from the event loop.
+    A writer thread waits SAVE_INTERVAL after the first change of a burst,
+    then hands everything collected (the latest state of each cell, not
+    every intermediate one) to store.save_changes() in one batch. If a
+    write fails, the batch is kept and retried with the next one.
+
+    The store is any object with save_changes(cells, deleted, order) and
+    compact() (e.g. journal.NotebookJournal).
+    """
+
+    def __init__(self, store: Any, interval: float = SAVE_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._dirty = threading.Condition(self._lock)
+        # Pending changes: cell_id -> latest full cell state, deletions, order
+        self._cells: dict[str, dict] = {}
+        self._deleted: set[str] = set()
+        self._order: Optional[list[str]] = None
+        # Serializes writes between the writer thread and flush()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="notebook-saver", daemon=True)
+        self._thread.start()
+
+    def save_cell(self, cell: dict):
+        """Schedule the full state of a new or changed cell to be written."""
+        with self._lock:
+            self._deleted.discard(cell["id"])
+            self._cells[cell["id"]] = cell
+            self._dirty.notify()
+
+    def delete_cell(self, cell_id: str):
+        """Schedule the deletion of a cell."""
+        with self._lock:
+            self._cells.pop(cell_id, None)
+            self._deleted.add(cell_id)
+            self._dirty.notify()
+
+    def set_order(self, cell_ids: list[str]):
+        """Schedule the display order of the cells to be written."""
+        with self._lock:
+            self._order = list(cell_ids)
+            self._dirty.notify()
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are changes not yet handed to the store."""
+        with self._lock:
+            return self._has_changes()
+
+    def flush(self):
+        """Write all pending changes now, on the calling thread."""
+        with self._write_lock:
+            self._write()
+
+    def close(self):
+        """Flush pending changes, compact the store and stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            self._dirty.notify()
+        self._thread.join(timeout=10)
+        with self._write_lock:
+            self._write()
+            self.store.compact()
+
+    def _has_changes(self) -> bool:
+        return bool(self._cells or self._deleted or self._order is not None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._has_changes() and not self._closed:
+                    self._dirty.wait()
+                if self._closed:
+                    return
+            # Let the rest of the burst arrive before writing
+            time.sleep(self.interval)
+            with self._write_lock:
+                try:
+                    self._write()
+                except Exception as e:
+                    print(f"Error saving notebook: {e}")
+                    with self._lock:
+                        if self._closed:
+                            return
+                    time.sleep(self.interval)  # Retry with the next batch
+
+    def _write(self):
+        """Hand pending changes to the store (caller holds _write_lock)."""
+        with self._lock:
+            if not self._has_changes():
+                return
+            cells, deleted, order = self._cells, self._deleted, self._order
+            self._cells, self._deleted, self._order = {}, set(), None
+        try:
+            self.store.save_changes(list(cells.values()), sorted(deleted), order)
+        except Exception:
+            # Put the batch back under anything newer that arrived meanwhile
+            with self._lock:
+                for cell_id, cell in cells.items():
+                    if cell_id not in self._deleted:
+                        self._cells.setdefault(cell_id, cell)
+                self._deleted |= deleted - self._cells.keys()
+                if self._order is None:
+                    self._order = order
+            raise
@@ -0,0 +1,96 @@
+"""Benchmark: building server messages with Pydantic models vs construct_message().
+
+Run from the backend directory:
+    python bench_messages.py
+
+"validated" is how messages used to be built: the model is instantiated
+(validating every field) and dumped back to a dict, with the encoded rich
+output patched in afterwards. "constructed" is construct_message(), which
+fills in defaults without validating. The last rows time restoring a
+saved DataFrame output, validated as RichOutput vs only encoded.
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from kernel import FRAME_FORMAT_COLUMNAR, serialize_rich_output
+from models import (
+    Cell, ExecutionQueueMessage, ExecutionResultMessage, ExecutionStartedMessage,
+    NotebookStateMessage, RichOutput, construct_message
+)
+from wire import encode_json
+
+
+NUMBER = 2000
+
+
+def _result_fields() -> dict:
+    return {"cell_id": "c1", "status": "success", "output": "result\n" * 5, "error": "",
+            "peak_memory_delta": 4096}
+
+
+def _cell_fields(n: int) -> list[dict]:
+    return [
+        {"id": f"c{i}", "code": f"x{i} = {i}\nx{i} * 2", "output": f"{i}\n", "status": "success",
+         "rich_output_ref": {"digest": f"{i:064x}", "size": 1024} if i % 3 == 0 else None}
+        for i in range(n)
+    ]
+
+
+def _cases(rich_output) -> dict:
+    cells = _cell_fields(50)
+
+    def result_validated():
+        message = ExecutionResultMessage(**_result_fields()).model_dump()
+        message["rich_output"] = rich_output
+        return message
+
+    def result_constructed():
+        return construct_message(ExecutionResultMessage, **_result_fields(), rich_output=rich_output)
+
+    def state_validated():
+        return NotebookStateMessage(cells=[Cell(**cell) for cell in cells], session="s", seq=12).model_dump()
+
+    def state_constructed():
+        return construct_message(
+            NotebookStateMessage, cells=[construct_message(Cell, **cell) for cell in cells], session="s", seq=12
+        )
+
+    return {
+        "execution_started": (
+            lambda: ExecutionStartedMessage(cell_id="c1").model_dump(),
+            lambda: construct_message(ExecutionStartedMessage, cell_id="c1"),
+        ),
+        "execution_queue": (
+            lambda: ExecutionQueueMessage(cell_ids=["c1", "c2", "c3"]).model_dump(),
+            lambda: construct_message(ExecutionQueueMessage, cell_ids=["c1", "c2", "c3"]),
+        ),
+        "execution_result": (result_validated, result_constructed),
+        "notebook_state (50 cells)": (state_validated, state_constructed),
+    }
+
+
+def _ms(fn, number: int = NUMBER) -> float:
+    return timeit.timeit(fn, number=number) / number * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(rng.random((100, 50)), columns=[f"f{i}" for i in range(50)])
+    saved = serialize_rich_output(frame, FRAME_FORMAT_COLUMNAR)
+    rich_output = encode_json(saved)
+
+    print(f"{'message':<28} {'validated':>10} {'constructed':>12} {'speedup':>8}  (ms)")
+    for label, (validated, constructed) in _cases(rich_output).items():
+        assert validated() == constructed()
+        validated_ms, constructed_ms = _ms(validated), _ms(constructed)
+        print(f"{label:<28} {validated_ms:>10.4f} {constructed_ms:>12.4f} {validated_ms / constructed_ms:>7.1f}x")
+
+    validated_ms = _ms(lambda: encode_json(RichOutput(**saved).model_dump()), 200)
+    encoded_ms = _ms(lambda: encode_json(saved), 200)
+    print(f"{'saved DataFrame 100x50':<28} {validated_ms:>10.4f} {encoded_ms:>12.4f} {validated_ms / encoded_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: rich output serialization, per-value (legacy) vs column-at-a-time.
+
+Run from the backend directory:
+    python bench_serialize.py
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from kernel import serialize_rich_output, _safe_value, _convert_to_safe_list, MAX_ROWS
+
+
+NUMBER = 50
+
+
+def legacy_serialize_dataframe(value: pd.DataFrame) -> dict:
+    """The previous implementation: to_dict(records) + _safe_value per cell."""
+    df_display = value.head(MAX_ROWS)
+    records = df_display.to_dict(orient="records")
+    return {
+        "data": _convert_to_safe_list(records),
+        "index": [_safe_value(idx) for idx in df_display.index.tolist()],
+    }
+
+
+def legacy_serialize_ndarray(value: np.ndarray) -> list:
+    """The previous implementation: tolist() + _safe_value per element."""
+    return _convert_to_safe_list(value.tolist())
+
+
+def _frames() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(0)
+    floats = pd.DataFrame(rng.random((100, 50)), columns=[f"f{i}" for i in range(50)])
+    floats.iloc[::7, ::3] = np.nan
+
+    mixed = {}
+    for i in range(50):
+        kind = i % 5
+        if kind == 0:
+            mixed[f"c{i}"] = rng.random(100)
+        elif kind == 1:
+            mixed[f"c{i}"] = rng.integers(0, 1000, 100)
+        elif kind == 2:
+            mixed[f"c{i}"] = rng.random(100) > 0.5
+        elif kind == 3:
+            mixed[f"c{i}"] = [f"s{j}" for j in range(100)]
+        else:
+            mixed[f"c{i}"] = pd.date_range("2024-01-01", periods=100, freq="h")
+    return {"100x50 float (with NaN)": floats, "100x50 mixed": pd.DataFrame(mixed)}
+
+
+def _report(label: str, legacy, vectorized):
+    legacy_ms = timeit.timeit(legacy, number=NUMBER) / NUMBER * 1000
+    vectorized_ms = timeit.timeit(vectorized, number=NUMBER) / NUMBER * 1000
+    print(
+        f"{label:<28} legacy {legacy_ms:8.3f} ms   vectorized {vectorized_ms:8.3f} ms   "
+        f"speedup {legacy_ms / vectorized_ms:5.1f}x"
+    )
+
+
+def main():
+    for label, frame in _frames().items():
+        assert serialize_rich_output(frame)["data"] == legacy_serialize_dataframe(frame)["data"]
+        _report(
+            label,
+            lambda: legacy_serialize_dataframe(frame),
+            lambda: serialize_rich_output(frame),
+        )
+
+    arr = np.random.default_rng(0).random(1000)
+    arr[::10] = np.inf
+    _report("ndarray 1000 float", lambda: legacy_serialize_ndarray(arr), lambda: serialize_rich_output(arr))
+
+    ints = np.arange(1000)
+    _report("ndarray 1000 int", lambda: legacy_serialize_ndarray(ints), lambda: serialize_rich_output(ints))
+
+
+if __name__ == "__main__":
+    main()
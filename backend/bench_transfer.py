@@ -0,0 +1,58 @@
+"""Benchmark: variable transfer through the queue (pickle) vs shared memory.
+
+Run from the backend directory:
+    python bench_transfer.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from kernel import NotebookKernel
+
+
+SIZES_MB = [8, 64, 256]
+REPEATS = 3
+
+
+def _best_of(fn) -> float:
+    """Return the best wall time of REPEATS calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _measure(shm_kernel: NotebookKernel, pickle_kernel: NotebookKernel, label: str, value):
+    shm_kernel.set_variable("value", value)
+    pickle_kernel.set_variable("value", value)
+
+    shm_get = _best_of(lambda: shm_kernel.get_variable("value"))
+    shm_set = _best_of(lambda: shm_kernel.set_variable("value", value))
+    pickle_get = _best_of(lambda: pickle_kernel.get_variable("value"))
+    pickle_set = _best_of(lambda: pickle_kernel.set_variable("value", value))
+
+    print(
+        f"{label:<28} get: pickle {pickle_get:9.1f} ms  shm {shm_get:9.1f} ms  "
+        f"({pickle_get / shm_get:5.1f}x)   set: pickle {pickle_set:9.1f} ms  "
+        f"shm {shm_set:9.1f} ms  ({pickle_set / shm_set:5.1f}x)"
+    )
+
+
+def main():
+    shm_kernel = NotebookKernel()
+    pickle_kernel = NotebookKernel(shm_min_bytes=None)
+    for size_mb in SIZES_MB:
+        n = size_mb * (1 << 20) // 8
+        _measure(shm_kernel, pickle_kernel, f"ndarray float64 {size_mb} MB", np.random.rand(n))
+
+    n = 64 * (1 << 20) // 8 // 8
+    frame = pd.DataFrame(np.random.rand(n, 8), columns=[f"c{i}" for i in range(8)])
+    frame["label"] = "x"
+    _measure(shm_kernel, pickle_kernel, "DataFrame 8 float cols 64 MB", frame)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: ExecutionResultMessage payloads as JSON vs MessagePack with typed arrays,
+and DataFrame rows as columnar JSON vs Arrow IPC.
+
+Run from the backend directory:
+    python bench_wire.py
+
+Encode times start from what the server holds (rich output already encoded
+as JSON by the kernel worker). Decode times are for Python (orjson vs
+msgpack plus typed-array conversion), a stand-in for the browser. The
+DataFrame comparison times the worker's side: serializing and encoding a
+frame's rich output.
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from kernel import FRAME_FORMAT_ARROW, FRAME_FORMAT_COLUMNAR, HAS_PYARROW, serialize_rich_output
+from models import ExecutionResultMessage
+from wire import HAS_MSGPACK, dumps, encode_json, loads
+
+if HAS_MSGPACK:
+    from wire import packb, unpackb
+
+
+NUMBER = 200
+
+
+def _result_message(value, output: str = "") -> dict:
+    message = ExecutionResultMessage(
+        cell_id="c1", status="success", output=output, error="", peak_memory_delta=4096
+    ).model_dump()
+    rich_output = serialize_rich_output(value, FRAME_FORMAT_COLUMNAR) if value is not None else None
+    message["rich_output"] = encode_json(rich_output) if rich_output is not None else None
+    return message
+
+
+def _payloads() -> dict[str, dict]:
+    rng = np.random.default_rng(0)
+    floats = pd.DataFrame(rng.random((100, 50)), columns=[f"f{i}" for i in range(50)])
+    mixed = {}
+    for i in range(50):
+        kind = i % 5
+        if kind == 0:
+            mixed[f"c{i}"] = rng.random(100)
+        elif kind == 1:
+            mixed[f"c{i}"] = rng.integers(0, 1000, 100)
+        elif kind == 2:
+            mixed[f"c{i}"] = rng.random(100) > 0.5
+        elif kind == 3:
+            mixed[f"c{i}"] = [f"s{j}" for j in range(100)]
+        else:
+            mixed[f"c{i}"] = np.where(rng.random(100) > 0.9, np.nan, rng.random(100))
+    with_nan = rng.random(1000)
+    with_nan[::10] = np.nan
+    return {
+        "text output only": _result_message(None, "result\n" * 20),
+        "ndarray 1000 float": _result_message(rng.random(1000)),
+        "ndarray 1000 float (NaN)": _result_message(with_nan),
+        "ndarray 1000 int": _result_message(np.arange(1000)),
+        "ndarray 31x31 float": _result_message(rng.random((31, 31))),
+        "DataFrame 100x50 float": _result_message(floats),
+        "DataFrame 100x50 mixed+NaN": _result_message(pd.DataFrame(mixed)),
+    }
+
+
+def _frames() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(0)
+    with_nan = pd.DataFrame(rng.random((100, 50)))
+    with_nan.iloc[::7, ::3] = np.nan
+    return {
+        "100x50 float": pd.DataFrame(rng.random((100, 50))),
+        "100x50 float (NaN)": with_nan,
+        "100x1000 float": pd.DataFrame(rng.random((100, 1000))),
+        "100x50 int": pd.DataFrame(rng.integers(0, 1000, (100, 50))),
+        "100x10 datetime+category": pd.DataFrame({
+            **{f"t{i}": pd.date_range("2024-01-01", periods=100, freq="h") for i in range(5)},
+            **{f"c{i}": pd.Categorical(rng.choice(["a", "b", "c"], 100)) for i in range(5)},
+        }),
+    }
+
+
+def _ms(fn) -> float:
+    return timeit.timeit(fn, number=NUMBER) / NUMBER * 1000
+
+
+def main():
+    if not HAS_MSGPACK:
+        print("msgpack is not installed")
+        return
+
+    print(
+        f"{'payload':<26} {'JSON bytes':>10} {'msgpack':>9} {'ratio':>6}   "
+        f"{'encode JSON':>11} {'msgpack':>8}   {'decode JSON':>11} {'msgpack':>8}  (ms)"
+    )
+    for label, message in _payloads().items():
+        json_data = dumps(message)
+        msgpack_data = packb(message)
+        assert unpackb(msgpack_data) == loads(json_data)
+        print(
+            f"{label:<26} {len(json_data):>10} {len(msgpack_data):>9} "
+            f"{len(msgpack_data) / len(json_data):>6.2f}   "
+            f"{_ms(lambda: dumps(message)):>11.3f} {_ms(lambda: packb(message)):>8.3f}   "
+            f"{_ms(lambda: loads(json_data)):>11.3f} {_ms(lambda: unpackb(msgpack_data)):>8.3f}"
+        )
+
+
+    if not HAS_PYARROW:
+        print("\npyarrow is not installed")
+        return
+    print(f"\n{'DataFrame rows':<26} {'columnar':>10} {'arrow':>9} {'ratio':>6}   {'encode columnar':>15} {'arrow':>8}  (ms)")
+    for label, frame in _frames().items():
+        def columnar():
+            return encode_json(serialize_rich_output(frame, FRAME_FORMAT_COLUMNAR))
+
+        def arrow():
+            return encode_json(serialize_rich_output(frame, FRAME_FORMAT_ARROW))
+
+        try:
+            columnar_size = len(columnar())
+            columnar_ms = f"{_ms(columnar):>15.3f}"
+        except TypeError:
+            # Datetimes only encode with orjson
+            columnar_size, columnar_ms = 0, f"{'-':>15}"
+        arrow_size = len(arrow())
+        ratio = f"{arrow_size / columnar_size:>6.2f}" if columnar_size else f"{'-':>6}"
+        print(f"{label:<26} {columnar_size:>10} {arrow_size:>9} {ratio}   {columnar_ms} {_ms(arrow):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
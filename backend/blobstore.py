@@ -0,0 +1,143 @@
+"""Content-addressed, compressed blob store on local disk."""
+import hashlib
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+# zstd compresses faster and smaller than zlib; zlib is always available
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+    zstandard = None
+
+
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# Blobs younger than this are never collected: they may belong to a save
+# whose references have not been written yet
+GC_GRACE_SECONDS = 300.0
+
+
+def digest_of(data: bytes) -> str:
+    """Content digest (hex SHA-256) of a blob's uncompressed bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _fsync_directory(path: Path):
+    """Make the entries just renamed or created in a directory durable."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Directories cannot be opened on Windows (nor need to be)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BlobStore:
+    """
+    Immutable blobs keyed by the SHA-256 of their content.
+
+    Each blob is one file under root/<first two hex digits>/, compressed
+    with zstd (".zst") if available, else zlib (".z"). Storing content
+    that is already present costs a hash and a stat, nothing more. Files
+    are written to a temporary name, synced, and renamed into place (the
+    directory synced too), so by the time anything refers to a blob it is
+    complete on disk, even after a crash.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, digest: str, suffix: str) -> Path:
+        return self.root / digest[:2] / (digest[2:] + suffix)
+
+    def _find(self, digest: str) -> Optional[Path]:
+        for suffix in (".zst", ".z"):
+            path = self._path(digest, suffix)
+            if path.exists():
+                return path
+        return None
+
+    def put(self, data: bytes, digest: Optional[str] = None) -> str:
+        """
+        Store data unless it is already present.
+
+        Args:
+            data: Uncompressed content
+            digest: digest_of(data), if the caller already has it
+
+        Returns:
+            The blob's digest
+        """
+        digest = digest or digest_of(data)
+        existing = self._find(digest)
+        if existing is not None:
+            # Refresh the age so a collection running now keeps it
+            os.utime(existing)
+            return digest
+
+        if HAS_ZSTD:
+            compressed, suffix = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), ".zst"
+        else:
+            compressed, suffix = zlib.compress(data, ZLIB_LEVEL), ".z"
+        path = self._path(digest, suffix)
+        if not path.parent.is_dir():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _fsync_directory(self.root)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(path.parent)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Uncompressed content of a blob, or None if it is not stored."""
+        path = self._find(digest)
+        if path is None:
+            return None
+        data = path.read_bytes()
+        if path.suffix == ".zst":
+            if not HAS_ZSTD:
+                raise RuntimeError(f"Blob {digest} is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def __contains__(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def collect(self, live: Iterable[str], grace: float = GC_GRACE_SECONDS) -> int:
+        """
+        Delete blobs that are not in `live` and older than `grace` seconds.
+
+        Returns:
+            Number of blobs deleted
+        """
+        live = set(live)
+        cutoff = time.time() - grace
+        removed = 0
+        if not self.root.exists():
+            return 0
+        for directory in self.root.iterdir():
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                digest = directory.name + path.name.split(".", 1)[0]
+                try:
+                    if digest not in live and path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
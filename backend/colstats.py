@@ -0,0 +1,239 @@
+"""Per-column summary statistics and histograms for DataFrame rich output."""
+import math
+import time
+from typing import Any, Optional
+
+# Try to import data science libraries
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+try:
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+    pd = None
+
+
+# Total time spent on statistics for one output; a column whose statistics
+# are not complete when the budget is spent is omitted, as are the rest.
+STATS_TIME_BUDGET = 0.5
+
+# Frames longer than this are summarized from a random sample of this many
+# rows (except min/max/mean and distinct counts, which stream over all rows)
+STATS_SAMPLE_ROWS = 100_000
+
+# Number of equal-width histogram bins for numeric columns
+STATS_BINS = 20
+
+# Most frequent values reported for non-numeric columns
+STATS_TOP_VALUES = 10
+
+# Sketch size of the k-minimum-values distinct count estimator
+# (relative error is about 1 / sqrt(k))
+STATS_KMV_K = 1024
+
+# Rows scanned per step of the distinct count and min/max/mean, between
+# deadline checks
+STATS_CHUNK_ROWS = 1 << 20
+
+
+def _json_number(value: Any) -> Any:
+    """Convert a numpy/Python number to a JSON-safe value (NaN/inf as strings)."""
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "Infinity" if value > 0 else "-Infinity"
+    return value
+
+
+def _json_label(value: Any) -> Any:
+    """Convert a column value to something JSON can carry (str as a fallback)."""
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return _json_number(value)
+    if HAS_NUMPY and isinstance(value, (np.integer, np.floating, np.bool_)):
+        return _json_number(value)
+    return str(value)
+
+
+def _smallest_distinct(hashes: Any, k: int) -> Any:
+    """The k smallest distinct values of a uint64 array, sorted."""
+    # np.sort plus a neighbour comparison is much faster than np.unique here
+    hashes = np.sort(hashes)
+    if len(hashes):
+        hashes = hashes[np.concatenate(([True], hashes[1:] != hashes[:-1]))]
+    return hashes[:k]
+
+
+def _distinct_count(series: Any, deadline: float) -> tuple[Optional[int], bool]:
+    """
+    Count distinct non-null values with a k-minimum-values sketch.
+
+    Values are hashed to 64 bits a chunk at a time; only the k smallest
+    distinct hashes are kept. If fewer than k distinct hashes are seen the
+    count is exact, otherwise it is estimated from the k-th smallest hash.
+
+    Returns:
+        Tuple of (count, exact), or (None, False) if the deadline passed
+        before the whole column was hashed
+    """
+    kept = np.empty(0, dtype=np.uint64)
+    for start in range(0, len(series), STATS_CHUNK_ROWS):
+        if time.monotonic() > deadline:
+            return None, False
+        chunk = series.iloc[start:start + STATS_CHUNK_ROWS].dropna()
+        try:
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        except TypeError:
+            # Unhashable values (e.g. lists in an object column)
+            return None, False
+        if len(kept) == STATS_KMV_K:
+            # Only hashes below the current k-th minimum can change the sketch
+            hashes = hashes[hashes < kept[-1]]
+        kept = _smallest_distinct(np.concatenate((kept, hashes)), STATS_KMV_K)
+
+    if len(kept) < STATS_KMV_K:
+        return len(kept), True
+    kth = float(kept[-1]) / 2.0 ** 64
+    return int(round((STATS_KMV_K - 1) / kth)), False
+
+
+def _numeric_stats(series: Any, sample: Any, deadline: float) -> Optional[dict]:
+    """
+    Min, max and mean over the whole column; histogram over the sample.
+
+    The column is scanned a chunk at a time, like the distinct count.
+
+    Returns:
+        The statistics, or None if the deadline passed before the whole
+        column was scanned
+    """
+    is_int = series.dtype.kind in "iu"
+    lows, highs = [], []
+    total, count = 0.0, 0
+    for start in range(0, len(series), STATS_CHUNK_ROWS):
+        if time.monotonic() > deadline:
+            return None
+        chunk = series.iloc[start:start + STATS_CHUNK_ROWS]
+        values = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = values[np.isfinite(values)]
+        if not len(finite):
+            continue
+        # Integers beyond 2**53 lose precision as floats; take their extremes exactly
+        lows.append(chunk.min() if is_int else finite.min())
+        highs.append(chunk.max() if is_int else finite.max())
+        total += float(finite.sum())
+        count += len(finite)
+
+    stats: dict[str, Any] = {"min": None, "max": None, "mean": None, "histogram": None}
+    if count:
+        stats["min"] = _json_number(min(lows))
+        stats["max"] = _json_number(max(highs))
+        stats["mean"] = _json_number(total / count)
+
+    sample_values = sample.to_numpy(dtype=np.float64, na_value=np.nan)
+    sample_finite = sample_values[np.isfinite(sample_values)]
+    if len(sample_finite):
+        counts, edges = np.histogram(sample_finite, bins=STATS_BINS)
+        stats["histogram"] = {"edges": edges.tolist(), "counts": counts.tolist()}
+    return stats
+
+
+def _top_values(sample: Any) -> Optional[list[dict]]:
+    """Most frequent non-null values in the sample (None if unhashable)."""
+    try:
+        counts = sample.value_counts(dropna=True).head(STATS_TOP_VALUES)
+    except TypeError:
+        return None
+    return [
+        {"value": _json_label(value), "count": int(count)}
+        for value, count in counts.items()
+    ]
+
+
+def column_stats(frame: Any, time_budget: float = STATS_TIME_BUDGET) -> list[dict]:
+    """
+    Summarize every column of a DataFrame.
+
+    Min/max/mean and distinct counts cover the whole frame. For frames
+    longer than STATS_SAMPLE_ROWS, null counts (scaled), histograms and top
+    values come from a random sample of that many rows, so the cost per
+    column stays bounded. Columns are processed in order until the time
+    budget is spent; every step checks it, so the budget holds however
+    many columns (or rows) the frame has.
+
+    Args:
+        frame: DataFrame to summarize
+        time_budget: Seconds to spend before skipping the remaining columns
+
+    Returns:
+        List of per-column dicts with column, dtype, count, null_count, min,
+        max, mean, distinct, distinct_exact, histogram ({edges, counts}, for
+        numeric columns), top_values ([{value, count}], for other columns)
+        and sampled. Columns not completed within the budget are omitted.
+    """
+    if not HAS_PANDAS or not isinstance(frame, pd.DataFrame):
+        return []
+
+    deadline = time.monotonic() + time_budget
+    nrows = len(frame)
+    sampled = nrows > STATS_SAMPLE_ROWS
+    if sampled:
+        rng = np.random.default_rng(0)
+        positions = np.sort(rng.choice(nrows, STATS_SAMPLE_ROWS, replace=False))
+
+    results = []
+    for position, column in enumerate(frame.columns):
+        if time.monotonic() > deadline:
+            break
+        series = frame.iloc[:, position]
+        # Sampled per column, so columns past the budget are never copied
+        sample = series.iloc[positions] if sampled else series
+        dtype = series.dtype
+        kind = getattr(dtype, "kind", "O")
+
+        null_count = int(sample.isna().sum())
+        if sampled:
+            null_count = int(round(null_count * nrows / STATS_SAMPLE_ROWS))
+        distinct, distinct_exact = _distinct_count(series, deadline)
+        if time.monotonic() > deadline:
+            break
+        stats = {
+            "column": str(column),
+            "dtype": str(dtype),
+            "count": nrows - null_count,
+            "null_count": null_count,
+            "min": None,
+            "max": None,
+            "mean": None,
+            "distinct": distinct,
+            "distinct_exact": distinct_exact,
+            "histogram": None,
+            "top_values": None,
+            "sampled": sampled,
+        }
+
+        if kind in "iuf":
+            numeric = _numeric_stats(series, sample, deadline)
+            if numeric is None:
+                break
+            stats.update(numeric)
+        elif kind == "b":
+            stats["mean"] = _json_number(series.mean()) if stats["count"] else None
+            stats["top_values"] = _top_values(sample)
+        elif kind in "mM":
+            if stats["count"]:
+                stats["min"] = str(series.min())
+                stats["max"] = str(series.max())
+        else:
+            stats["top_values"] = _top_values(sample)
+
+        results.append(stats)
+
+    return results
@@ -0,0 +1,205 @@
+"""Shape-preserving downsampling of large 1-D and 2-D arrays for rich output previews."""
+import math
+from typing import Any
+
+# Try to import data science libraries
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+
+# 1-D preview modes: leading elements, per-bucket min and max, or
+# largest-triangle-three-buckets
+ARRAY_1D_HEAD = "head"
+ARRAY_1D_MINMAX = "minmax"
+ARRAY_1D_LTTB = "lttb"
+ARRAY_1D_MODES = (ARRAY_1D_HEAD, ARRAY_1D_MINMAX, ARRAY_1D_LTTB)
+
+# Evenly spaced elements; used in place of minmax/lttb for non-numeric dtypes
+ARRAY_1D_STRIDE = "stride"
+
+# 2-D preview modes: top-left block, evenly strided rows/columns, or the
+# mean of each block of a regular grid
+ARRAY_2D_HEAD = "head"
+ARRAY_2D_STRIDE = "stride"
+ARRAY_2D_BLOCKMEAN = "blockmean"
+ARRAY_2D_MODES = (ARRAY_2D_HEAD, ARRAY_2D_STRIDE, ARRAY_2D_BLOCKMEAN)
+
+# dtype kinds that can be compared/averaged (bool, signed/unsigned int, float)
+NUMERIC_KINDS = "biuf"
+
+
+def _bucket_starts(length: int, buckets: int) -> Any:
+    """Start offsets of `buckets` near-equal contiguous buckets over `length` items."""
+    return (np.arange(buckets, dtype=np.int64) * length) // buckets
+
+
+def even_positions(length: int, count: int) -> Any:
+    """`count` evenly spaced positions in [0, length), including both ends."""
+    if length <= count:
+        return np.arange(length, dtype=np.int64)
+    return np.unique(np.linspace(0, length - 1, count).round().astype(np.int64))
+
+
+def minmax_positions(values: Any, max_points: int) -> Any:
+    """
+    Positions of the minimum and maximum of each bucket, in order.
+
+    The array is split into max_points // 2 equal buckets; keeping both
+    extremes of every bucket preserves spikes and the envelope of the
+    signal. NaNs are only selected from buckets that contain nothing else.
+    Each bucket is searched in place (a view), so no array-sized
+    temporaries are made; only buckets containing NaN are copied.
+    """
+    n = len(values)
+    buckets = max(1, max_points // 2)
+    size = math.ceil(n / buckets)
+    is_float = values.dtype.kind == "f"
+
+    starts = range(0, n, size)
+    positions = np.empty(2 * len(starts), dtype=np.int64)
+    for i, start in enumerate(starts):
+        bucket = values[start:start + size]
+        low, high = int(bucket.argmin()), int(bucket.argmax())
+        if is_float and (np.isnan(bucket[low]) or np.isnan(bucket[high])):
+            # argmin/argmax stop at the first NaN; skip NaNs unless there is nothing else
+            if np.isnan(bucket).all():
+                low = high = 0
+            else:
+                low, high = int(np.nanargmin(bucket)), int(np.nanargmax(bucket))
+        positions[2 * i] = start + low
+        positions[2 * i + 1] = start + high
+    return np.unique(positions)
+
+
+def lttb_positions(values: Any, max_points: int) -> Any:
+    """
+    Positions chosen by largest-triangle-three-buckets.
+
+    Keeps the first and last points and, from each of max_points - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously chosen point and the average of the next bucket. Triangle
+    areas are computed for a whole bucket at once, so the Python loop runs
+    once per output point regardless of the array length. Values are cast
+    to float one bucket at a time, never the whole array.
+    """
+    n = len(values)
+    if max_points < 3:
+        return even_positions(n, max_points)
+
+    buckets = max_points - 2
+    # Bucket i covers [edges[i], edges[i + 1]) of the interior points 1..n-2
+    edges = 1 + _bucket_starts(n - 2, buckets)
+    edges = np.append(edges, n - 1)
+
+    positions = np.empty(max_points, dtype=np.int64)
+    positions[0] = 0
+    positions[-1] = n - 1
+    previous = 0
+    previous_y = float(values[0])
+    y = values[edges[0]:edges[1]].astype(np.float64, copy=False)
+    for i in range(buckets):
+        start, stop = edges[i], edges[i + 1]
+        if i + 1 < buckets:
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        next_y_values = values[next_start:next_stop].astype(np.float64, copy=False)
+        next_mask = np.isfinite(next_y_values)
+        if next_mask.any():
+            next_x = np.arange(next_start, next_stop)[next_mask].mean()
+            next_y = next_y_values[next_mask].mean()
+        else:
+            next_x, next_y = (next_start + next_stop - 1) / 2, previous_y
+
+        x = np.arange(start, stop, dtype=np.float64)
+        area = np.abs((previous - next_x) * (y - previous_y) - (previous - x) * (next_y - previous_y))
+        area[~np.isfinite(area)] = -1.0
+        chosen = int(area.argmax())
+        previous = start + chosen
+        previous_y = float(y[chosen])
+        positions[i + 1] = previous
+        # The next bucket is the current one of the following iteration
+        y = next_y_values
+
+    return positions
+
+
+def block_mean(values: Any, row_starts: Any, col_starts: Any) -> Any:
+    """
+    Mean of each block of a grid over a 2-D array.
+
+    Blocks start at row_starts x col_starts and run to the next start (or
+    the end of the array). Sums are taken with np.add.reduceat, so the
+    array is read once and never copied; a block containing NaN averages
+    to NaN.
+    """
+    sums = np.add.reduceat(values, row_starts, axis=0, dtype=np.float64)
+    sums = np.add.reduceat(sums, col_starts, axis=1)
+    row_sizes = np.diff(np.append(row_starts, values.shape[0]))
+    col_sizes = np.diff(np.append(col_starts, values.shape[1]))
+    return sums / np.outer(row_sizes, col_sizes)
+
+
+def downsample_1d(values: Any, max_points: int, mode: str) -> tuple[Any, Any, str]:
+    """
+    Reduce a 1-D array to at most max_points elements.
+
+    Args:
+        values: 1-D ndarray longer than max_points
+        max_points: Maximum number of output elements
+        mode: One of ARRAY_1D_MODES; minmax and lttb fall back to evenly
+            spaced positions ("stride") for non-numeric dtypes
+
+    Returns:
+        Tuple of (reduced values, original positions of each value,
+        mode actually used)
+    """
+    if mode not in ARRAY_1D_MODES:
+        raise ValueError(f"Unknown 1-D downsampling mode: {mode!r}")
+    if mode == ARRAY_1D_HEAD:
+        positions = np.arange(max_points, dtype=np.int64)
+    elif values.dtype.kind not in NUMERIC_KINDS:
+        positions = even_positions(len(values), max_points)
+        mode = ARRAY_1D_STRIDE
+    elif mode == ARRAY_1D_MINMAX:
+        positions = minmax_positions(values, max_points)
+    else:
+        positions = lttb_positions(values, max_points)
+    return values[positions], positions, mode
+
+
+def downsample_2d(values: Any, max_dim: int, mode: str) -> tuple[Any, Any, Any, str]:
+    """
+    Reduce a 2-D array to at most max_dim rows and max_dim columns.
+
+    Args:
+        values: 2-D ndarray
+        max_dim: Maximum number of output rows and columns
+        mode: One of ARRAY_2D_MODES; blockmean falls back to stride for
+            non-numeric dtypes
+
+    Returns:
+        Tuple of (reduced values, row positions, column positions, mode
+        actually used). For blockmean the positions are the first
+        row/column of each block.
+    """
+    if mode not in ARRAY_2D_MODES:
+        raise ValueError(f"Unknown 2-D downsampling mode: {mode!r}")
+    nrows, ncols = values.shape
+    if mode == ARRAY_2D_HEAD:
+        rows = np.arange(min(nrows, max_dim), dtype=np.int64)
+        cols = np.arange(min(ncols, max_dim), dtype=np.int64)
+        return values[:len(rows), :len(cols)], rows, cols, mode
+
+    if mode == ARRAY_2D_BLOCKMEAN and values.dtype.kind in NUMERIC_KINDS and values.size:
+        rows = _bucket_starts(nrows, min(nrows, max_dim))
+        cols = _bucket_starts(ncols, min(ncols, max_dim))
+        return block_mean(values, rows, cols), rows, cols, mode
+
+    rows = even_positions(nrows, max_dim)
+    cols = even_positions(ncols, max_dim)
+    return values[np.ix_(rows, cols)], rows, cols, ARRAY_2D_STRIDE
@@ -0,0 +1,202 @@
+"""Notebook persistence as a snapshot plus an append-only journal of cell changes."""
+import os
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from blobstore import BlobStore
+from storage import NotebookStore, OUTPUT_FIELDS, blob_refs, externalize_outputs, resolve_outputs
+from wire import dumps, loads
+
+
+# The journal is folded into a new snapshot once it has this many records,
+# or once it is larger than the snapshot (and at least COMPACT_MIN_BYTES)
+COMPACT_RECORDS = 1000
+COMPACT_MIN_BYTES = 1 << 20
+
+# Journal operations. Every record carries the full resulting state of what
+# it touches, so replaying a record twice gives the same notebook; this is
+# what makes a crash between writing a snapshot and truncating the journal
+# harmless.
+OP_CELL = "cell"      # {"op": "cell", "cell": {...}}: add or replace a cell
+OP_DELETE = "delete"  # {"op": "delete", "id": ...}
+OP_ORDER = "order"    # {"op": "order", "ids": [...]}: display order
+
+
+class NotebookJournal(NotebookStore):
+    """
+    Write-ahead journal of cell-level changes to one notebook.
+
+    The notebook is stored as a snapshot (the usual {"cells": [...]} JSON
+    file) and a journal next to it with one JSON record per line. Each
+    change appends a single small record instead of rewriting the file;
+    every so often the journal is compacted into a new snapshot, written
+    to a temporary file and renamed over the old one, so the snapshot on
+    disk is always complete. load() replays the journal over the
+    snapshot, ignoring a record cut short by a crash.
+
+    The journal keeps its own copy of the notebook (cell dicts in display
+    order) to compact from; cell values are shared, not copied. With a
+    blob store, large outputs are kept there and both the journal and the
+    snapshot only hold references to them.
+    """
+
+    def __init__(self, snapshot_path: Path, blobs: Optional[BlobStore] = None):
+        self.snapshot_path = Path(snapshot_path)
+        self.blobs = blobs
+        self.journal_path = self.snapshot_path.with_suffix(".journal")
+        self.cells: dict[str, dict] = {}
+        self.order: list[str] = []
+        self._journal: Optional[Any] = None
+        self.records = 0
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+
+    def load(self, include_outputs: bool = True) -> list[dict]:
+        """
+        Read the snapshot and replay the journal over it.
+
+        Outputs are always read (they are in the same file); with
+        include_outputs=False they are just left out of the result.
+
+        Returns:
+            Cell dicts in display order
+        """
+        self.cells.clear()
+        self.order.clear()
+        if self.snapshot_path.exists():
+            data = self.snapshot_path.read_bytes()
+            self._snapshot_bytes = len(data)
+            for cell in loads(data).get("cells", []):
+                self._apply({"op": OP_CELL, "cell": cell})
+
+        self.records = 0
+        self._journal_bytes = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        break  # Torn write: the rest never made it to disk
+                    if not line.endswith(b"\n"):
+                        break
+                    self._apply(record)
+                    self.records += 1
+                    self._journal_bytes += len(line)
+            # Drop anything after the last complete record before appending
+            if self._journal_bytes < self.journal_path.stat().st_size:
+                os.truncate(self.journal_path, self._journal_bytes)
+
+        if not include_outputs:
+            return [
+                {key: value for key, value in cell.items() if key not in OUTPUT_FIELDS}
+                for cell in self.get_cells()
+            ]
+        return [resolve_outputs(cell, self.blobs) for cell in self.get_cells()]
+
+    def load_outputs(self, cell_ids: Optional[Iterable[str]] = None) -> dict[str, dict]:
+        ids = self.order if cell_ids is None else [i for i in cell_ids if i in self.cells]
+        return {
+            cell_id: resolve_outputs(
+                {field: self.cells[cell_id].get(field) for field in OUTPUT_FIELDS}, self.blobs
+            )
+            for cell_id in ids
+        }
+
+    def get_cells(self) -> list[dict]:
+        """Cell dicts in display order."""
+        return [self.cells[cell_id] for cell_id in self.order]
+
+    def put_cell(self, cell: dict):
+        """Record the full state of a new or changed cell."""
+        self._append([{"op": OP_CELL, "cell": self._externalize(cell)}])
+
+    def delete_cell(self, cell_id: str):
+        """Record the deletion of a cell."""
+        if cell_id in self.cells:
+            self._append([{"op": OP_DELETE, "id": cell_id}])
+
+    def set_order(self, cell_ids: list[str]):
+        """Record the display order of the cells."""
+        if list(cell_ids) != self.order:
+            self._append([{"op": OP_ORDER, "ids": list(cell_ids)}])
+
+    def save_changes(self, cells: list[dict], deleted: list[str], order: Optional[list[str]]):
+        """
+        Record a batch of changes with a single write and fsync.
+
+        Args:
+            cells: Full state of new or changed cells
+            deleted: IDs of deleted cells
+            order: Display order of the cells, or None if unchanged
+        """
+        records = [{"op": OP_CELL, "cell": self._externalize(cell)} for cell in cells]
+        records += [{"op": OP_DELETE, "id": cell_id} for cell_id in deleted if cell_id in self.cells]
+        if order is not None and list(order) != self.order:
+            records.append({"op": OP_ORDER, "ids": list(order)})
+        if records:
+            self._append(records)
+
+    def compact(self):
+        """Write the current notebook as the new snapshot and empty the journal."""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        data = dumps({"cells": self.get_cells()}, indent=True)
+        temp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self._snapshot_bytes = len(data)
+
+        # Only now can the journal go: until the rename it is still needed
+        self.close()
+        self.journal_path.unlink(missing_ok=True)
+        self.records = 0
+        self._journal_bytes = 0
+
+        if self.blobs is not None:
+            self.blobs.collect(digest for cell in self.cells.values() for digest in blob_refs(cell))
+
+    def close(self):
+        """Close the journal file (it is reopened on the next change)."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _externalize(self, cell: dict) -> dict:
+        return externalize_outputs(cell, self.blobs) if self.blobs is not None else cell
+
+    def _append(self, records: list[dict]):
+        for record in records:
+            self._apply(record)
+        data = b"".join(dumps(record) + b"\n" for record in records)
+        if self._journal is None:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "ab")
+        self._journal.write(data)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.records += len(records)
+        self._journal_bytes += len(data)
+
+        if self.records >= COMPACT_RECORDS or (
+            self._journal_bytes >= COMPACT_MIN_BYTES and self._journal_bytes > self._snapshot_bytes
+        ):
+            self.compact()
+
+    def _apply(self, record: dict):
+        op = record.get("op")
+        if op == OP_CELL:
+            cell = record["cell"]
+            if cell["id"] not in self.cells:
+                self.order.append(cell["id"])
+            self.cells[cell["id"]] = cell
+        elif op == OP_DELETE:
+            if self.cells.pop(record["id"], None) is not None:
+                self.order.remove(record["id"])
+        elif op == OP_ORDER:
+            # Cells missing from the new order keep their place at the end
+            ids = [cell_id for cell_id in record["ids"] if cell_id in self.cells]
+            listed = set(ids)
+            self.order = ids + [cell_id for cell_id in self.order if cell_id not in listed]
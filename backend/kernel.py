@@ -1,14 +1,37 @@
 """Code execution engine for the reactive notebook using a worker process."""
 import ast
+import gc
+import os
+import json
 import sys
 import math
+import time
+import base64
+import pickle
+import reprlib
+import weakref
+import itertools
 import threading
 import multiprocessing
 from multiprocessing import Process, Queue
+from collections import OrderedDict
 from io import StringIO
 from contextlib import redirect_stdout, redirect_stderr
-from typing import Any, Optional
-from queue import Empty
+from typing import Any, Callable, Optional
+from queue import Empty, SimpleQueue
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from sharedmem import export_value, import_value, discard, ensure_tracker, is_descriptor, SHM_MIN_BYTES
+from colstats import column_stats as compute_column_stats
+from wire import Attachment, encode_json
+from downsample import (
+    downsample_1d, downsample_2d, ARRAY_1D_HEAD, ARRAY_1D_MINMAX,
+    ARRAY_2D_HEAD, ARRAY_2D_BLOCKMEAN
+)
 
 # Try to import data science libraries
 try:
@@ -25,11 +48,52 @@ except ImportError:
     HAS_PANDAS = False
     pd = None
 
+# Arrow IPC is the DataFrame wire format where pyarrow is installed
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+    pa = None
+
 
 # Maximum rows/elements to include in rich output
 MAX_ROWS = 100
 MAX_ARRAY_ELEMENTS = 1000
 
+# How large 1-D and 2-D arrays are reduced to a preview (see downsample.py);
+# "head" shows only the leading elements, the other modes cover the whole array
+DEFAULT_ARRAY_1D_MODE = ARRAY_1D_MINMAX
+DEFAULT_ARRAY_2D_MODE = ARRAY_2D_BLOCKMEAN
+
+# DataFrame wire formats: "records" is a list of row dicts; "columnar" sends
+# column names once, one value list per column and a null bitmap per column;
+# "arrow" sends an Arrow IPC stream as a wire.Attachment (index first, then
+# the columns by position), falling back to "columnar" without pyarrow.
+# Row windows (fetch_rows) are always JSON, columnar for "arrow".
+FRAME_FORMAT_RECORDS = "records"
+FRAME_FORMAT_COLUMNAR = "columnar"
+FRAME_FORMAT_ARROW = "arrow"
+
+# Format the kernel uses for DataFrame rich output
+DEFAULT_FRAME_FORMAT = FRAME_FORMAT_COLUMNAR
+
+# Largest row window a single fetch_rows request may return
+MAX_FETCH_ROWS = 1000
+
+# Sorted/filtered row orders kept per (cell, query), least recently used
+# evicted beyond either limit
+MAX_QUERY_VIEWS = 16
+MAX_QUERY_VIEW_BYTES = 64 * 1024 * 1024
+
+# Seconds fetch_rows waits for the worker by default. A query sorts and
+# filters the whole result before windowing, which takes a while on
+# frames with millions of rows.
+FETCH_ROWS_TIMEOUT = 60
+
+# Supported filter operators for row queries
+QUERY_FILTER_OPS = ("==", "!=", "<", "<=", ">", ">=", "contains", "isnull", "notnull")
+
 
 def _safe_value(val: Any) -> Any:
     """Convert a value to a JSON-safe representation."""
@@ -62,109 +126,518 @@ def _convert_to_safe_list(data: list) -> list:
     return result
 
 
-def serialize_rich_output(value: Any) -> Optional[dict]:
+def _array_to_safe_list(arr: Any) -> list:
     """
-    Convert special data types to structured output for rich rendering.
+    Convert a NumPy array to (nested) JSON-safe lists.
     
-    Supports:
-    - pandas DataFrame
-    - pandas Series
-    - numpy ndarray
+    Integer and bool arrays convert directly with tolist(). Float arrays are
+    converted in one pass and only the non-finite positions, found with
+    vectorized masks, are patched. Other dtypes fall back to per-value
+    conversion.
+    """
+    kind = arr.dtype.kind
+    if kind in "biu":
+        return arr.tolist()
+    if kind != "f":
+        data = arr.tolist()
+        return _convert_to_safe_list(data) if isinstance(data, list) else [_safe_value(data)]
+    
+    data = arr.tolist()
+    if arr.size == 0:
+        return data
+    
+    non_finite = ~np.isfinite(arr)
+    if not non_finite.any():
+        return data
+    
+    for mask, replacement in (
+        (np.isnan(arr), "NaN"),
+        (np.isposinf(arr), "Infinity"),
+        (np.isneginf(arr), "-Infinity"),
+    ):
+        for position in np.argwhere(mask):
+            target = data
+            for i in position[:-1]:
+                target = target[i]
+            target[position[-1]] = replacement
+    return data
+
+
+def _values_to_safe_list(values: Any) -> list:
+    """
+    Convert a pandas Series or Index to a flat JSON-safe list.
+    
+    NumPy-backed numeric columns take the vectorized path. Datetimes and
+    durations become ISO 8601 strings (None where missing, as in
+    wire.encode_json). Strings and nullable integer/bool columns hold safe
+    values except where missing, so only the positions flagged by isna()
+    are converted. Object and other dtypes are converted value by value.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+        return _array_to_safe_list(values.to_numpy())
+    
+    data = values.tolist()
+    if dtype != object and dtype.kind in "mM":
+        return [None if value is pd.NaT else value.isoformat() for value in data]
+    if dtype != object and (dtype.kind in "biu" or isinstance(dtype, pd.StringDtype)):
+        for position in np.flatnonzero(values.isna()):
+            data[position] = _safe_value(data[position])
+        return data
+    return [_safe_value(v) for v in data]
+
+
+def _frame_to_safe_columns(frame: Any) -> list[list]:
+    """
+    Convert every column of a DataFrame to a JSON-safe list.
+    
+    Numeric columns are grouped by dtype and converted as one 2-D block per
+    dtype, which avoids building a Series per column.
+    """
+    column_values: list[Optional[list]] = [None] * frame.shape[1]
+    numeric_groups: dict[Any, list[int]] = {}
+    
+    for position, dtype in enumerate(frame.dtypes):
+        if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+            numeric_groups.setdefault(dtype, []).append(position)
+        else:
+            column_values[position] = _values_to_safe_list(frame.iloc[:, position])
+    
+    for dtype, positions in numeric_groups.items():
+        block = frame.iloc[:, positions].to_numpy(dtype=dtype)
+        for position, values in zip(positions, _array_to_safe_list(block.T)):
+            column_values[position] = values
+    
+    return column_values
+
+
+def _encode_null_bitmap(mask: Any) -> Optional[str]:
+    """
+    Pack a boolean missing-value mask into a base64 bitmap.
+    
+    Bit i (least significant bit first within each byte) is set when row i
+    is missing. Returns None when no value is missing.
+    """
+    if not mask.any():
+        return None
+    return base64.b64encode(np.packbits(mask, bitorder="little").tobytes()).decode("ascii")
+
+
+def _frame_to_columnar(frame: Any) -> tuple[list[list], list[Optional[str]]]:
+    """
+    Build the columnar encoding of a DataFrame.
     
     Returns:
-        Dict with type, data, shape, etc. or None if not a rich type.
+        Tuple of (one JSON-safe value list per column with None at missing
+        positions, one null bitmap per column)
+    """
+    column_values = _frame_to_safe_columns(frame)
+    missing = frame.isna().to_numpy()
+    nulls = []
+    for position, values in enumerate(column_values):
+        mask = missing[:, position]
+        for row in np.flatnonzero(mask):
+            values[row] = None
+        nulls.append(_encode_null_bitmap(mask))
+    return column_values, nulls
+
+
+def _arrow_readable(arrow_type: Any) -> bool:
+    """Whether the frontend's Arrow reader can decode columns of this type."""
+    if pa.types.is_dictionary(arrow_type):
+        return _arrow_readable(arrow_type.value_type)
+    return (
+        pa.types.is_integer(arrow_type) or pa.types.is_float32(arrow_type)
+        or pa.types.is_float64(arrow_type) or pa.types.is_boolean(arrow_type)
+        or pa.types.is_string(arrow_type) or pa.types.is_timestamp(arrow_type)
+        or pa.types.is_date(arrow_type) or pa.types.is_null(arrow_type)
+    )
+
+
+def _arrow_narrowed(arrow_type: Any) -> Any:
+    """The nearest type the frontend's Arrow reader handles, for half floats and large strings."""
+    if pa.types.is_dictionary(arrow_type):
+        return pa.dictionary(arrow_type.index_type, _arrow_narrowed(arrow_type.value_type))
+    if pa.types.is_float16(arrow_type):
+        return pa.float32()
+    if pa.types.is_large_string(arrow_type):
+        return pa.string()
+    return arrow_type
+
+
+def _arrow_column(values: Any) -> Any:
+    """
+    Convert a Series or Index to an Arrow array the frontend can read.
+    
+    Numbers, booleans, strings, datetimes, dates and categoricals keep
+    their type (missing values and NaN become nulls, nullable integers
+    stay integers); anything else is sent as its string form.
+    """
+    try:
+        array = pa.array(values, from_pandas=True)
+        narrowed = _arrow_narrowed(array.type)
+        if narrowed != array.type:
+            array = array.cast(narrowed)
+        if _arrow_readable(array.type):
+            return array
+    except (pa.ArrowException, TypeError, ValueError):
+        pass
+    return pa.array(
+        values.astype(str).to_numpy(dtype=object), type=pa.string(),
+        mask=np.asarray(pd.isna(values), dtype=bool)
+    )
+
+
+def _frame_to_arrow(frame: Any) -> Optional[bytes]:
+    """
+    Encode a DataFrame as an Arrow IPC stream of one record batch.
+    
+    Fields are "index" followed by the columns named by position (names
+    need not be unique strings). Numeric columns are grouped by dtype, as
+    in _frame_to_safe_columns, and each group becomes one Arrow array that
+    is sliced into its columns without copying.
+    
+    Returns:
+        The stream, or None without pyarrow or if Arrow cannot hold the frame
+    """
+    if not HAS_PYARROW:
+        return None
+    try:
+        arrays: list[Any] = [None] * frame.shape[1]
+        numeric_groups: dict[Any, list[int]] = {}
+        for position, dtype in enumerate(frame.dtypes):
+            if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+                numeric_groups.setdefault(dtype, []).append(position)
+            else:
+                arrays[position] = _arrow_column(frame.iloc[:, position])
+        
+        rows = len(frame)
+        for dtype, positions in numeric_groups.items():
+            block = frame.iloc[:, positions].to_numpy(dtype=dtype).T
+            if dtype == np.float16:
+                block = block.astype(np.float32)
+            flat = pa.array(np.ascontiguousarray(block).ravel(), from_pandas=True)
+            for i, position in enumerate(positions):
+                arrays[position] = flat.slice(i * rows, rows)
+        
+        batch = pa.RecordBatch.from_arrays(
+            [_arrow_column(frame.index), *arrays],
+            names=["index", *(str(position) for position in range(frame.shape[1]))]
+        )
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+
+
+def _frame_rows(frame: Any, frame_format: str) -> dict:
+    """
+    Serialize the rows of a DataFrame in the requested wire format.
+    
+    Returns:
+        Dict with "data" and "index", plus "format" and "nulls" for the
+        columnar format; "format" and "data" (an Attachment) for arrow
+    """
+    if frame_format == FRAME_FORMAT_ARROW:
+        stream = _frame_to_arrow(frame)
+        if stream is not None:
+            return {"format": FRAME_FORMAT_ARROW, "data": Attachment(stream)}
+        frame_format = FRAME_FORMAT_COLUMNAR
+    if frame_format == FRAME_FORMAT_RECORDS and not frame.columns.is_unique:
+        # Records are keyed by column name; only the columnar format keeps
+        # every column when names repeat
+        frame_format = FRAME_FORMAT_COLUMNAR
+    result = {"index": _values_to_safe_list(frame.index)}
+    if frame_format == FRAME_FORMAT_COLUMNAR:
+        result["format"] = FRAME_FORMAT_COLUMNAR
+        result["data"], result["nulls"] = _frame_to_columnar(frame)
+    else:
+        # Convert column by column, then assemble records
+        columns = list(frame.columns)
+        column_values = _frame_to_safe_columns(frame)
+        result["data"] = [dict(zip(columns, row)) for row in zip(*column_values)]
+    return result
+
+
+def _rich_preview(
+    value: Any,
+    column_stats: bool = False,
+    array_1d_mode: str = ARRAY_1D_HEAD,
+    array_2d_mode: str = ARRAY_2D_HEAD
+) -> Optional[dict]:
+    """
+    Take the part of a value that rich output shows, detached from the value.
+    
+    The rows, elements or downsampled points to display are copied (at most
+    MAX_ROWS rows or MAX_ARRAY_ELEMENTS elements), so the preview can be
+    encoded later, on another thread, while the value itself keeps
+    changing. Column statistics read a shallow copy of the DataFrame:
+    reassigned or added columns do not reach them.
+    
+    Returns:
+        Dict with the metadata of the rich output plus "display" (the
+        copied data), or None if not a rich type
     """
     if value is None:
         return None
     
-    # Check for pandas DataFrame
     if HAS_PANDAS and isinstance(value, pd.DataFrame):
         truncated = len(value) > MAX_ROWS
-        df_display = value.head(MAX_ROWS) if truncated else value
-        
-        # Convert to records and handle NaN/special values
-        records = df_display.to_dict(orient="records")
-        safe_records = _convert_to_safe_list(records)
-        
-        # Get index as list
-        index_list = [_safe_value(idx) for idx in df_display.index.tolist()]
-        
         return {
             "type": "dataframe",
-            "data": safe_records,
-            "columns": list(df_display.columns),
+            "display": value.head(MAX_ROWS).copy(),
             "dtypes": {str(col): str(dtype) for col, dtype in value.dtypes.items()},
-            "index": index_list,
             "shape": list(value.shape),
-            "truncated": truncated
+            "truncated": truncated,
+            "stats_frame": value.copy(deep=False) if column_stats else None
         }
     
-    # Check for pandas Series
     if HAS_PANDAS and isinstance(value, pd.Series):
-        truncated = len(value) > MAX_ROWS
-        series_display = value.head(MAX_ROWS) if truncated else value
-        
-        # Convert to dict with safe values
-        data_dict = {_safe_value(k): _safe_value(v) for k, v in series_display.to_dict().items()}
-        
         return {
             "type": "series",
-            "data": data_dict,
+            "display": value.head(MAX_ROWS).copy(),
             "name": value.name,
             "dtype": str(value.dtype),
-            "index": [_safe_value(idx) for idx in series_display.index.tolist()],
             "shape": [len(value)],
-            "truncated": truncated
+            "truncated": len(value) > MAX_ROWS
         }
     
-    # Check for numpy ndarray
     if HAS_NUMPY and isinstance(value, np.ndarray):
         total_elements = value.size
         truncated = total_elements > MAX_ARRAY_ELEMENTS
+        sampling = None
         
         if value.ndim == 1:
-            # 1D array - take first MAX_ARRAY_ELEMENTS
-            arr_display = value[:MAX_ARRAY_ELEMENTS] if truncated else value
-            data = _convert_to_safe_list(arr_display.tolist())
+            arr_display = value
+            if truncated:
+                arr_display, positions, method = downsample_1d(
+                    value, MAX_ARRAY_ELEMENTS, array_1d_mode
+                )
+                if method != ARRAY_1D_HEAD:
+                    sampling = {"method": method, "positions": [positions.tolist()]}
         elif value.ndim == 2:
             # 2D array - limit rows and columns
             max_dim = int(MAX_ARRAY_ELEMENTS ** 0.5)  # ~31 for 1000
-            row_limit = min(value.shape[0], max_dim)
-            col_limit = min(value.shape[1], max_dim)
-            arr_display = value[:row_limit, :col_limit]
-            truncated = value.shape[0] > row_limit or value.shape[1] > col_limit
-            data = _convert_to_safe_list(arr_display.tolist())
+            truncated = value.shape[0] > max_dim or value.shape[1] > max_dim
+            arr_display = value
+            if truncated:
+                arr_display, rows, cols, method = downsample_2d(value, max_dim, array_2d_mode)
+                if method != ARRAY_2D_HEAD:
+                    sampling = {"method": method, "positions": [rows.tolist(), cols.tolist()]}
         else:
             # Higher dimensional - just show shape and flatten preview
-            flat = value.flatten()[:MAX_ARRAY_ELEMENTS]
-            data = _convert_to_safe_list(flat.tolist())
+            arr_display = value.flat[:MAX_ARRAY_ELEMENTS]
             truncated = total_elements > MAX_ARRAY_ELEMENTS
         
         return {
             "type": "ndarray",
-            "data": data,
+            "display": np.array(arr_display, copy=True),
             "dtype": str(value.dtype),
             "shape": list(value.shape),
-            "truncated": truncated
+            "truncated": truncated,
+            "sampling": sampling
         }
     
     return None
 
 
+def _serialize_preview(preview: dict, frame_format: str = FRAME_FORMAT_RECORDS) -> dict:
+    """Encode a preview taken by _rich_preview() as rich output."""
+    display = preview["display"]
+    
+    if preview["type"] == "dataframe":
+        result = {
+            "type": "dataframe",
+            "columns": list(display.columns),
+            "dtypes": preview["dtypes"],
+            "shape": preview["shape"],
+            "truncated": preview["truncated"],
+            **_frame_rows(display, frame_format)
+        }
+        if preview["stats_frame"] is not None:
+            result["column_stats"] = compute_column_stats(preview["stats_frame"])
+        return result
+    
+    if preview["type"] == "series":
+        index_list = _values_to_safe_list(display.index)
+        return {
+            "type": "series",
+            "data": dict(zip(index_list, _values_to_safe_list(display))),
+            "name": preview["name"],
+            "dtype": preview["dtype"],
+            "index": index_list,
+            "shape": preview["shape"],
+            "truncated": preview["truncated"]
+        }
+    
+    result = {
+        "type": "ndarray",
+        "data": _array_to_safe_list(display),
+        "dtype": preview["dtype"],
+        "shape": preview["shape"],
+        "truncated": preview["truncated"]
+    }
+    if preview["sampling"] is not None:
+        result["sampling"] = preview["sampling"]
+    return result
+
+
+def serialize_rich_output(
+    value: Any,
+    frame_format: str = FRAME_FORMAT_RECORDS,
+    column_stats: bool = False,
+    array_1d_mode: str = ARRAY_1D_HEAD,
+    array_2d_mode: str = ARRAY_2D_HEAD
+) -> Optional[dict]:
+    """
+    Convert special data types to structured output for rich rendering.
+    
+    Supports:
+    - pandas DataFrame
+    - pandas Series
+    - numpy ndarray
+    
+    Values are converted a column (or whole array) at a time rather than
+    cell by cell.
+    
+    Args:
+        value: Value to serialize
+        frame_format: DataFrame encoding, "records" (list of row dicts),
+            "columnar" (list of column value lists plus null bitmaps) or
+            "arrow" (Arrow IPC stream, see _frame_to_arrow)
+        column_stats: Attach per-column statistics and histograms of the
+            whole DataFrame (see colstats.column_stats)
+        array_1d_mode: How 1-D arrays longer than MAX_ARRAY_ELEMENTS are
+            reduced ("head", "minmax" or "lttb")
+        array_2d_mode: How 2-D arrays larger than ~31x31 are reduced
+            ("head", "stride" or "blockmean")
+    
+    Returns:
+        Dict with type, data, shape, etc. or None if not a rich type.
+    """
+    preview = _rich_preview(value, column_stats, array_1d_mode, array_2d_mode)
+    if preview is None:
+        return None
+    return _serialize_preview(preview, frame_format)
+
+
+def _has_rich_output(value: Any) -> bool:
+    """Check whether serialize_rich_output() would produce output for a value."""
+    if HAS_PANDAS and isinstance(value, (pd.DataFrame, pd.Series)):
+        return True
+    return HAS_NUMPY and isinstance(value, np.ndarray)
+
+
 # Default timeout in seconds
 DEFAULT_TIMEOUT = 5
 
+# Default per-worker memory limit in MB (None = unlimited)
+DEFAULT_MEMORY_LIMIT_MB = (
+    int(os.environ["NOTEBOOK_MEMORY_LIMIT_MB"])
+    if os.environ.get("NOTEBOOK_MEMORY_LIMIT_MB") else None
+)
+
+# How often a waiting execution checks whether the worker is still alive
+WORKER_POLL_INTERVAL = 0.1
+
 
 # Command types for worker communication
 CMD_EXECUTE = "execute"
 CMD_GET_VAR = "get_var"
 CMD_SET_VAR = "set_var"
+CMD_GET_VARS = "get_vars"
+CMD_SET_VARS = "set_vars"
+CMD_INSPECT = "inspect"
+CMD_DELETE_NAMES = "delete_names"
+CMD_FETCH_ROWS = "fetch_rows"
 CMD_RESET = "reset"
 CMD_SHUTDOWN = "shutdown"
 
 # Sentinel value to signal interrupt
 INTERRUPTED_SENTINEL = {"__interrupted__": True}
 
+# Error reported for deferred rich output lost with its worker
+RICH_OUTPUT_LOST = "Interrupted: kernel restarted before the output was rendered"
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    """Read a memory field (e.g. VmRSS) from /proc/self/status, in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _max_rss() -> Optional[int]:
+    """Peak RSS of this process in bytes (VmHWM, or getrusage as a fallback)."""
+    peak = _read_status_kb("VmHWM")
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        if sys.platform != "darwin":
+            peak *= 1024
+    return peak
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS high-water mark (Linux only). Returns True on success."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _apply_memory_limit(limit_mb: Optional[int]):
+    """
+    Cap the worker's address space so runaway allocations raise MemoryError.
+    
+    RLIMIT_RSS is not enforced by Linux, so the address-space limit is used
+    as the practical ceiling. Has no effect where `resource` is unavailable.
+    """
+    if limit_mb is None or resource is None:
+        return
+    limit = limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _execute_with_accounting(code: str, namespace: dict) -> dict:
+    """
+    Execute code and record the peak memory growth it caused.
+    
+    Adds "peak_memory_delta" (bytes above the RSS at cell start, or None if
+    the platform cannot report it) to the result of _execute_code.
+    """
+    rss_before = _read_status_kb("VmRSS")
+    peak_before = _max_rss()
+    peak_reset = _reset_peak_rss()
+    
+    result = _execute_code(code, namespace)
+    
+    peak_after = _max_rss()
+    if rss_before is None:
+        rss_before = peak_before
+    if rss_before is None or peak_after is None:
+        result["peak_memory_delta"] = None
+    elif peak_reset or peak_after > peak_before:
+        result["peak_memory_delta"] = max(0, peak_after - rss_before)
+    else:
+        # High-water mark could not be reset and was not exceeded
+        current = _read_status_kb("VmRSS") or rss_before
+        result["peak_memory_delta"] = max(0, current - rss_before)
+    
+    return result
+
 
 def _execute_code(code: str, namespace: dict) -> dict:
     """
@@ -223,6 +696,16 @@ def _execute_code(code: str, namespace: dict) -> dict:
             "result_value": result_value
         }
     
+    except MemoryError as e:
+        # Drop the partially built objects before anything else allocates
+        gc.collect()
+        return {
+            "status": "error",
+            "output": stdout_capture.getvalue(),
+            "error": f"MemoryError: {str(e) or 'out of memory'}",
+            "result_value": None
+        }
+    
     except Exception as e:
         return {
             "status": "error",
@@ -232,16 +715,544 @@ def _execute_code(code: str, namespace: dict) -> dict:
         }
 
 
-def _worker_loop(request_queue: Queue, response_queue: Queue):
+def _pack_values(
+    values: dict[str, Any],
+    shm_min_bytes: Optional[int]
+) -> tuple[dict[str, bytes], dict[str, dict], dict[str, str]]:
+    """
+    Prepare several values for a single transfer.
+    
+    Each value is placed in shared memory or pickled individually, so that
+    one unpicklable value is reported by name instead of failing the batch.
+    
+    Returns:
+        Tuple of (pickled bytes by name, shm descriptors by name, errors by name)
+    """
+    pickled: dict[str, bytes] = {}
+    shared: dict[str, dict] = {}
+    errors: dict[str, str] = {}
+    
+    for name, value in values.items():
+        try:
+            descriptor = export_value(value, shm_min_bytes)
+        except OSError:
+            descriptor = None
+        if descriptor is not None:
+            shared[name] = descriptor
+            continue
+        try:
+            pickled[name] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            errors[name] = f"Value not serializable: {type(e).__name__}: {str(e)}"
+    
+    return pickled, shared, errors
+
+
+def _unpack_values(
+    pickled: dict[str, bytes],
+    shared: dict[str, dict]
+) -> tuple[dict[str, Any], dict[str, str]]:
+    """
+    Rebuild values produced by _pack_values.
+    
+    Returns:
+        Tuple of (values by name, errors by name)
+    """
+    values: dict[str, Any] = {}
+    errors: dict[str, str] = {}
+    
+    for name, descriptor in shared.items():
+        try:
+            values[name] = import_value(descriptor)
+        except Exception as e:
+            discard(descriptor)
+            errors[name] = f"Shared memory transfer failed: {type(e).__name__}: {str(e)}"
+    
+    for name, data in pickled.items():
+        try:
+            values[name] = pickle.loads(data)
+        except Exception as e:
+            errors[name] = f"Value not deserializable: {type(e).__name__}: {str(e)}"
+    
+    return values, errors
+
+
+# Limits for variable summaries computed by CMD_INSPECT
+SUMMARY_REPR_LENGTH = 80
+SUMMARY_SAMPLE_SIZE = 100
+
+_summary_repr = reprlib.Repr()
+_summary_repr.maxstring = SUMMARY_REPR_LENGTH
+_summary_repr.maxother = SUMMARY_REPR_LENGTH
+
+
+def _approx_size(value: Any, depth: int = 2) -> int:
+    """
+    Approximate the deep memory footprint of a value in bytes.
+    
+    Arrays and pandas objects report their buffers; containers are estimated
+    from a sample of their elements so the cost stays bounded for huge lists.
+    """
+    if HAS_NUMPY and isinstance(value, np.ndarray):
+        return sys.getsizeof(value) if value.base is None else value.nbytes
+    
+    if HAS_PANDAS and isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(index=True, deep=False)
+        total = int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        # Object columns only report pointer sizes; estimate the referents
+        frame = value.to_frame() if isinstance(value, (pd.Series, pd.Index)) else value
+        for _, column in frame.items():
+            if column.dtype == object and len(column):
+                sample = column.iloc[:SUMMARY_SAMPLE_SIZE]
+                per_item = sum(sys.getsizeof(v) for v in sample) / len(sample)
+                total += int(per_item * len(column))
+        return total
+    
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    
+    if isinstance(value, dict):
+        items = list(value.items())[:SUMMARY_SAMPLE_SIZE]
+        if items:
+            sampled = sum(_approx_size(k, depth - 1) + _approx_size(v, depth - 1) for k, v in items)
+            size += int(sampled * len(value) / len(items))
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)[:SUMMARY_SAMPLE_SIZE] if isinstance(value, (set, frozenset)) else value[:SUMMARY_SAMPLE_SIZE]
+        if items:
+            sampled = sum(_approx_size(v, depth - 1) for v in items)
+            size += int(sampled * len(value) / len(items))
+    
+    return size
+
+
+def _summarize_value(name: str, value: Any) -> dict:
+    """
+    Build a cheap summary of a namespace value without moving its data.
+    
+    Returns:
+        Dict with name, type, shape, dtype, size (approximate bytes) and repr
+    """
+    summary = {
+        "name": name,
+        "type": type(value).__name__,
+        "shape": None,
+        "dtype": None,
+        "size": 0,
+        "repr": ""
+    }
+    
+    try:
+        summary["size"] = _approx_size(value)
+    except Exception:
+        summary["size"] = sys.getsizeof(value)
+    
+    if HAS_NUMPY and isinstance(value, np.ndarray):
+        summary["shape"] = list(value.shape)
+        summary["dtype"] = str(value.dtype)
+        summary["repr"] = f"ndarray shape={tuple(value.shape)} dtype={value.dtype}"
+    elif HAS_PANDAS and isinstance(value, pd.DataFrame):
+        summary["shape"] = list(value.shape)
+        dtypes = {str(dtype) for dtype in value.dtypes}
+        summary["dtype"] = dtypes.pop() if len(dtypes) == 1 else "mixed"
+        summary["repr"] = _summary_repr.repr(f"DataFrame {value.shape[0]}×{value.shape[1]}: {list(value.columns)}")
+    elif HAS_PANDAS and isinstance(value, (pd.Series, pd.Index)):
+        summary["shape"] = [len(value)]
+        summary["dtype"] = str(value.dtype)
+        summary["repr"] = f"{type(value).__name__} name={value.name!r} length={len(value)}"
+    else:
+        if hasattr(value, "__len__") and not isinstance(value, type):
+            try:
+                summary["shape"] = [len(value)]
+            except Exception:
+                pass
+        try:
+            summary["repr"] = _summary_repr.repr(value)
+        except Exception as e:
+            summary["repr"] = f"<repr failed: {type(e).__name__}>"
+    
+    return summary
+
+
+def _inspect_namespace(
+    namespace: dict,
+    cache: dict[str, dict],
+    names: Optional[list[str]] = None
+) -> list[dict]:
+    """
+    Summarize namespace values, reusing cached summaries.
+    
+    Args:
+        namespace: Worker namespace
+        cache: Summaries computed since the last namespace change
+        names: Names to summarize (all public names if None)
+    
+    Returns:
+        List of summaries, largest first
+    """
+    if names is None:
+        names = [n for n in namespace if not n.startswith('_')]
+    
+    summaries = []
+    for name in names:
+        if name not in namespace:
+            continue
+        if name not in cache:
+            cache[name] = _summarize_value(name, namespace[name])
+        summaries.append(cache[name])
+    
+    summaries.sort(key=lambda summary: summary["size"], reverse=True)
+    return summaries
+
+
+class QueryError(ValueError):
+    """Raised for a row query that cannot be applied to a retained result."""
+
+
+def _column_position(frame: Any, name: Any) -> int:
+    """Find a column by label, or by its string form as sent by the frontend."""
+    for position, column in enumerate(frame.columns):
+        if column == name or str(column) == str(name):
+            return position
+    raise QueryError(f"Unknown column: {name}")
+
+
+def _coerce_operand(series: Any, value: Any) -> Any:
+    """Convert a JSON filter value to the type of the column it is compared with."""
+    kind = getattr(series.dtype, "kind", "O")
+    if isinstance(value, str):
+        if kind in "iuf":
+            try:
+                return float(value)
+            except ValueError:
+                raise QueryError(f"Cannot compare numeric column with {value!r}")
+        if kind == "b":
+            return value.strip().lower() in ("true", "1")
+        if kind == "M":
+            return pd.Timestamp(value)
+    return value
+
+
+def _filter_mask(series: Any, op: str, value: Any) -> Any:
+    """Evaluate one filter over a column as a boolean ndarray (missing -> False)."""
+    if op == "isnull":
+        mask = series.isna()
+    elif op == "notnull":
+        mask = series.notna()
+    elif op == "contains":
+        mask = series.astype("string").str.contains(str(value), case=False, regex=False)
+    else:
+        value = _coerce_operand(series, value)
+        compare = {
+            "==": series.eq, "!=": series.ne,
+            "<": series.lt, "<=": series.le,
+            ">": series.gt, ">=": series.ge,
+        }[op]
+        try:
+            mask = compare(value)
+        except TypeError as e:
+            raise QueryError(str(e))
+    return mask.to_numpy(dtype=bool, na_value=False)
+
+
+def _query_positions(frame: Any, query: dict) -> Any:
+    """
+    Compute the row order of a sorted and filtered view of a DataFrame.
+    
+    Filters are combined with AND; sort keys apply in order. Only the row
+    positions are computed, so a view costs 4 bytes per row (8 for frames
+    of 2**31 rows or more) rather than a copy of the frame.
+    
+    Args:
+        frame: Retained result
+        query: Dict with optional "filters" (list of {column, op, value})
+            and "sort" (list of {column, ascending})
+    
+    Returns:
+        Int32 (or int64) ndarray of row positions into frame
+    """
+    dtype = np.int32 if len(frame) <= np.iinfo(np.int32).max else np.int64
+    positions = np.arange(len(frame), dtype=dtype)
+    
+    filters = query.get("filters") or []
+    if filters:
+        mask = np.ones(len(frame), dtype=bool)
+        for row_filter in filters:
+            op = row_filter.get("op")
+            if op not in QUERY_FILTER_OPS:
+                raise QueryError(f"Unsupported filter operator: {op}")
+            series = frame.iloc[:, _column_position(frame, row_filter.get("column"))]
+            mask &= _filter_mask(series, op, row_filter.get("value"))
+        positions = np.flatnonzero(mask).astype(dtype, copy=False)
+    
+    sort = query.get("sort") or []
+    if sort:
+        keys = frame.iloc[positions, [_column_position(frame, key.get("column")) for key in sort]]
+        keys = keys.set_axis(range(len(sort)), axis=1).set_axis(positions, axis=0)
+        try:
+            keys = keys.sort_values(
+                by=list(range(len(sort))),
+                ascending=[bool(key.get("ascending", True)) for key in sort],
+                kind="stable",
+                na_position="last"
+            )
+        except TypeError as e:
+            raise QueryError(f"Cannot sort column: {e}")
+        positions = keys.index.to_numpy().astype(dtype, copy=False)
+    
+    return positions
+
+
+class _ResultStore:
+    """
+    Worker-side store of each cell's last DataFrame result.
+    
+    Keeps the frames so any window of rows can be served on demand, plus an
+    LRU cache of sorted/filtered row orders per (cell, query), bounded by
+    count and by their total size. A row order larger than the whole
+    budget is computed for each request and never cached.
+    """
+    
+    def __init__(self, max_views: int = MAX_QUERY_VIEWS, max_view_bytes: int = MAX_QUERY_VIEW_BYTES):
+        self.frames: dict[str, Any] = {}
+        self.views: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        self.max_views = max_views
+        self.max_view_bytes = max_view_bytes
+        self.view_bytes = 0
+    
+    def retain(self, cell_id: str, value: Any):
+        """Keep a cell's result if it is a DataFrame, replacing any older one."""
+        self.release([cell_id])
+        if HAS_PANDAS and isinstance(value, pd.DataFrame):
+            self.frames[cell_id] = value
+    
+    def release(self, cell_ids: list[str]):
+        """Drop the results and cached views of the given cells."""
+        cell_ids = set(cell_ids)
+        for cell_id in cell_ids:
+            self.frames.pop(cell_id, None)
+        for key in [key for key in self.views if key[0] in cell_ids]:
+            self.view_bytes -= self.views.pop(key).nbytes
+    
+    def clear(self):
+        """Drop every retained result."""
+        self.frames.clear()
+        self.views.clear()
+        self.view_bytes = 0
+    
+    def _positions(self, cell_id: str, frame: Any, query: dict) -> Any:
+        """Row order for a query, computed once and then served from the cache."""
+        key = (cell_id, json.dumps(query, sort_keys=True, default=str))
+        if key in self.views:
+            self.views.move_to_end(key)
+            return self.views[key]
+        
+        positions = _query_positions(frame, query)
+        if positions.nbytes > self.max_view_bytes:
+            return positions
+        self.views[key] = positions
+        self.view_bytes += positions.nbytes
+        while len(self.views) > self.max_views or self.view_bytes > self.max_view_bytes:
+            self.view_bytes -= self.views.popitem(last=False)[1].nbytes
+        return positions
+    
+    def fetch(
+        self,
+        cell_id: str,
+        offset: int,
+        limit: int,
+        frame_format: str,
+        query: Optional[dict] = None
+    ) -> dict:
+        """
+        Serialize a window of rows from a cell's retained result.
+        
+        Args:
+            cell_id: Cell whose result to page through
+            offset: First row of the window
+            limit: Number of rows (capped at MAX_FETCH_ROWS)
+            frame_format: DataFrame wire format
+            query: Optional sort/filter applied before windowing
+        
+        Returns:
+            Dict with status, offset, total_rows and the window's rows
+            (see _frame_rows), or status "error" with an error message
+        """
+        frame = self.frames.get(cell_id)
+        if frame is None:
+            return {"status": "error", "error": f"No result retained for cell {cell_id}"}
+        
+        offset = max(0, int(offset))
+        limit = max(0, min(int(limit), MAX_FETCH_ROWS))
+        
+        if query and (query.get("sort") or query.get("filters")):
+            try:
+                positions = self._positions(cell_id, frame, query)
+            except QueryError as e:
+                return {"status": "error", "error": f"QueryError: {e}"}
+            total_rows = len(positions)
+            window = frame.iloc[positions[offset:offset + limit]]
+        else:
+            total_rows = len(frame)
+            window = frame.iloc[offset:offset + limit]
+        
+        return {
+            "status": "ok",
+            "offset": offset,
+            "total_rows": total_rows,
+            "format": FRAME_FORMAT_RECORDS,
+            **_frame_rows(
+                window, FRAME_FORMAT_COLUMNAR if frame_format == FRAME_FORMAT_ARROW else frame_format
+            )
+        }
+
+
+def _delete_names(
+    namespace: dict,
+    names: list[str],
+    results: Optional[_ResultStore] = None,
+    cell_ids: list[str] = ()
+) -> dict:
+    """
+    Remove names from the namespace and collect garbage.
+    
+    Retained results of the given cells are released as well.
+    
+    Returns:
+        Dict with the deleted names, the approximate size of the released
+        values and the drop in process RSS after garbage collection
+    """
+    rss_before = _read_status_kb("VmRSS")
+    
+    deleted = []
+    approx_bytes = 0
+    for name in names:
+        if name not in namespace:
+            continue
+        try:
+            approx_bytes += _approx_size(namespace[name])
+        except Exception:
+            pass
+        del namespace[name]
+        deleted.append(name)
+    
+    if results is not None:
+        results.release(cell_ids)
+    
+    gc.collect()
+    
+    rss_after = _read_status_kb("VmRSS")
+    freed_bytes = None
+    if rss_before is not None and rss_after is not None:
+        freed_bytes = max(0, rss_before - rss_after)
+    
+    return {
+        "status": "ok",
+        "deleted": deleted,
+        "approx_bytes": approx_bytes,
+        "freed_bytes": freed_bytes
+    }
+
+
+def _render_preview(preview: Optional[dict], frame_format: str, encode: bool) -> Any:
+    """Serialize a preview, optionally straight to JSON bytes (wire.RawJSON)."""
+    if preview is None:
+        return None
+    rich_output = _serialize_preview(preview, frame_format)
+    return encode_json(rich_output) if encode else rich_output
+
+
+def _render(value: Any, serialize_args: tuple, encode: bool) -> Any:
+    """Serialize rich output, optionally straight to JSON bytes (wire.RawJSON)."""
+    frame_format, *preview_args = serialize_args
+    return _render_preview(_rich_preview(value, *preview_args), frame_format, encode)
+
+
+def _render_loop(jobs: SimpleQueue, rich_pipe: Any, frame_format: str, encode: bool):
+    """
+    Serialize deferred rich output on a worker thread.
+    
+    Each job is (cell_id, run_id, preview), the preview taken by the
+    worker (_rich_preview) before it answered the execution; being a copy,
+    it is unaffected by cells that run while it is rendered. The
+    serialized output (or the error that prevented it) is sent on
+    rich_pipe. Anything printed while rendering (e.g. warnings) is
+    discarded rather than attributed to the running cell.
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        cell_id, run_id, preview = job
+        del job
+        try:
+            with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+                rich_output = _render_preview(preview, frame_format, encode)
+            error = ""
+        except Exception as e:
+            rich_output = None
+            error = f"{type(e).__name__}: {str(e)}"
+        del preview
+        if rich_pipe is not None:
+            try:
+                rich_pipe.send({
+                    "cell_id": cell_id,
+                    "run_id": run_id,
+                    "rich_output": rich_output,
+                    "error": error
+                })
+            except OSError:
+                rich_pipe = None  # The notebook server has gone away
+        del rich_output
+
+
+def _reply(response_queue: Queue, cmd: dict, response: dict):
+    """Send a command's response, tagged with the command's request_id."""
+    response_queue.put({**response, "request_id": cmd.get("request_id")})
+
+
+def _worker_loop(
+    request_queue: Queue,
+    response_queue: Queue,
+    shm_min_bytes: Optional[int] = SHM_MIN_BYTES,
+    memory_limit_mb: Optional[int] = None,
+    frame_format: str = DEFAULT_FRAME_FORMAT,
+    column_stats: bool = False,
+    array_modes: tuple[str, str] = (DEFAULT_ARRAY_1D_MODE, DEFAULT_ARRAY_2D_MODE),
+    rich_pipe: Optional[Any] = None,
+    encode_rich_output: bool = False
+):
     """
     Worker process main loop.
     
     Receives commands from request_queue, executes them, and sends
     results to response_queue. Maintains a persistent namespace.
+    
+    Executions that ask for deferred rich output are answered as soon as
+    the code has run and a preview of the value has been copied; the
+    preview is serialized by a render thread and sent on rich_pipe. With
+    encode_rich_output, rich output is sent as encoded JSON (wire.RawJSON)
+    instead of Python objects.
     """
+    _apply_memory_limit(memory_limit_mb)
+    
     namespace: dict[str, Any] = {}
+    # Variable summaries, invalidated whenever the namespace may have changed
+    inspect_cache: dict[str, dict] = {}
+    # Last DataFrame result of each cell, kept so its rows can be paged
+    results = _ResultStore()
+    serialize_args = (frame_format, column_stats, *array_modes)
+    
+    render_jobs: SimpleQueue = SimpleQueue()
+    if rich_pipe is not None:
+        threading.Thread(
+            target=_render_loop,
+            args=(render_jobs, rich_pipe, frame_format, encode_rich_output),
+            daemon=True
+        ).start()
     
     while True:
+        cmd: dict = {}
         try:
             # Wait for a command
             cmd = request_queue.get()
@@ -251,45 +1262,119 @@ def _worker_loop(request_queue: Queue, response_queue: Queue):
             
             cmd_type = cmd.get("type")
             
+            if cmd_type not in (CMD_GET_VAR, CMD_GET_VARS, CMD_INSPECT, CMD_FETCH_ROWS):
+                inspect_cache.clear()
+            
             if cmd_type == CMD_EXECUTE:
                 code = cmd.get("code", "")
+                cell_id = cmd.get("cell_id")
+                results.release([cell_id])
                 if not code.strip():
                     result = {
                         "status": "success",
                         "output": "",
                         "rich_output": None,
-                        "error": ""
+                        "error": "",
+                        "peak_memory_delta": None
                     }
                 else:
-                    result = _execute_code(code, namespace)
+                    result = _execute_with_accounting(code, namespace)
+                    if memory_limit_mb is not None and result["error"].startswith("MemoryError"):
+                        result["error"] = (
+                            f"MemoryError: cell exceeded the kernel memory limit "
+                            f"of {memory_limit_mb} MB ({result['error'][len('MemoryError: '):]})"
+                        )
                     # Serialize rich output while we still have result_value
                     result_value = result.pop("result_value", None)
-                    result["rich_output"] = serialize_rich_output(result_value)
-                response_queue.put(result)
+                    if (
+                        cmd.get("defer_rich_output") and rich_pipe is not None
+                        and _has_rich_output(result_value)
+                    ):
+                        result["rich_output"] = None
+                        result["rich_pending"] = True
+                        # Copy what will be shown now; later cells may change the value
+                        render_jobs.put((
+                            cell_id, cmd.get("run_id"),
+                            _rich_preview(result_value, *serialize_args[1:])
+                        ))
+                    else:
+                        result["rich_output"] = _render(
+                            result_value, serialize_args, encode_rich_output
+                        )
+                    if cell_id is not None:
+                        results.retain(cell_id, result_value)
+                    del result_value
+                _reply(response_queue, cmd, result)
             
             elif cmd_type == CMD_GET_VAR:
                 name = cmd.get("name")
                 value = namespace.get(name)
+                # Large arrays/frames go through shared memory instead of the pipe
+                try:
+                    descriptor = export_value(value, shm_min_bytes)
+                except OSError:
+                    descriptor = None
+                if descriptor is not None:
+                    _reply(response_queue, cmd, {"shm": descriptor})
+                    continue
                 # Try to send the value; if not picklable, send None
                 try:
-                    response_queue.put({"value": value})
+                    _reply(response_queue, cmd, {"value": value})
                 except Exception:
-                    response_queue.put({"value": None, "error": "Value not serializable"})
+                    _reply(response_queue, cmd, {"value": None, "error": "Value not serializable"})
             
             elif cmd_type == CMD_SET_VAR:
                 name = cmd.get("name")
-                value = cmd.get("value")
+                if "shm" in cmd:
+                    value = import_value(cmd["shm"])
+                else:
+                    value = cmd.get("value")
                 namespace[name] = value
-                response_queue.put({"status": "ok"})
+                _reply(response_queue, cmd, {"status": "ok"})
+            
+            elif cmd_type == CMD_GET_VARS:
+                names = cmd.get("names", [])
+                found = {name: namespace[name] for name in names if name in namespace}
+                pickled, shared, errors = _pack_values(found, shm_min_bytes)
+                for name in names:
+                    if name not in namespace:
+                        errors[name] = f"NameError: name '{name}' is not defined"
+                _reply(response_queue, cmd, {
+                    "status": "ok",
+                    "values": pickled,
+                    "shm": shared,
+                    "errors": errors
+                })
+            
+            elif cmd_type == CMD_SET_VARS:
+                values, errors = _unpack_values(cmd.get("values", {}), cmd.get("shm", {}))
+                namespace.update(values)
+                _reply(response_queue, cmd, {"status": "ok", "errors": errors})
+            
+            elif cmd_type == CMD_INSPECT:
+                summaries = _inspect_namespace(namespace, inspect_cache, cmd.get("names"))
+                _reply(response_queue, cmd, {"status": "ok", "variables": summaries})
+            
+            elif cmd_type == CMD_DELETE_NAMES:
+                _reply(response_queue, cmd, _delete_names(
+                    namespace, cmd.get("names", []), results, cmd.get("cell_ids", [])
+                ))
+            
+            elif cmd_type == CMD_FETCH_ROWS:
+                _reply(response_queue, cmd, results.fetch(
+                    cmd.get("cell_id"), cmd.get("offset", 0), cmd.get("limit", MAX_ROWS),
+                    frame_format, cmd.get("query")
+                ))
             
             elif cmd_type == CMD_RESET:
                 namespace.clear()
-                response_queue.put({"status": "ok"})
+                results.clear()
+                _reply(response_queue, cmd, {"status": "ok"})
         
         except Exception as e:
             # Send error back
             try:
-                response_queue.put({
+                _reply(response_queue, cmd, {
                     "status": "error",
                     "output": "",
                     "error": f"Worker error: {type(e).__name__}: {str(e)}"
@@ -298,6 +1383,58 @@ def _worker_loop(request_queue: Queue, response_queue: Queue):
                 pass  # Queue might be broken
 
 
+def _pump_rich_outputs(rich_pipe: Any, pending: dict, kernel_ref: weakref.ref):
+    """
+    Deliver deferred rich output from one worker to its kernel.
+    
+    Runs on a thread in the notebook server until the pipe reaches EOF,
+    which happens once the worker process has exited (the worker holds the
+    only write end). Runs still in `pending` at that point were lost with
+    the worker and are reported with an error. Holds only a weak reference
+    so the kernel can still be garbage collected.
+    """
+    while True:
+        try:
+            message = rich_pipe.recv()
+        except Exception:
+            break  # Worker gone, or a message cut short by a killed worker
+        pending.pop(message["run_id"], None)
+        kernel = kernel_ref()
+        if kernel is not None:
+            kernel._deliver_rich_output(message)
+        del kernel
+    
+    kernel = kernel_ref()
+    for run_id, cell_id in list(pending.items()):
+        pending.pop(run_id, None)
+        if kernel is not None:
+            kernel._deliver_rich_output({
+                "cell_id": cell_id,
+                "run_id": run_id,
+                "rich_output": None,
+                "error": RICH_OUTPUT_LOST
+            })
+    rich_pipe.close()
+
+
+def _discard_response(response: dict):
+    """Release the shared memory segments of a response that will not be read."""
+    shared = response.get("shm")
+    if isinstance(shared, dict) and not is_descriptor(shared):
+        for descriptor in shared.values():
+            discard(descriptor)
+    else:
+        discard(shared)
+
+
+class _WorkerDied(Exception):
+    """Raised while waiting for a response when the worker process has exited."""
+    
+    def __init__(self, exitcode: Optional[int]):
+        super().__init__(f"Worker exited with code {exitcode}")
+        self.exitcode = exitcode
+
+
 class NotebookKernel:
     """
     Executes Python code in a separate worker process.
@@ -311,13 +1448,45 @@ class NotebookKernel:
     - Returns the value of the last expression (like Jupyter)
     """
     
-    def __init__(self, timeout: int = DEFAULT_TIMEOUT):
+    def __init__(
+        self,
+        timeout: int = DEFAULT_TIMEOUT,
+        shm_min_bytes: Optional[int] = SHM_MIN_BYTES,
+        memory_limit_mb: Optional[int] = DEFAULT_MEMORY_LIMIT_MB,
+        frame_format: str = DEFAULT_FRAME_FORMAT,
+        column_stats: bool = False,
+        array_1d_mode: str = DEFAULT_ARRAY_1D_MODE,
+        array_2d_mode: str = DEFAULT_ARRAY_2D_MODE,
+        encode_rich_output: bool = False
+    ):
         self.timeout = timeout
+        # DataFrame rich output encoding ("columnar", "records" or "arrow";
+        # arrow data only reaches clients with encode_rich_output)
+        self.frame_format = frame_format
+        # Attach per-column statistics to DataFrame rich output
+        self.column_stats = column_stats
+        # Preview reduction of large 1-D and 2-D arrays (see downsample.py)
+        self.array_modes = (array_1d_mode, array_2d_mode)
+        # Return rich output as JSON bytes encoded in the worker (wire.RawJSON)
+        self.encode_rich_output = encode_rich_output
+        # Address-space ceiling for the worker in MB (None = unlimited)
+        self.memory_limit_mb = memory_limit_mb
+        # Minimum size for shared-memory variable transfer (None disables it)
+        self.shm_min_bytes = shm_min_bytes
         self.cell_outputs: dict[str, dict] = {}
         
         # Lock for thread-safe access to worker and queues
         self._lock = threading.Lock()
         
+        # Serializes request/response round trips on the shared queues so that
+        # concurrent callers (e.g. an inspector request during a cascade)
+        # never receive each other's responses. interrupt() does not take it.
+        self._channel_lock = threading.Lock()
+        # Tags each command; the worker echoes it in the response, so the
+        # late reply to a request that timed out is never taken for the
+        # reply to a later one
+        self._request_ids = itertools.count(1)
+        
         # Worker process and communication queues
         self._request_queue: Optional[Queue] = None
         self._response_queue: Optional[Queue] = None
@@ -327,6 +1496,18 @@ class NotebookKernel:
         self._executing: bool = False
         self._current_cell_id: Optional[str] = None
         
+        # Deferred rich output: called (on a background thread) with
+        # {cell_id, run_id, rich_output, error} when a render finishes
+        self.on_rich_output: Optional[Callable[[dict], None]] = None
+        self._run_ids = itertools.count(1)
+        # run_id -> cell_id of renders the current worker still owes
+        self._pending_rich: dict[int, str] = {}
+        # Guards cell_outputs against renders that finish before the reply
+        # of their execution has been read
+        self._rich_lock = threading.Lock()
+        self._run_in_flight: Optional[int] = None
+        self._early_rich: dict[int, Any] = {}
+        
         # Start the worker
         self._start_worker()
     
@@ -335,15 +1516,39 @@ class NotebookKernel:
         # Clean up existing worker if any
         self._stop_worker()
         
+        # Share one resource tracker with the worker for shared memory segments
+        ensure_tracker()
+        
         # Create new queues and worker
         self._request_queue = Queue()
         self._response_queue = Queue()
+        # One-way pipe rather than a queue: it has a single writer, so no
+        # cross-process lock can be left held by a killed worker
+        rich_reader, rich_writer = multiprocessing.Pipe(duplex=False)
+        self._pending_rich = {}
         self._worker = Process(
             target=_worker_loop,
-            args=(self._request_queue, self._response_queue),
+            args=(
+                self._request_queue,
+                self._response_queue,
+                self.shm_min_bytes,
+                self.memory_limit_mb,
+                self.frame_format,
+                self.column_stats,
+                self.array_modes,
+                rich_writer,
+                self.encode_rich_output
+            ),
             daemon=True
         )
         self._worker.start()
+        # Keep no write end here, so the pump sees EOF when the worker exits
+        rich_writer.close()
+        threading.Thread(
+            target=_pump_rich_outputs,
+            args=(rich_reader, self._pending_rich, weakref.ref(self)),
+            daemon=True
+        ).start()
     
     def _stop_worker(self):
         """Stop the worker process."""
@@ -376,17 +1581,44 @@ class NotebookKernel:
     
     def reset(self):
         """Reset the kernel namespace."""
-        with self._lock:
+        with self._channel_lock, self._lock:
             self._ensure_worker()
             self.cell_outputs.clear()
             
             try:
-                self._request_queue.put({"type": CMD_RESET})
-                self._response_queue.get(timeout=5)
+                request_id = next(self._request_ids)
+                self._request_queue.put({"type": CMD_RESET, "request_id": request_id})
+                self._wait_for_response(self._response_queue, self._worker, 5, request_id)
             except Exception:
                 # If reset fails, restart the worker
                 self._start_worker()
     
+    def _request(self, cmd: dict, timeout: float = 5) -> dict:
+        """
+        Send a command to the worker and wait for its response.
+        
+        On a timeout the worker is left to finish the command; its reply
+        is dropped when a later request reads past it.
+        
+        Raises:
+            RuntimeError: If the worker is not available
+            queue.Empty: If no response arrives within the timeout
+            _WorkerDied: If the worker exits without responding
+        """
+        with self._channel_lock:
+            with self._lock:
+                self._ensure_worker()
+                request_queue = self._request_queue
+                response_queue = self._response_queue
+                worker = self._worker
+            
+            if request_queue is None or response_queue is None:
+                raise RuntimeError("Kernel not available")
+            
+            request_id = next(self._request_ids)
+            request_queue.put({**cmd, "request_id": request_id})
+            return self._wait_for_response(response_queue, worker, timeout, request_id)
+    
     @property
     def is_busy(self) -> bool:
         """Check if the kernel is currently executing code."""
@@ -438,7 +1670,8 @@ class NotebookKernel:
         self, 
         cell_id: str, 
         code: str,
-        timeout: Optional[int] = None
+        timeout: Optional[int] = None,
+        defer_rich_output: bool = False
     ) -> dict:
         """
         Execute Python code and capture output.
@@ -447,18 +1680,30 @@ class NotebookKernel:
             cell_id: Unique identifier for the cell
             code: Python code to execute
             timeout: Optional timeout in seconds (defaults to kernel timeout)
+            defer_rich_output: Return as soon as the code has run and render
+                the rich output in the background; it is then delivered to
+                on_rich_output with this result's run_id
         
         Returns:
             Dict with keys:
             - status: "success" or "error"
             - output: Combined stdout and last expression value
+            - rich_output: Structured output (None while it is pending; a
+              wire.RawJSON if the kernel encodes rich output)
+            - rich_pending: Whether rich output will be delivered later
+            - run_id: Identifies this execution in deferred deliveries
             - error: Error message if any
+            - peak_memory_delta: Peak memory growth in bytes during execution
+              (None if unknown)
         """
+        run_id = next(self._run_ids)
         if not code.strip():
             result = {
                 "status": "success",
                 "output": "",
                 "rich_output": None,
+                "rich_pending": False,
+                "run_id": run_id,
                 "error": ""
             }
             self.cell_outputs[cell_id] = result
@@ -466,9 +1711,16 @@ class NotebookKernel:
         
         effective_timeout = timeout if timeout is not None else self.timeout
         
+        # Wait for any other round trip (e.g. a variable fetch) to finish
+        self._channel_lock.acquire()
+        
         # Track execution state
         self._executing = True
         self._current_cell_id = cell_id
+        with self._rich_lock:
+            self._run_in_flight = run_id
+        result: dict = {}
+        pending_rich: dict[int, str] = {}
         
         try:
             # Capture queue references under lock to avoid race with interrupt()
@@ -476,6 +1728,8 @@ class NotebookKernel:
                 self._ensure_worker()
                 request_queue = self._request_queue
                 response_queue = self._response_queue
+                worker = self._worker
+                pending_rich = self._pending_rich
             
             # Check if queues are valid (could be None if interrupted between lock release and here)
             if request_queue is None or response_queue is None:
@@ -489,10 +1743,18 @@ class NotebookKernel:
                 return result
             
             # Send execution request to worker (outside lock to avoid blocking)
+            if defer_rich_output:
+                # Registered up front: the render may finish before the reply is read
+                pending_rich[run_id] = cell_id
+            request_id = next(self._request_ids)
             try:
                 request_queue.put({
                     "type": CMD_EXECUTE,
-                    "code": code
+                    "request_id": request_id,
+                    "cell_id": cell_id,
+                    "code": code,
+                    "run_id": run_id,
+                    "defer_rich_output": defer_rich_output
                 })
             except (AttributeError, OSError):
                 # Queue was closed/replaced by interrupt
@@ -507,7 +1769,7 @@ class NotebookKernel:
             
             # Wait for response with timeout (outside lock to allow interrupt)
             try:
-                result = response_queue.get(timeout=effective_timeout)
+                result = self._wait_for_response(response_queue, worker, effective_timeout, request_id)
                 
                 # Check if this is an interrupt sentinel
                 if isinstance(result, dict) and result.get("__interrupted__"):
@@ -528,6 +1790,18 @@ class NotebookKernel:
                 # Restart worker (this kills the hanging process)
                 with self._lock:
                     self._start_worker()
+            except _WorkerDied as died:
+                with self._lock:
+                    interrupted = self._worker is not worker
+                    if not interrupted:
+                        # Crashed on its own (e.g. OOM killer) - start a fresh worker
+                        self._start_worker()
+                result = {
+                    "status": "error",
+                    "output": "",
+                    "rich_output": None,
+                    "error": "Interrupted" if interrupted else self._describe_worker_death(died.exitcode)
+                }
             except (AttributeError, OSError):
                 # Queue was closed/replaced by interrupt
                 result = {
@@ -537,55 +1811,349 @@ class NotebookKernel:
                     "error": "Interrupted"
                 }
             
-            # Ensure rich_output is present
+            # Ensure rich_output and memory accounting are present
             if "rich_output" not in result:
                 result["rich_output"] = None
+            if "peak_memory_delta" not in result:
+                result["peak_memory_delta"] = None
+            result["rich_pending"] = bool(result.get("rich_pending"))
+            result["run_id"] = run_id
         finally:
+            if not result.get("rich_pending"):
+                pending_rich.pop(run_id, None)
+            with self._rich_lock:
+                self._run_in_flight = None
+                early = self._early_rich.pop(run_id, None)
+                if result:
+                    self.cell_outputs[cell_id] = (
+                        {**result, "rich_output": early, "rich_pending": False}
+                        if early is not None and result.get("rich_pending") else result
+                    )
             self._executing = False
             self._current_cell_id = None
+            self._channel_lock.release()
         
-        self.cell_outputs[cell_id] = result
         return result
     
-    def get_variable(self, name: str) -> Any:
-        """Get a variable from the namespace."""
-        with self._lock:
-            self._ensure_worker()
-            request_queue = self._request_queue
-            response_queue = self._response_queue
+    def _deliver_rich_output(self, message: dict):
+        """Record a finished deferred render and pass it to on_rich_output."""
+        with self._rich_lock:
+            if message["run_id"] == self._run_in_flight:
+                # Rendered before execute_cell() has read the reply
+                self._early_rich[message["run_id"]] = message["rich_output"]
+            else:
+                result = self.cell_outputs.get(message["cell_id"])
+                if result is not None and result.get("run_id") == message["run_id"]:
+                    # Replace rather than update: the caller of execute_cell()
+                    # may still hold the original result
+                    self.cell_outputs[message["cell_id"]] = {
+                        **result, "rich_output": message["rich_output"], "rich_pending": False
+                    }
         
-        if request_queue is None or response_queue is None:
-            return None
+        callback = self.on_rich_output
+        if callback is not None:
+            try:
+                callback(message)
+            except Exception:
+                pass  # A failing listener must not stop the pump
+    
+    @staticmethod
+    def _wait_for_response(
+        response_queue: Queue,
+        worker: Optional[Process],
+        timeout: float,
+        request_id: int
+    ) -> dict:
+        """
+        Wait for the response to a request while watching the worker process.
+        
+        Responses to other requests are late replies to requests that
+        timed out; they are dropped, along with any shared memory they
+        carry. The interrupt sentinel is returned as is.
+        
+        Raises:
+            queue.Empty: If no response arrives within the timeout
+            _WorkerDied: If the worker exits without responding
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Empty
+            try:
+                response = response_queue.get(timeout=min(WORKER_POLL_INTERVAL, remaining))
+            except Empty:
+                if worker is None or worker.is_alive():
+                    continue
+                # Drain anything the worker managed to send before exiting
+                try:
+                    response = response_queue.get(timeout=WORKER_POLL_INTERVAL)
+                except Empty:
+                    raise _WorkerDied(worker.exitcode)
+            if response.get("__interrupted__"):
+                return response
+            if response.pop("request_id", None) == request_id:
+                return response
+            _discard_response(response)
+    
+    def _describe_worker_death(self, exitcode: Optional[int]) -> str:
+        """Build a per-cell error message for a worker that died mid-execution."""
+        if exitcode == -9:
+            limit = f" (limit {self.memory_limit_mb} MB)" if self.memory_limit_mb else ""
+            return (
+                "MemoryError: kernel process was killed while running this cell, "
+                f"most likely by the out-of-memory killer{limit}. "
+                "The kernel has been restarted and all variables were lost."
+            )
+        if exitcode is not None and exitcode < 0:
+            reason = f"killed by signal {-exitcode}"
+        else:
+            reason = f"exited with code {exitcode}"
+        return (
+            f"KernelDied: kernel process {reason} while running this cell. "
+            "The kernel has been restarted and all variables were lost."
+        )
+    
+    def get_variable(self, name: str) -> Any:
+        """
+        Get a variable from the namespace.
         
+        Large numeric ndarrays and the numeric columns of DataFrames are
+        returned as views backed by a shared memory segment rather than
+        being pickled through the queue.
+        """
         try:
-            request_queue.put({
+            response = self._request({
                 "type": CMD_GET_VAR,
                 "name": name
             })
-            response = response_queue.get(timeout=5)
+            if "shm" in response:
+                return import_value(response["shm"])
             return response.get("value")
         except Exception:
             return None
     
     def set_variable(self, name: str, value: Any):
-        """Set a variable in the namespace."""
-        with self._lock:
-            self._ensure_worker()
-            request_queue = self._request_queue
-            response_queue = self._response_queue
-        
-        if request_queue is None or response_queue is None:
-            return
+        """Set a variable in the namespace (via shared memory for large arrays)."""
+        cmd = {"type": CMD_SET_VAR, "name": name}
+        try:
+            descriptor = export_value(value, self.shm_min_bytes)
+        except OSError:
+            descriptor = None
+        if descriptor is not None:
+            cmd["shm"] = descriptor
+        else:
+            cmd["value"] = value
         
         try:
-            request_queue.put({
-                "type": CMD_SET_VAR,
-                "name": name,
-                "value": value
-            })
-            response_queue.get(timeout=5)
+            response = self._request(cmd)
+            if response.get("status") != "ok":
+                discard(descriptor)
         except Exception:
-            pass
+            discard(descriptor)
+    
+    def get_variables(self, names: list[str], timeout: float = 5) -> dict:
+        """
+        Get several variables from the namespace in a single round trip.
+        
+        Args:
+            names: Variable names to fetch
+            timeout: Seconds to wait for the worker
+        
+        Returns:
+            Dict with keys:
+            - values: Dict of name -> value for every name that could be fetched
+            - errors: Dict of name -> error message (undefined or unpicklable)
+        """
+        try:
+            response = self._request({
+                "type": CMD_GET_VARS,
+                "names": list(names)
+            }, timeout=timeout)
+        except Exception as e:
+            message = f"Kernel error: {type(e).__name__}: {str(e)}"
+            return {"values": {}, "errors": {name: message for name in names}}
+        
+        if response.get("status") != "ok":
+            message = response.get("error") or "Kernel error"
+            return {"values": {}, "errors": {name: message for name in names}}
+        
+        values, errors = _unpack_values(response.get("values", {}), response.get("shm", {}))
+        errors.update(response.get("errors", {}))
+        return {"values": values, "errors": errors}
+    
+    def set_variables(self, mapping: dict[str, Any], timeout: float = 5) -> dict:
+        """
+        Set several variables in the namespace in a single round trip.
+        
+        Values that cannot be pickled are reported per name and are not sent;
+        all other values are still set.
+        
+        Args:
+            mapping: Dict of name -> value
+            timeout: Seconds to wait for the worker
+        
+        Returns:
+            Dict with keys:
+            - status: "ok" if every value was set, "error" otherwise
+            - errors: Dict of name -> error message
+        """
+        pickled, shared, errors = _pack_values(mapping, self.shm_min_bytes)
+        
+        try:
+            response = self._request({
+                "type": CMD_SET_VARS,
+                "values": pickled,
+                "shm": shared
+            }, timeout=timeout)
+            if response.get("status") != "ok":
+                raise RuntimeError(response.get("error") or "Kernel error")
+            errors.update(response.get("errors", {}))
+        except Exception as e:
+            for descriptor in shared.values():
+                discard(descriptor)
+            message = f"{type(e).__name__}: {str(e)}"
+            for name in list(pickled) + list(shared):
+                errors[name] = message
+        
+        return {"status": "error" if errors else "ok", "errors": errors}
+    
+    def inspect_variables(self, names: Optional[list[str]] = None, timeout: float = 5) -> dict:
+        """
+        Summarize variables in the worker namespace without transferring them.
+        
+        Summaries are computed inside the worker and cached there until the
+        next cell execution or variable update.
+        
+        Args:
+            names: Names to summarize (all public names if None)
+            timeout: Seconds to wait for the worker
+        
+        Returns:
+            Dict with keys:
+            - status: "ok" or "error"
+            - variables: List of summaries (name, type, shape, dtype, size, repr),
+              largest first
+            - error: Error message if any
+        """
+        try:
+            response = self._request({
+                "type": CMD_INSPECT,
+                "names": list(names) if names is not None else None
+            }, timeout=timeout)
+        except Exception as e:
+            return {"status": "error", "variables": [], "error": f"{type(e).__name__}: {str(e)}"}
+        
+        if response.get("status") != "ok":
+            return {"status": "error", "variables": [], "error": response.get("error", "Kernel error")}
+        return {"status": "ok", "variables": response["variables"], "error": ""}
+    
+    def delete_names(
+        self,
+        names: list[str],
+        timeout: float = 5,
+        cell_ids: Optional[list[str]] = None
+    ) -> dict:
+        """
+        Delete variables from the worker namespace and run garbage collection.
+        
+        Args:
+            names: Variable names to remove (missing names are ignored)
+            timeout: Seconds to wait for the worker
+            cell_ids: Cells whose retained results should be released too
+        
+        Returns:
+            Dict with keys:
+            - status: "ok" or "error"
+            - deleted: Names that were actually removed
+            - approx_bytes: Approximate size of the removed values
+            - freed_bytes: Drop in worker RSS after collection (None if unknown)
+            - error: Error message if any
+        """
+        try:
+            response = self._request({
+                "type": CMD_DELETE_NAMES,
+                "names": list(names),
+                "cell_ids": list(cell_ids or [])
+            }, timeout=timeout)
+        except Exception as e:
+            response = {"status": "error", "error": f"{type(e).__name__}: {str(e)}"}
+        
+        if response.get("status") != "ok":
+            return {
+                "status": "error",
+                "deleted": [],
+                "approx_bytes": 0,
+                "freed_bytes": None,
+                "error": response.get("error", "Kernel error")
+            }
+        for cell_id in cell_ids or []:
+            self.cell_outputs.pop(cell_id, None)
+        return {**response, "error": ""}
+    
+    def fetch_rows(
+        self,
+        cell_id: str,
+        offset: int,
+        limit: int = MAX_ROWS,
+        query: Optional[dict] = None,
+        timeout: float = FETCH_ROWS_TIMEOUT
+    ) -> dict:
+        """
+        Fetch a window of rows from a cell's DataFrame result.
+        
+        The worker keeps the last DataFrame each cell evaluated to, so any
+        part of it can be shown without sending the whole frame. Results are
+        lost when the worker restarts.
+        
+        A query sorts and/or filters the result inside the worker before the
+        window is taken; the resulting row order is cached per (cell, query).
+        
+        Args:
+            cell_id: Cell whose result to page through
+            offset: First row of the window
+            limit: Number of rows (capped at MAX_FETCH_ROWS)
+            query: Optional dict with "sort" (list of {column, ascending})
+                and "filters" (list of {column, op, value}, combined with
+                AND; op is one of QUERY_FILTER_OPS)
+            timeout: Seconds to wait for the worker
+        
+        Returns:
+            Dict with keys:
+            - status: "ok" or "error"
+            - offset: First row actually returned
+            - total_rows: Number of rows in the full (filtered) result
+            - format, data, index, nulls: The window, encoded like rich output
+            - error: Error message if any
+        """
+        try:
+            response = self._request({
+                "type": CMD_FETCH_ROWS,
+                "cell_id": cell_id,
+                "offset": offset,
+                "limit": limit,
+                "query": query
+            }, timeout=timeout)
+        except Exception as e:
+            response = {"status": "error", "error": f"{type(e).__name__}: {str(e)}"}
+        
+        if response.get("status") != "ok":
+            return {
+                "status": "error",
+                "offset": offset,
+                "total_rows": 0,
+                "format": FRAME_FORMAT_RECORDS,
+                "data": [],
+                "index": [],
+                "nulls": None,
+                "error": response.get("error", "Kernel error")
+            }
+        return {"nulls": None, **response, "error": ""}
+    
+    def shutdown(self):
+        """Stop the worker process (the next command starts a new one)."""
+        with self._lock:
+            self._stop_worker()
     
     def __del__(self):
         """Clean up worker process on deletion."""
@@ -1,128 +1,553 @@
 """FastAPI application with WebSocket endpoint for the reactive notebook."""
 import asyncio
-import json
 import os
+import time
+import uuid
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from typing import Any, Iterable, Optional, get_args
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
+from pydantic import ValidationError
 
 from models import (
-    Cell, RichOutput, CellUpdatedMessage, ExecuteCellMessage, AddCellMessage, DeleteCellMessage,
+    Cell, OutputRef, CellUpdatedMessage, ExecuteCellMessage, AddCellMessage, DeleteCellMessage,
+    InterruptMessage, InspectVariablesMessage, FetchRowsMessage, SubscribeMessage, UnsubscribeMessage,
     NotebookStateMessage, CellAddedMessage, CellDeletedMessage,
     ExecutionStartedMessage, ExecutionResultMessage, ExecutionQueueMessage, 
-    ExecutionInterruptedMessage, ErrorMessage
+    ExecutionInterruptedMessage, ErrorMessage, VariableSummary, VariableSummariesMessage,
+    NamespaceReclaimedMessage, RowQuery, RowsWindowMessage, RichOutputReadyMessage, CellOutputMessage,
+    RichOutputType, construct_message
 )
+from kernel import FRAME_FORMAT_ARROW, NotebookKernel
 from reactive import ReactiveEngine
+from wire import HAS_MSGPACK, RawJSON, dumps, encode_json, packb
+from storage import NotebookStore, SqliteNotebookStore
+from blobstore import BlobStore
+from journal import NotebookJournal
+from autosave import NotebookSaver
+from outbound import OUTPUT_MESSAGES, ClientConnection, OutboundMessage, RecentMessages
 
 app = FastAPI(title="Reactive Notebook")
 
-# Initialize the reactive engine
-engine = ReactiveEngine()
+# Initialize the reactive engine. Rich output follows each result separately
+# and arrives already JSON-encoded by the worker (wire.RawJSON); it is spliced
+# into outgoing messages after they are built, never validated again.
+# DataFrame rows come as Arrow IPC attachments where pyarrow is installed,
+# with column statistics computed alongside them by the render thread.
+engine = ReactiveEngine(
+    defer_rich_output=True,
+    kernel=NotebookKernel(
+        encode_rich_output=True, frame_format=FRAME_FORMAT_ARROW, column_stats=True
+    )
+)
 
 # Track current execution state for cancellation
 _execution_cancelled: bool = False
 _is_executing: bool = False
 _execution_task: asyncio.Task | None = None
 
-# Path to notebooks directory
-NOTEBOOKS_DIR = Path(__file__).parent.parent / "notebooks"
+# WebSocket subprotocols: MessagePack (binary frames) when the client offers it
+# and msgpack is installed, else JSON (text frames)
+MSGPACK_SUBPROTOCOL = "notebook.msgpack"
+JSON_SUBPROTOCOL = "notebook.json"
+
+# Rich outputs larger than this are left out of notebook_state (see OutputRef)
+INLINE_RICH_OUTPUT_BYTES = 32 * 1024
+
+# Blobs are JSON except Arrow IPC streams (DataFrame rows), which start
+# with a continuation marker where JSON cannot
+ARROW_STREAM_MARKER = b"\xff\xff\xff\xff"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Models of the messages clients send, checked strictly (no coercion) on
+# arrival; the server's own messages are built with construct_message
+CLIENT_MESSAGES = {
+    "cell_updated": CellUpdatedMessage,
+    "execute_cell": ExecuteCellMessage,
+    "add_cell": AddCellMessage,
+    "delete_cell": DeleteCellMessage,
+    "interrupt": InterruptMessage,
+    "inspect_variables": InspectVariablesMessage,
+    "fetch_rows": FetchRowsMessage,
+    "subscribe": SubscribeMessage,
+    "unsubscribe": UnsubscribeMessage,
+}
+
+# Replies computed off the receive loop (kept referenced until they finish)
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro) -> asyncio.Task:
+    """Start a task nothing waits for, keeping it referenced until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# Deferred rich output is only sent after the cell's execution_result:
+# runs whose result has been broadcast, and outputs that arrived first
+_announced_runs: set[int] = set()
+_early_rich_outputs: dict[str, dict] = {}
+
+# Path to notebooks directory (NOTEBOOKS_DIR overrides it, e.g. for tests)
+NOTEBOOKS_DIR = Path(os.environ.get("NOTEBOOKS_DIR") or Path(__file__).parent.parent / "notebooks")
 DEFAULT_NOTEBOOK = NOTEBOOKS_DIR / "default.json"
 
+SQLITE_NOTEBOOK = NOTEBOOKS_DIR / "default.sqlite3"
+
+# Large outputs of the notebook, stored once per distinct content
+notebook_blobs = BlobStore(NOTEBOOKS_DIR / "default.blobs")
+
+# Storage backend: "json" keeps DEFAULT_NOTEBOOK as a snapshot plus a journal
+# of cell-level changes; "sqlite" keeps cells and compressed outputs in
+# SQLITE_NOTEBOOK (imported from DEFAULT_NOTEBOOK on first use). Either way
+# large outputs go to notebook_blobs and cells refer to them by digest.
+NOTEBOOK_STORAGE = os.environ.get("NOTEBOOK_STORAGE", "json")
+
 
 def ensure_notebooks_dir():
     """Ensure the notebooks directory exists."""
     NOTEBOOKS_DIR.mkdir(exist_ok=True)
 
 
-def load_notebook():
-    """Load notebook from JSON file."""
-    ensure_notebooks_dir()
-    if DEFAULT_NOTEBOOK.exists():
-        try:
-            with open(DEFAULT_NOTEBOOK, "r") as f:
-                data = json.load(f)
-                for cell_data in data.get("cells", []):
-                    cell = Cell(**cell_data)
-                    engine.add_cell(cell.id, cell.code, position=None)
-                    # Restore output/error/status/rich_output
-                    if cell.id in engine.cells:
-                        engine.cells[cell.id].output = cell.output
-                        engine.cells[cell.id].rich_output = cell.rich_output.model_dump() if cell.rich_output else None
-                        engine.cells[cell.id].error = cell.error
-                        engine.cells[cell.id].status = cell.status
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"Error loading notebook: {e}")
-
-
-def save_notebook():
-    """Save notebook to JSON file."""
+def open_notebook_store() -> NotebookStore:
+    """Open the storage backend selected by NOTEBOOK_STORAGE."""
     ensure_notebooks_dir()
-    cells_data = [
-        {
-            "id": cell.id,
-            "code": cell.code,
-            "output": cell.output,
-            "rich_output": cell.rich_output,
-            "error": cell.error,
-            "status": cell.status
-        }
-        for cell in engine.get_cells_in_order()
-    ]
-    with open(DEFAULT_NOTEBOOK, "w") as f:
-        json.dump({"cells": cells_data}, f, indent=2)
+    if NOTEBOOK_STORAGE == "json":
+        return NotebookJournal(DEFAULT_NOTEBOOK, blobs=notebook_blobs)
+    if NOTEBOOK_STORAGE == "sqlite":
+        store = SqliteNotebookStore(SQLITE_NOTEBOOK, blobs=notebook_blobs)
+        if store.is_empty() and DEFAULT_NOTEBOOK.exists():
+            cells = NotebookJournal(DEFAULT_NOTEBOOK, blobs=notebook_blobs).load()
+            store.save_changes(cells, [], [cell["id"] for cell in cells])
+        return store
+    raise ValueError(f"Unknown NOTEBOOK_STORAGE: {NOTEBOOK_STORAGE!r} (expected 'json' or 'sqlite')")
+
+
+# Handlers only hand changes to notebook_saver, which writes them in the background
+notebook_store = open_notebook_store()
+notebook_saver = NotebookSaver(notebook_store)
+
+
+def restore_rich_output(cell_id: str, saved: Any) -> Optional[RawJSON]:
+    """
+    A saved rich output, encoded once like the kernel's own results.
+
+    Saved outputs came from the kernel, so only their type is checked
+    (validating RichOutput.data would visit every value). Outputs with
+    attachments come back still encoded, so that they go on referring
+    to them (see storage.resolve_outputs).
+    """
+    if saved is None or isinstance(saved, RawJSON):
+        return saved
+    if not isinstance(saved, dict) or saved.get("type") not in get_args(RichOutputType):
+        print(f"Ignoring unreadable saved rich output of cell {cell_id}")
+        return None
+    return encode_json(saved)
+
+
+def load_notebook():
+    """
+    Load the cells and their code; their outputs are read when first needed.
+    
+    See ensure_outputs_loaded(): with the SQLite store (and blobs) startup
+    reads no output at all.
+    """
+    try:
+        for cell_data in notebook_store.load(include_outputs=False):
+            cell = Cell(**cell_data)
+            engine.add_cell(cell.id, cell.code, position=None)
+            # Restore error/status
+            if cell.id in engine.cells:
+                engine.cells[cell.id].error = cell.error
+                engine.cells[cell.id].status = cell.status
+                engine.cells[cell.id].peak_memory_delta = cell.peak_memory_delta
+        
+        # Fold changes replayed from the journal into a fresh snapshot
+        if isinstance(notebook_store, NotebookJournal) and notebook_store.records:
+            notebook_store.compact()
+    except Exception as e:
+        print(f"Error loading notebook: {e}")
+
+
+async def load_outputs():
+    """Read the saved outputs (off the event loop) and attach them to their cells."""
+    try:
+        saved = await asyncio.to_thread(notebook_store.load_outputs)
+    except Exception as e:
+        print(f"Error loading notebook outputs: {e}")
+        return
+    for cell_id, outputs in saved.items():
+        if cell_id in engine.cells:
+            output = outputs.get("output")
+            engine.cells[cell_id].output = output if isinstance(output, str) else ""
+            engine.cells[cell_id].rich_output = restore_rich_output(cell_id, outputs.get("rich_output"))
+
+
+async def ensure_outputs_loaded():
+    """
+    Load the saved outputs once, when the first client connects.
+    
+    Every connection waits for this before it is sent anything or handled,
+    so no cell runs (and no cell is saved) before its saved outputs are in
+    place. Large rich outputs are served by /api/blobs meanwhile.
+    """
+    global _outputs_loading
+    if _outputs_loading is None:
+        _outputs_loading = asyncio.ensure_future(load_outputs())
+    # A client that disconnects while waiting must not cancel it for the others
+    await asyncio.shield(_outputs_loading)
+
+
+def save_cells(cell_ids: Iterable[str]):
+    """Schedule the current state of the given cells, and the cell order, to be saved."""
+    for cell_id in cell_ids:
+        cell = engine.cells.get(cell_id)
+        if cell is not None:
+            notebook_saver.save_cell({
+                "id": cell.id,
+                "code": cell.code,
+                "output": cell.output,
+                "rich_output": cell.rich_output,
+                "error": cell.error,
+                "status": cell.status,
+                "peak_memory_delta": cell.peak_memory_delta
+            })
+    notebook_saver.set_order(engine.cell_order)
 
 
 # Load notebook on startup
 load_notebook()
+_outputs_loading: Optional[asyncio.Future] = None
+
+
+@dataclass
+class BroadcastStats:
+    """Cost of ConnectionManager.broadcast(): totals plus the most recent call."""
+    broadcasts: int = 0
+    # Bytes queued for all recipients
+    bytes_sent: int = 0
+    encode_ms: float = 0.0
+    fanout_ms: float = 0.0
+    max_encode_ms: float = 0.0
+    max_fanout_ms: float = 0.0
+    last_type: str = ""
+    last_bytes: int = 0
+    last_clients: int = 0
+    last_encode_ms: float = 0.0
+    last_fanout_ms: float = 0.0
+    # Clients disconnected for falling too far behind
+    lagging_disconnects: int = 0
+    # Output messages cut to a status update (or not sent) for unsubscribed clients
+    outputs_omitted: int = 0
+    
+    def record(self, message_type: str, size: int, clients: int, sent_bytes: int,
+               encode_ms: float, fanout_ms: float):
+        self.broadcasts += 1
+        self.bytes_sent += sent_bytes
+        self.encode_ms += encode_ms
+        self.fanout_ms += fanout_ms
+        self.max_encode_ms = max(self.max_encode_ms, encode_ms)
+        self.max_fanout_ms = max(self.max_fanout_ms, fanout_ms)
+        self.last_type = message_type
+        self.last_bytes = size
+        self.last_clients = clients
+        self.last_encode_ms = encode_ms
+        self.last_fanout_ms = fanout_ms
 
 
 class ConnectionManager:
-    """Manages WebSocket connections."""
+    """
+    Manages WebSocket connections.
+    
+    Every connection has its own outbound queue and writer task
+    (outbound.ClientConnection): sending only queues the message, so a
+    slow client never holds up the others or the execution loop.
+    
+    Broadcast messages carry a sequence number ("seq") and the latest
+    ones are kept in `recent`. A reconnecting client passes the session
+    and seq of the last message it got (?session=...&seq=...) and is sent
+    only what it missed (see resume()). Replies to one client are not
+    sequenced.
+    
+    Outputs go only to clients subscribed to the cell (see
+    ClientConnection.subscribe()); the others get results as status
+    updates and the outputs once they subscribe.
+    
+    Clients that offer the MSGPACK_SUBPROTOCOL get MessagePack frames.
+    Each broadcast is encoded at most once per form (full or status-only)
+    and protocol; replayed messages are JSON.
+    """
     
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        self.clients: dict[WebSocket, ClientConnection] = {}
+        self.stats = BroadcastStats()
+        # Sequence numbers restart with the server, so clients also check this
+        self.session = uuid.uuid4().hex
+        self.seq = 0
+        self.recent = RecentMessages()
+        self._writers: dict[WebSocket, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        offered = websocket.scope.get("subprotocols", [])
+        binary = HAS_MSGPACK and MSGPACK_SUBPROTOCOL in offered
+        if binary:
+            subprotocol = MSGPACK_SUBPROTOCOL
+        else:
+            subprotocol = JSON_SUBPROTOCOL if JSON_SUBPROTOCOL in offered else None
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(websocket.send_text, websocket.send_bytes if binary else None)
+        self.clients[websocket] = client
+        self._writers[websocket] = asyncio.create_task(self._run_writer(websocket, client))
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.clients.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
     
     async def send_message(self, websocket: WebSocket, message: dict):
-        await websocket.send_json(message)
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(websocket, client, self._encode(message, client.binary))
+    
+    def resume(self, websocket: WebSocket) -> bool:
+        """
+        Queue the broadcasts a reconnecting client missed.
+        
+        Returns:
+            False if the client has to start over from a notebook_state:
+            it is new, the server has restarted or the messages it missed
+            are no longer kept
+        """
+        params = websocket.query_params
+        if params.get("session") != self.session:
+            return False
+        try:
+            missed = self.recent.since(int(params.get("seq", "")))
+        except ValueError:
+            return False
+        client = self.clients.get(websocket)
+        if missed is None or client is None:
+            return False
+        for outbound in missed:
+            self._enqueue(websocket, client, outbound)
+        return True
     
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+        """Number a message, encode it once per form and protocol, and queue it for every connection."""
+        clients = list(self.clients.items())
+        
+        start = time.perf_counter()
+        self.seq += 1
+        seq = self.seq
+        numbered = {**message, "seq": seq}
+        outbound = self._encode(numbered)
+        outbound.seq = seq
+        # Kept even with no one connected, for clients that are reconnecting
+        self.recent.append(outbound)
+        encode_seconds = time.perf_counter() - start
+        
+        # (status_only, binary) -> encoding, made when a client first needs it
+        variants = {(False, False): outbound}
+        sent_bytes = 0
+        for websocket, client in clients:
+            status_only = False
+            if outbound.type in OUTPUT_MESSAGES:
+                if client.wants_output(outbound.cell_id):
+                    client.omitted.discard(outbound.cell_id)
+                else:
+                    client.omitted.add(outbound.cell_id)
+                    self.stats.outputs_omitted += 1
+                    if outbound.type != "execution_result":
+                        continue
+                    status_only = True
+            key = (status_only, client.binary)
+            if key not in variants:
+                encode_start = time.perf_counter()
+                variants[key] = self._encode(
+                    without_outputs(message, seq) if status_only else numbered, client.binary
+                )
+                variants[key].seq = seq
+                encode_seconds += time.perf_counter() - encode_start
+            delivered = variants[key]
+            self._enqueue(websocket, client, delivered)
+            sent_bytes += delivered.size
+        elapsed = time.perf_counter() - start
+        
+        self.stats.record(
+            outbound.type, outbound.size, len(clients), sent_bytes,
+            encode_seconds * 1000, (elapsed - encode_seconds) * 1000
+        )
+    
+    @staticmethod
+    def _encode(message: dict, binary: bool = False) -> OutboundMessage:
+        """Encode as MessagePack if binary (falling back to JSON if it can't be), else as JSON."""
+        if binary:
             try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+                packed = packb(message)
+            except (OverflowError, TypeError, ValueError) as e:
+                print(f"Sending {message.get('type')} as JSON: {e}")
+            else:
+                return OutboundMessage(
+                    type=message.get("type", ""),
+                    cell_id=message.get("cell_id"),
+                    text="",
+                    size=len(packed),
+                    binary=packed
+                )
+        data = dumps(message)
+        return OutboundMessage(
+            type=message.get("type", ""),
+            cell_id=message.get("cell_id"),
+            text=data.decode("utf-8"),
+            size=len(data)
+        )
+    
+    def _enqueue(self, websocket: WebSocket, client: ClientConnection, outbound: OutboundMessage):
+        if not client.enqueue(outbound):
+            print(
+                f"Disconnecting lagging client: {len(client.pending)} messages "
+                f"({client.pending_bytes} bytes) queued"
+            )
+            self.stats.lagging_disconnects += 1
+            self.disconnect(websocket)
+            # The client reconnects and resumes, or starts over from a notebook_state
+            run_in_background(self._close(websocket, code=1013))
+    
+    async def _run_writer(self, websocket: WebSocket, client: ClientConnection):
+        try:
+            await client.run_writer()
+        except Exception as e:
+            print(f"Error sending to client: {e}")
+            self.disconnect(websocket)
+            await self._close(websocket, code=1011)
+    
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=5)
+        except Exception:
+            pass  # Already closed, or too stalled to take the close frame
+
+
+def without_outputs(result_msg: dict, seq: int) -> dict:
+    """An execution_result reduced to a status update."""
+    return {
+        **result_msg, "seq": seq, "output": "", "rich_output": None,
+        "rich_pending": False, "output_omitted": True
+    }
 
 
 manager = ConnectionManager()
 
 
+@app.on_event("startup")
+async def install_rich_output_listener():
+    """Route deferred rich output from the kernel's pump thread onto the event loop."""
+    loop = asyncio.get_running_loop()
+    
+    def on_rich_output(message: dict):
+        loop.call_soon_threadsafe(receive_rich_output, message)
+    
+    engine.kernel.on_rich_output = on_rich_output
+
+
+@app.on_event("shutdown")
+def flush_notebook():
+    """Write pending changes, compact the store and close it."""
+    try:
+        notebook_saver.close()
+        notebook_store.close()
+    except Exception as e:
+        print(f"Error saving notebook: {e}")
+
+
+def receive_rich_output(message: dict):
+    """Publish deferred rich output, or hold it until its result has been sent."""
+    if message["run_id"] in _announced_runs:
+        _announced_runs.discard(message["run_id"])
+        publish_rich_output(message)
+    else:
+        _early_rich_outputs[message["cell_id"]] = message
+
+
+def announce_result(cell_id: str, run_id: int):
+    """Note that a result with pending rich output was broadcast."""
+    early = _early_rich_outputs.pop(cell_id, None)
+    if early is not None and early["run_id"] == run_id:
+        publish_rich_output(early)
+    else:
+        _announced_runs.add(run_id)
+
+
+def publish_rich_output(message: dict):
+    """Attach rich output to its cell and broadcast rich_output_ready."""
+    cell = engine.apply_rich_output(message)
+    if cell is None:
+        return  # Stale: the cell was deleted or has run again
+    
+    ready_msg = construct_message(
+        RichOutputReadyMessage, cell_id=cell.id, rich_output=cell.rich_output, error=message["error"]
+    )
+    run_in_background(manager.broadcast(ready_msg))
+    save_cells([cell.id])
+
+
+@app.get("/api/stats")
+async def get_stats():
+    """Server instrumentation: broadcast timings and per-client outbound queues."""
+    return {
+        "broadcast": asdict(manager.stats),
+        "clients": [
+            {"pending": len(c.pending), "pending_bytes": c.pending_bytes, "coalesced": c.coalesced}
+            for c in manager.clients.values()
+        ]
+    }
+
+
+def find_rich_output(digest: str) -> Optional[bytes]:
+    """Encoded rich output, or an attachment of one, of a current cell by digest (it may not be saved yet)."""
+    for cell in engine.cells.values():
+        if isinstance(cell.rich_output, RawJSON):
+            if cell.rich_output.digest == digest:
+                return cell.rich_output.data
+            if cell.rich_output.attachments and cell.rich_output.attachments.get(digest) is not None:
+                return cell.rich_output.attachments[digest]
+    return None
+
+
+@app.get("/api/blobs/{digest}")
+async def get_blob(digest: str):
+    """An output by content digest; immutable, so clients may cache it forever."""
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=400, detail="Invalid digest")
+    data = find_rich_output(digest)
+    if data is None:
+        data = await asyncio.to_thread(notebook_blobs.get, digest)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Unknown blob")
+    return Response(
+        content=data,
+        media_type=ARROW_STREAM_MEDIA_TYPE if data.startswith(ARROW_STREAM_MARKER) else "application/json",
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}"'}
+    )
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     
     try:
-        # Send initial notebook state
-        cells = engine.get_cells_in_order()
-        state_message = NotebookStateMessage(
-            cells=[Cell(
-                id=c.id,
-                code=c.code,
-                output=c.output,
-                rich_output=RichOutput(**c.rich_output) if c.rich_output else None,
-                error=c.error,
-                status=c.status
-            ) for c in cells]
-        )
-        await manager.send_message(websocket, state_message.model_dump())
+        await ensure_outputs_loaded()
+        
+        # A reconnecting client only needs what it missed; otherwise send the
+        # notebook state, with large rich outputs only as references that the
+        # client fetches as the cells scroll into view
+        if not manager.resume(websocket):
+            await send_notebook_state(websocket)
         
         # Listen for messages
         while True:
@@ -130,13 +555,68 @@ async def websocket_endpoint(websocket: WebSocket):
             await handle_message(websocket, data)
             
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 
-async def handle_message(websocket: WebSocket, data: dict):
-    """Handle incoming WebSocket messages."""
+async def send_notebook_state(websocket: WebSocket):
+    """Send the full notebook, as of the latest broadcast."""
+    cells = engine.get_cells_in_order()
+    inline = [
+        not isinstance(c.rich_output, RawJSON) or len(c.rich_output) <= INLINE_RICH_OUTPUT_BYTES
+        for c in cells
+    ]
+    state_message = construct_message(
+        NotebookStateMessage,
+        session=manager.session,
+        seq=manager.seq,
+        cells=[construct_message(
+            Cell,
+            id=c.id,
+            code=c.code,
+            output=c.output,
+            rich_output=c.rich_output if keep else None,
+            error=c.error,
+            status=c.status,
+            peak_memory_delta=c.peak_memory_delta,
+            rich_pending=c.rich_pending,
+            rich_output_ref=None if keep else construct_message(
+                OutputRef, digest=c.rich_output.digest, size=len(c.rich_output)
+            )
+        ) for c, keep in zip(cells, inline)]
+    )
+    await manager.send_message(websocket, state_message)
+
+
+def client_message_error(data: dict) -> Optional[str]:
+    """Why a client message does not match its model in CLIENT_MESSAGES, or None if it does."""
     msg_type = data.get("type")
+    model = CLIENT_MESSAGES.get(msg_type)
+    if model is None:
+        return None
+    try:
+        # fetch_rows answers an invalid query itself, in its rows_window
+        model.model_validate({**data, "query": None} if model is FetchRowsMessage else data, strict=True)
+    except ValidationError as e:
+        error = e.errors()[0]
+        return f"Invalid {msg_type} message: {'.'.join(map(str, error['loc']))}: {error['msg']}"
+    return None
+
+
+async def handle_message(websocket: WebSocket, data: dict):
+    """Handle incoming WebSocket messages (malformed ones are answered with an error)."""
+    invalid = client_message_error(data)
+    if invalid is not None:
+        error_msg = construct_message(
+            ErrorMessage,
+            cell_id=data.get("cell_id") if isinstance(data.get("cell_id"), str) else None,
+            message=invalid
+        )
+        await manager.send_message(websocket, error_msg)
+        return
     
+    msg_type = data.get("type")
     if msg_type == "cell_updated":
         await handle_cell_updated(websocket, data)
     elif msg_type == "execute_cell":
@@ -147,6 +627,18 @@ async def handle_message(websocket: WebSocket, data: dict):
         await handle_delete_cell(websocket, data)
     elif msg_type == "interrupt":
         await handle_interrupt(websocket)
+    elif msg_type == "inspect_variables":
+        # Waits for a running cell, so don't hold up interrupts behind it
+        run_in_background(handle_inspect_variables(websocket, data))
+    elif msg_type == "subscribe":
+        await handle_subscribe(websocket, data)
+    elif msg_type == "unsubscribe":
+        client = manager.clients.get(websocket)
+        if client is not None:
+            client.unsubscribe(data.get("cell_ids", []))
+    elif msg_type == "fetch_rows":
+        # Waits for a running cell, so don't hold up interrupts behind it
+        run_in_background(handle_fetch_rows(websocket, data))
 
 
 async def cancel_current_execution(silent: bool = False):
@@ -180,11 +672,12 @@ async def cancel_current_execution(silent: bool = False):
     
     if not silent:
         # Send interrupted message
-        interrupted_msg = ExecutionInterruptedMessage(
+        interrupted_msg = construct_message(
+            ExecutionInterruptedMessage,
             cell_id=interrupt_result.get("cell_id"),
             message="Execution interrupted"
         )
-        await manager.broadcast(interrupted_msg.model_dump())
+        await manager.broadcast(interrupted_msg)
 
 
 async def run_execution(execution_order: list[str]):
@@ -198,8 +691,8 @@ async def run_execution(execution_order: list[str]):
     
     try:
         # Send execution queue
-        queue_msg = ExecutionQueueMessage(cell_ids=execution_order)
-        await manager.broadcast(queue_msg.model_dump())
+        queue_msg = construct_message(ExecutionQueueMessage, cell_ids=execution_order)
+        await manager.broadcast(queue_msg)
         
         # Execute cells in order
         for exec_cell_id in execution_order:
@@ -216,36 +709,43 @@ async def run_execution(execution_order: list[str]):
                 continue
             
             # Send execution started
-            started_msg = ExecutionStartedMessage(cell_id=exec_cell_id)
-            await manager.broadcast(started_msg.model_dump())
+            started_msg = construct_message(ExecutionStartedMessage, cell_id=exec_cell_id)
+            await manager.broadcast(started_msg)
             
             # Execute cell in a thread to not block the event loop
             exec_result = await asyncio.to_thread(engine.execute_cell, exec_cell_id)
+            # Variables orphaned by earlier edits were freed before it ran
+            await broadcast_reclaimed(exec_result.get("reclaimed"))
             
             # Check if interrupted during execution
             if _execution_cancelled:
+                if exec_result.get("rich_pending"):
+                    # Still settle the cell's pending render (or its loss)
+                    announce_result(exec_cell_id, exec_result["run_id"])
                 # Send interrupted message for this cell
-                interrupted_msg = ExecutionInterruptedMessage(
+                interrupted_msg = construct_message(
+                    ExecutionInterruptedMessage,
                     cell_id=exec_cell_id,
                     message="Execution interrupted"
                 )
-                await manager.broadcast(interrupted_msg.model_dump())
+                await manager.broadcast(interrupted_msg)
                 break
             
-            # Build rich_output model if present
-            rich_output = None
-            if exec_result.get("rich_output"):
-                rich_output = RichOutput(**exec_result["rich_output"])
-            
-            # Send execution result
-            result_msg = ExecutionResultMessage(
+            # Send execution result (rich output is already encoded)
+            result_msg = construct_message(
+                ExecutionResultMessage,
                 cell_id=exec_cell_id,
                 status=exec_result["status"],
                 output=exec_result["output"],
-                rich_output=rich_output,
-                error=exec_result["error"]
+                rich_output=exec_result.get("rich_output"),
+                error=exec_result["error"],
+                peak_memory_delta=exec_result.get("peak_memory_delta"),
+                rich_pending=exec_result.get("rich_pending", False)
             )
-            await manager.broadcast(result_msg.model_dump())
+            await manager.broadcast(result_msg)
+            if exec_result.get("rich_pending"):
+                # Don't wait for it: the next cell starts while it renders
+                announce_result(exec_cell_id, exec_result["run_id"])
     
     except asyncio.CancelledError:
         # Task was cancelled - this is expected during interrupt
@@ -253,7 +753,7 @@ async def run_execution(execution_order: list[str]):
     
     finally:
         _is_executing = False
-        save_notebook()
+        save_cells(execution_order)
 
 
 async def handle_cell_updated(websocket: WebSocket, data: dict):
@@ -272,9 +772,9 @@ async def handle_cell_updated(websocket: WebSocket, data: dict):
     
     if result.get("error"):
         # Send error (e.g., circular dependency)
-        error_msg = ErrorMessage(cell_id=cell_id, message=result["error"])
-        await manager.broadcast(error_msg.model_dump())
-        save_notebook()
+        error_msg = construct_message(ErrorMessage, cell_id=cell_id, message=result["error"])
+        await manager.broadcast(error_msg)
+        save_cells([cell_id])
         return
     
     execution_order = result.get("execution_order", [])
@@ -288,7 +788,7 @@ async def handle_cell_updated(websocket: WebSocket, data: dict):
         # This allows the WebSocket to continue receiving messages (like interrupt)
         _execution_task = asyncio.create_task(run_execution(execution_order))
     else:
-        save_notebook()
+        save_cells([cell_id])
 
 
 async def handle_execute_cell(websocket: WebSocket, data: dict):
@@ -309,8 +809,10 @@ async def handle_add_cell(websocket: WebSocket, data: dict):
     
     cell = engine.add_cell(position=position)
     
-    added_msg = CellAddedMessage(
-        cell=Cell(
+    added_msg = construct_message(
+        CellAddedMessage,
+        cell=construct_message(
+            Cell,
             id=cell.id,
             code=cell.code,
             output=cell.output,
@@ -320,8 +822,8 @@ async def handle_add_cell(websocket: WebSocket, data: dict):
         ),
         position=position if position is not None else len(engine.cell_order) - 1
     )
-    await manager.broadcast(added_msg.model_dump())
-    save_notebook()
+    await manager.broadcast(added_msg)
+    save_cells([cell.id])
 
 
 async def handle_delete_cell(websocket: WebSocket, data: dict):
@@ -333,15 +835,114 @@ async def handle_delete_cell(websocket: WebSocket, data: dict):
         await cancel_current_execution(silent=True)
     
     if engine.delete_cell(cell_id):
-        deleted_msg = CellDeletedMessage(cell_id=cell_id)
-        await manager.broadcast(deleted_msg.model_dump())
-        save_notebook()
+        deleted_msg = construct_message(CellDeletedMessage, cell_id=cell_id)
+        await manager.broadcast(deleted_msg)
+        notebook_saver.delete_cell(cell_id)
+        
+        # Free the variables the cell defined. This waits for a running cell
+        # to finish, so don't hold up interrupts behind it
+        run_in_background(reclaim_namespace())
+
+
+async def reclaim_namespace():
+    """Free kernel variables no cell defines anymore and report them."""
+    await broadcast_reclaimed(await asyncio.to_thread(engine.reclaim_namespace))
+
+
+async def broadcast_reclaimed(reclaimed: Optional[dict]):
+    """Broadcast a namespace_reclaimed message if a reclaim freed any variables."""
+    if reclaimed and reclaimed["deleted"]:
+        reclaimed_msg = construct_message(
+            NamespaceReclaimedMessage,
+            names=reclaimed["deleted"],
+            approx_bytes=reclaimed["approx_bytes"],
+            freed_bytes=reclaimed["freed_bytes"]
+        )
+        await manager.broadcast(reclaimed_msg)
 
 
 async def handle_interrupt(websocket: WebSocket):
     """Handle interrupt request - stops current execution."""
+    # The cancelled run_execution() has saved its cells on the way out
     await cancel_current_execution(silent=False)
-    save_notebook()
+
+
+async def handle_subscribe(websocket: WebSocket, data: dict):
+    """Handle cells scrolling into view - sends the outputs the client missed."""
+    client = manager.clients.get(websocket)
+    if client is None:
+        return
+    cell_ids = data.get("cell_ids", [])
+    missed = set(client.subscribe(cell_ids)) | set(data.get("missing", []))
+    
+    for cell_id in cell_ids:
+        cell = engine.cells.get(cell_id)
+        if cell_id not in missed or cell is None:
+            continue
+        output_msg = construct_message(
+            CellOutputMessage,
+            cell_id=cell_id,
+            output=cell.output,
+            rich_output=cell.rich_output,
+            rich_pending=cell.rich_pending
+        )
+        await manager.send_message(websocket, output_msg)
+
+
+async def handle_inspect_variables(websocket: WebSocket, data: dict):
+    """Handle variable inspector request - replies to the requesting client only."""
+    names = data.get("names")
+    
+    # Waits for any running cell to finish, so run off the event loop
+    result = await asyncio.to_thread(engine.kernel.inspect_variables, names)
+    
+    summaries_msg = construct_message(
+        VariableSummariesMessage,
+        variables=[construct_message(VariableSummary, **v) for v in result["variables"]],
+        error=result["error"]
+    )
+    await manager.send_message(websocket, summaries_msg)
+
+
+async def handle_fetch_rows(websocket: WebSocket, data: dict):
+    """Handle a (possibly sorted/filtered) row window request - replies to the requester only."""
+    cell_id = data["cell_id"]
+    offset = data.get("offset", 0)
+    
+    try:
+        query = RowQuery(**data["query"]) if data.get("query") else None
+    except ValidationError as e:
+        query = None
+        result = {
+            "offset": offset, "total_rows": 0, "format": "records",
+            "data": [], "index": [], "nulls": None,
+            "error": f"QueryError: {e.errors()[0]['msg']}"
+        }
+    else:
+        result = await asyncio.to_thread(
+            engine.kernel.fetch_rows,
+            cell_id,
+            offset,
+            data.get("limit", 100),
+            query.model_dump() if query else None
+        )
+    
+    window_msg = construct_message(
+        RowsWindowMessage,
+        cell_id=cell_id,
+        query=query.model_dump() if query else None,
+        offset=result["offset"],
+        total_rows=result["total_rows"],
+        format=result["format"],
+        data=result["data"],
+        index=result["index"],
+        nulls=result["nulls"],
+        error=result["error"]
+    )
+    try:
+        await manager.send_message(websocket, window_msg)
+    except Exception:
+        pass  # Client went away while the kernel was busy
 
 
 # Serve static files in production
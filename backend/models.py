@@ -1,6 +1,13 @@
-"""Pydantic models for WebSocket message types."""
+"""
+Pydantic models for WebSocket message types.
+
+Client messages are validated against their models. Messages the server
+builds from its own state are made with construct_message(), which fills
+in a model's defaults without validating (or copying) anything.
+"""
 from typing import Literal, Optional, Any
 from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
 
 
 # Cell status type
@@ -9,17 +16,98 @@ CellStatus = Literal["idle", "running", "success", "error"]
 # Rich output types
 RichOutputType = Literal["dataframe", "series", "ndarray"]
 
+# DataFrame data encodings
+FrameFormat = Literal["records", "columnar", "arrow"]
+
+
+class Histogram(BaseModel):
+    """Equal-width histogram; edges has one more entry than counts."""
+    edges: list[float]
+    counts: list[int]
+
+
+class ValueCount(BaseModel):
+    """A frequent value of a non-numeric column."""
+    value: Any
+    count: int
+
+
+class ColumnStats(BaseModel):
+    """Summary of one DataFrame column, computed in the worker."""
+    column: str
+    dtype: str
+    count: int  # Non-null values
+    null_count: int
+    min: Any = None
+    max: Any = None
+    mean: Any = None  # Float, or "NaN"/"Infinity" strings like other values
+    distinct: Optional[int] = None  # None if the time budget ran out
+    distinct_exact: bool = True  # False for sketch estimates
+    histogram: Optional[Histogram] = None  # Numeric columns
+    top_values: Optional[list[ValueCount]] = None  # Other columns
+    sampled: bool = False  # Nulls, histogram and top values from a row sample
+
+
+class ArraySampling(BaseModel):
+    """How a large ndarray preview was reduced from the full array."""
+    method: str  # "minmax", "lttb", "stride" or "blockmean"
+    # Original position of each preview element per axis (block start for blockmean)
+    positions: list[list[int]]
+
 
 class RichOutput(BaseModel):
     """Structured output for DataFrames, Series, and arrays."""
     type: RichOutputType
-    data: Any  # The actual data (list of records for DataFrame, etc.)
+    data: Any  # The actual data (list of records or column lists for DataFrame, etc.)
+    format: FrameFormat = "records"  # DataFrame data encoding
+    nulls: Optional[list[Optional[str]]] = None  # Columnar: base64 null bitmap per column
     columns: Optional[list[str]] = None  # Column names for DataFrame
     dtypes: Optional[dict[str, str]] = None  # Data types per column
     index: Optional[list[Any]] = None  # Index values
     name: Optional[str] = None  # Series name
     shape: list[int]  # Shape of the data
     truncated: bool = False  # Whether data was truncated
+    column_stats: Optional[list[ColumnStats]] = None  # DataFrame column summaries
+    sampling: Optional[ArraySampling] = None  # Downsampled ndarray previews
+
+
+# Row query filter operators
+FilterOp = Literal["==", "!=", "<", "<=", ">", ">=", "contains", "isnull", "notnull"]
+
+
+class SortKey(BaseModel):
+    """One sort key of a row query."""
+    column: str
+    ascending: bool = True
+
+
+class RowFilter(BaseModel):
+    """One filter of a row query (value is unused for isnull/notnull)."""
+    column: str
+    op: FilterOp
+    value: Any = None
+
+
+class RowQuery(BaseModel):
+    """Sort and filter applied to a retained DataFrame result in the worker."""
+    sort: list[SortKey] = []
+    filters: list[RowFilter] = []  # Combined with AND
+
+
+class VariableSummary(BaseModel):
+    """Cheap in-worker summary of a namespace variable."""
+    name: str
+    type: str
+    shape: Optional[list[int]] = None
+    dtype: Optional[str] = None
+    size: int  # Approximate deep size in bytes
+    repr: str = ""  # Short, truncated repr
+
+
+class OutputRef(BaseModel):
+    """Placeholder for an output the client fetches separately (GET /api/blobs/{digest})."""
+    digest: str
+    size: int  # Encoded size in bytes
 
 
 class Cell(BaseModel):
@@ -30,6 +118,9 @@ class Cell(BaseModel):
     rich_output: Optional[RichOutput] = None  # Structured output for DataFrames etc.
     error: str = ""
     status: CellStatus = "idle"
+    peak_memory_delta: Optional[int] = None  # Bytes, from the last execution
+    rich_pending: bool = False  # Rich output is still being rendered
+    rich_output_ref: Optional[OutputRef] = None  # Set instead of rich_output when it is large
 
 
 # Frontend → Backend Messages
@@ -64,12 +155,42 @@ class InterruptMessage(BaseModel):
     type: Literal["interrupt"] = "interrupt"
 
 
+class InspectVariablesMessage(BaseModel):
+    """User wants summaries of kernel variables (all if names is None)."""
+    type: Literal["inspect_variables"] = "inspect_variables"
+    names: Optional[list[str]] = None
+
+
+class FetchRowsMessage(BaseModel):
+    """User scrolled a DataFrame output and needs rows it does not have yet."""
+    type: Literal["fetch_rows"] = "fetch_rows"
+    cell_id: str
+    offset: int
+    limit: int
+    query: Optional[RowQuery] = None  # Sort/filter the result before windowing
+
+
+class SubscribeMessage(BaseModel):
+    """Cells scrolled into view: send their outputs from now on."""
+    type: Literal["subscribe"] = "subscribe"
+    cell_ids: list[str]
+    missing: list[str] = []  # Of those, cells the client has no current outputs for
+
+
+class UnsubscribeMessage(BaseModel):
+    """Cells scrolled out of view: status updates are enough."""
+    type: Literal["unsubscribe"] = "unsubscribe"
+    cell_ids: list[str]
+
+
 # Backend → Frontend Messages
 
 class NotebookStateMessage(BaseModel):
     """Initial state when client connects."""
     type: Literal["notebook_state"] = "notebook_state"
     cells: list[Cell]
+    session: str = ""  # Server session; sequence numbers restart with it
+    seq: int = 0  # Sequence number of the latest broadcast reflected in cells
 
 
 class CellAddedMessage(BaseModel):
@@ -99,6 +220,26 @@ class ExecutionResultMessage(BaseModel):
     output: str
     rich_output: Optional[RichOutput] = None
     error: str
+    peak_memory_delta: Optional[int] = None  # Peak memory growth in bytes
+    rich_pending: bool = False  # rich_output follows in a rich_output_ready message
+    output_omitted: bool = False  # output and rich_output left out: the client is not subscribed to the cell
+
+
+class RichOutputReadyMessage(BaseModel):
+    """Deferred rich output of a result sent earlier with rich_pending."""
+    type: Literal["rich_output_ready"] = "rich_output_ready"
+    cell_id: str
+    rich_output: Optional[RichOutput] = None
+    error: str = ""  # Why no rich output could be rendered, if so
+
+
+class CellOutputMessage(BaseModel):
+    """Current outputs of a cell, sent when it is subscribed to after they were left out."""
+    type: Literal["cell_output"] = "cell_output"
+    cell_id: str
+    output: str
+    rich_output: Optional[RichOutput] = None
+    rich_pending: bool = False  # rich_output follows in a rich_output_ready message
 
 
 class ExecutionQueueMessage(BaseModel):
@@ -120,3 +261,69 @@ class ErrorMessage(BaseModel):
     cell_id: Optional[str] = None
     message: str
 
+
+
+class VariableSummariesMessage(BaseModel):
+    """Summaries of kernel variables (reply to inspect_variables)."""
+    type: Literal["variable_summaries"] = "variable_summaries"
+    variables: list[VariableSummary]
+    error: str = ""
+
+
+class NamespaceReclaimedMessage(BaseModel):
+    """Kernel variables freed after cells were deleted or edited."""
+    type: Literal["namespace_reclaimed"] = "namespace_reclaimed"
+    names: list[str]
+    approx_bytes: int  # Approximate size of the freed values
+    freed_bytes: Optional[int] = None  # Drop in worker RSS, if known
+
+
+class RowsWindowMessage(BaseModel):
+    """A window of rows from a cell's DataFrame result (reply to fetch_rows)."""
+    type: Literal["rows_window"] = "rows_window"
+    cell_id: str
+    query: Optional[RowQuery] = None  # Query the window was taken from
+    offset: int  # Row number of the first row in data
+    total_rows: int  # Rows in the (filtered) result
+    format: FrameFormat = "records"
+    data: Any  # Records or column lists, as in RichOutput
+    index: list[Any]
+    nulls: Optional[list[Optional[str]]] = None
+    error: str = ""
+
+
+# Per model: field defaults in declaration order, required field names and
+# fields whose (mutable) default is copied for each message
+_MESSAGE_TEMPLATES: dict[type[BaseModel], tuple[dict[str, Any], frozenset[str], tuple[str, ...]]] = {}
+
+
+def _message_template(model: type[BaseModel]) -> tuple[dict[str, Any], frozenset[str], tuple[str, ...]]:
+    template = _MESSAGE_TEMPLATES.get(model)
+    if template is None:
+        defaults = {name: field.get_default(call_default_factory=True) for name, field in model.model_fields.items()}
+        required = frozenset(name for name, value in defaults.items() if value is PydanticUndefined)
+        mutable = tuple(name for name, value in defaults.items() if isinstance(value, (list, dict)))
+        template = _MESSAGE_TEMPLATES[model] = (defaults, required, mutable)
+    return template
+
+
+def construct_message(model: type[BaseModel], **fields: Any) -> dict:
+    """
+    Build a server-generated message (or part of one) as a plain dict.
+
+    Gives what model(**fields).model_dump() would for well-formed fields:
+    every field in declaration order, with defaults filled in. Nothing is
+    validated or copied, so nested values go in as they are: dicts (e.g.
+    from construct_message), lists, or pre-encoded wire.RawJSON. Missing
+    required fields and unknown fields still raise TypeError.
+    """
+    defaults, required, mutable = _message_template(model)
+    if not required <= fields.keys() or not fields.keys() <= defaults.keys():
+        missing = sorted(required - fields.keys())
+        unknown = sorted(fields.keys() - defaults.keys())
+        raise TypeError(f"{model.__name__}: missing fields {missing}, unknown fields {unknown}")
+    message = {**defaults, **fields}
+    for name in mutable:
+        if name not in fields:
+            message[name] = type(message[name])(message[name])
+    return message
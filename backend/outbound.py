@@ -0,0 +1,200 @@
+"""Per-client outbound message queues with coalescing, lag limits and output subscriptions."""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Awaitable, Callable, Iterable, Optional
+
+
+# Past any of these limits a client is too far behind to catch up and is
+# disconnected; on reconnecting it resumes from the last message it got
+# (see RecentMessages) or gets a fresh notebook_state.
+MAX_PENDING_MESSAGES = 1000
+MAX_PENDING_BYTES = 256 * 1024 * 1024
+MAX_LAG_SECONDS = 30.0
+
+# Broadcast messages kept for reconnecting clients. A client that missed
+# more than this gets a full notebook_state instead.
+RESUME_MAX_MESSAGES = 1000
+RESUME_MAX_BYTES = 64 * 1024 * 1024
+
+# Message types that make still-queued messages for the same cell obsolete,
+# mapped to the types they replace. A result carries the cell's full state,
+# so earlier progress and results are dropped; a deleted cell needs none of
+# its queued updates. Messages without a cell_id match each other.
+SUPERSEDES: dict[str, frozenset[str]] = {
+    "execution_started": frozenset({"execution_started"}),
+    "execution_result": frozenset({
+        "execution_started", "execution_result", "rich_output_ready", "cell_output"
+    }),
+    "cell_output": frozenset({"cell_output"}),
+    "execution_queue": frozenset({"execution_queue"}),
+    "cell_deleted": frozenset({
+        "execution_started", "execution_result", "rich_output_ready", "cell_output", "error",
+        "rows_window"
+    }),
+}
+
+# Broadcasts that carry a cell's outputs; clients only get them in full for
+# cells they are subscribed to
+OUTPUT_MESSAGES = frozenset({"execution_result", "rich_output_ready"})
+
+
+@dataclass
+class OutboundMessage:
+    """A message encoded once and queued for one or more clients."""
+    type: str
+    cell_id: Optional[str]
+    text: str
+    size: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    seq: Optional[int] = None  # Position in the broadcast stream, if broadcast
+    binary: Optional[bytes] = None  # MessagePack encoding, sent instead of text if set
+
+
+class ClientConnection:
+    """
+    The outbound side of one WebSocket connection.
+
+    Messages are queued by enqueue() without waiting and sent in order by
+    run_writer(), so a slow client only ever delays itself. While the
+    client is behind, queued messages that a newer one supersedes are
+    dropped instead of sent.
+
+    The client also declares which cells' outputs it needs (those in or
+    near its viewport). Until its first subscribe() it gets all of them.
+
+    Clients that negotiated the binary protocol are given send_bytes and
+    get messages in their MessagePack encoding where one was made; they
+    also accept text (JSON) frames.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        send_bytes: Optional[Callable[[bytes], Awaitable[None]]] = None
+    ):
+        self.send = send
+        self.send_bytes = send_bytes
+        self.binary = send_bytes is not None
+        self.pending: deque[OutboundMessage] = deque()
+        self.pending_bytes = 0
+        # Messages dropped because a newer one superseded them
+        self.coalesced = 0
+        # Cells whose outputs the client wants (None: all cells)
+        self.subscribed: Optional[set[str]] = None
+        # Cells whose latest outputs were left out of what the client was sent
+        self.omitted: set[str] = set()
+        self._wakeup = asyncio.Event()
+
+    def wants_output(self, cell_id: Optional[str]) -> bool:
+        return self.subscribed is None or cell_id in self.subscribed
+
+    def subscribe(self, cell_ids: Iterable[str]) -> list[str]:
+        """
+        Start sending the outputs of these cells.
+
+        Returns:
+            Those of the cells whose latest outputs the client was not sent
+        """
+        if self.subscribed is None:
+            self.subscribed = set()
+        missed = []
+        for cell_id in cell_ids:
+            self.subscribed.add(cell_id)
+            if cell_id in self.omitted:
+                self.omitted.discard(cell_id)
+                missed.append(cell_id)
+        return missed
+
+    def unsubscribe(self, cell_ids: Iterable[str]):
+        """Stop sending the outputs of these cells (no effect before the first subscribe())."""
+        if self.subscribed is not None:
+            self.subscribed.difference_update(cell_ids)
+
+    def enqueue(self, message: OutboundMessage) -> bool:
+        """
+        Queue a message, dropping queued messages it supersedes.
+
+        Returns:
+            False if the client is now past the lag limits and should be
+            disconnected, True otherwise
+        """
+        superseded = SUPERSEDES.get(message.type)
+        if superseded and self.pending:
+            kept = deque(
+                queued for queued in self.pending
+                if queued.type not in superseded or queued.cell_id != message.cell_id
+            )
+            if len(kept) < len(self.pending):
+                self.coalesced += len(self.pending) - len(kept)
+                self.pending = kept
+                self.pending_bytes = sum(queued.size for queued in kept)
+
+        self.pending.append(message)
+        self.pending_bytes += message.size
+        self._wakeup.set()
+        return not self.lagging()
+
+    def lagging(self) -> bool:
+        """Whether the queue has outgrown the limits (by count, size or age)."""
+        if not self.pending:
+            return False
+        return (
+            len(self.pending) > MAX_PENDING_MESSAGES
+            or self.pending_bytes > MAX_PENDING_BYTES
+            or time.monotonic() - self.pending[0].enqueued_at > MAX_LAG_SECONDS
+        )
+
+    async def run_writer(self):
+        """Send queued messages until cancelled; send errors propagate."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.pending:
+                message = self.pending.popleft()
+                self.pending_bytes -= message.size
+                if message.binary is not None:
+                    await self.send_bytes(message.binary)
+                else:
+                    await self.send(message.text)
+
+
+class RecentMessages:
+    """
+    The latest broadcast messages, for clients resuming after a reconnect.
+
+    Messages are appended in sequence order; the oldest are dropped past
+    RESUME_MAX_MESSAGES or RESUME_MAX_BYTES.
+    """
+
+    def __init__(self, max_messages: int = RESUME_MAX_MESSAGES, max_bytes: int = RESUME_MAX_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.messages: deque[OutboundMessage] = deque()
+        self.size = 0
+        self.last_seq = 0
+
+    def append(self, message: OutboundMessage):
+        """Keep a broadcast message (its seq must follow the last one's)."""
+        self.messages.append(message)
+        self.size += message.size
+        self.last_seq = message.seq
+        while self.messages and (len(self.messages) > self.max_messages or self.size > self.max_bytes):
+            self.size -= self.messages.popleft().size
+
+    def since(self, seq: int) -> Optional[list[OutboundMessage]]:
+        """
+        Messages broadcast after `seq`, freshly timestamped for queueing.
+
+        Returns:
+            The missed messages in order, or None if some of them are no
+            longer kept (or `seq` was never broadcast)
+        """
+        if seq == self.last_seq:
+            return []
+        if seq > self.last_seq or not self.messages or self.messages[0].seq > seq + 1:
+            return None
+        start = seq + 1 - self.messages[0].seq
+        now = time.monotonic()
+        return [replace(message, enqueued_at=now) for message in list(self.messages)[start:]]
@@ -1,4 +1,5 @@
 """Reactive execution engine for the notebook."""
+import threading
 import uuid
 from dataclasses import dataclass, field
 from typing import Optional, Any
@@ -13,9 +14,12 @@ class CellData:
     id: str
     code: str = ""
     output: str = ""
-    rich_output: Optional[dict] = None  # Structured output for DataFrames etc.
+    rich_output: Optional[Any] = None  # Structured output (dict or wire.RawJSON)
     error: str = ""
     status: str = "idle"  # idle, running, success, error
+    peak_memory_delta: Optional[int] = None  # Bytes, from the last execution
+    rich_pending: bool = False  # Rich output is still being rendered
+    rich_run: Optional[int] = None  # Kernel run_id the pending rich output belongs to
 
 
 class ReactiveEngine:
@@ -34,11 +38,22 @@ class ReactiveEngine:
     5. Execute in dependency order (not display order)
     """
     
-    def __init__(self):
+    def __init__(self, defer_rich_output: bool = False, kernel: Optional[NotebookKernel] = None):
         self.cells: dict[str, CellData] = {}
         self.cell_order: list[str] = []  # Maintains display order (UI only)
-        self.kernel = NotebookKernel()
+        self.kernel = kernel if kernel is not None else NotebookKernel()
         self.analyzer = DependencyAnalyzer()
+        # Names that a deleted or edited cell no longer defines; removed from
+        # the kernel namespace by reclaim_namespace()
+        self._pending_reclaim: set[str] = set()
+        # Deleted cells whose retained results the worker should release
+        self._pending_release: set[str] = set()
+        # reclaim_namespace() runs on a worker thread; held while it reads
+        # the cells and the pending sets, and while anything changes them
+        self._reclaim_lock = threading.Lock()
+        # Finish executions without waiting for rich output; it is attached
+        # later by apply_rich_output()
+        self.defer_rich_output = defer_rich_output
     
     def add_cell(
         self,
@@ -61,12 +76,12 @@ class ReactiveEngine:
             cell_id = f"cell-{uuid.uuid4().hex[:8]}"
         
         cell = CellData(id=cell_id, code=code)
-        self.cells[cell_id] = cell
-        
-        if position is not None and 0 <= position <= len(self.cell_order):
-            self.cell_order.insert(position, cell_id)
-        else:
-            self.cell_order.append(cell_id)
+        with self._reclaim_lock:
+            self.cells[cell_id] = cell
+            if position is not None and 0 <= position <= len(self.cell_order):
+                self.cell_order.insert(position, cell_id)
+            else:
+                self.cell_order.append(cell_id)
         
         return cell
     
@@ -83,10 +98,56 @@ class ReactiveEngine:
         if cell_id not in self.cells:
             return False
         
-        del self.cells[cell_id]
-        self.cell_order.remove(cell_id)
+        with self._reclaim_lock:
+            self._pending_reclaim |= self.analyzer.get_defined_vars(self.cells[cell_id].code)
+            self._pending_release.add(cell_id)
+            del self.cells[cell_id]
+            self.cell_order.remove(cell_id)
         return True
     
+    def reclaim_namespace(self) -> dict:
+        """
+        Free kernel variables that no cell defines anymore.
+        
+        Names left behind by deleted cells, or dropped from a cell by an edit,
+        are deleted from the worker namespace unless another cell now defines
+        them. Results the worker retained for deleted cells are released.
+        
+        Safe to call from a worker thread: the bookkeeping is done under
+        a lock, only the kernel call outside it.
+        
+        Returns:
+            Dict with keys:
+            - deleted: Names removed from the namespace
+            - approx_bytes: Approximate size of the removed values
+            - freed_bytes: Drop in worker RSS after collection (None if unknown)
+        """
+        with self._reclaim_lock:
+            pending = self._pending_reclaim
+            self._pending_reclaim = set()
+            released = self._pending_release
+            self._pending_release = set()
+            
+            defined = set()
+            for _, code in self._get_cells_as_tuples():
+                defined |= self.analyzer.get_defined_vars(code)
+            orphaned = pending - defined
+        
+        if not orphaned and not released:
+            return {"deleted": [], "approx_bytes": 0, "freed_bytes": 0}
+        
+        result = self.kernel.delete_names(sorted(orphaned), cell_ids=sorted(released))
+        if result["status"] != "ok":
+            # Try again at the next safe point
+            with self._reclaim_lock:
+                self._pending_reclaim |= orphaned
+                self._pending_release |= released
+        return {
+            "deleted": result["deleted"],
+            "approx_bytes": result["approx_bytes"],
+            "freed_bytes": result["freed_bytes"]
+        }
+    
     def get_cells_in_order(self) -> list[CellData]:
         """Get all cells in display order."""
         return [self.cells[cell_id] for cell_id in self.cell_order if cell_id in self.cells]
@@ -141,7 +202,10 @@ class ReactiveEngine:
             # Cell doesn't exist, create it
             self.add_cell(cell_id=cell_id, code=new_code)
         else:
-            self.cells[cell_id].code = new_code
+            old_defined = self.analyzer.get_defined_vars(self.cells[cell_id].code)
+            with self._reclaim_lock:
+                self.cells[cell_id].code = new_code
+                self._pending_reclaim |= old_defined - self.analyzer.get_defined_vars(new_code)
         
         # Get cells as tuples for analysis
         cells_tuples = self._get_cells_as_tuples()
@@ -181,7 +245,9 @@ class ReactiveEngine:
             cell_id: ID of the cell to execute
         
         Returns:
-            Execution result dict with status, output, rich_output, error
+            Execution result dict with status, output, rich_output, error,
+            and reclaimed (the reclaim_namespace() report if names orphaned
+            by earlier edits or deletions were freed first, else None)
         """
         if cell_id not in self.cells:
             return {
@@ -191,19 +257,50 @@ class ReactiveEngine:
                 "error": f"Cell {cell_id} not found"
             }
         
+        # Drop variables orphaned by earlier edits before running new code
+        reclaimed = None
+        if self._pending_reclaim or self._pending_release:
+            reclaimed = self.reclaim_namespace()
+        
         cell = self.cells[cell_id]
         cell.status = "running"
         
         # Execute the code
-        result = self.kernel.execute_cell(cell_id, cell.code)
+        result = self.kernel.execute_cell(
+            cell_id, cell.code, defer_rich_output=self.defer_rich_output
+        )
         
         # Update cell state
         cell.status = result["status"]
         cell.output = result["output"]
         cell.rich_output = result.get("rich_output")
+        cell.rich_pending = result.get("rich_pending", False)
+        cell.rich_run = result.get("run_id") if cell.rich_pending else None
         cell.error = result["error"]
+        cell.peak_memory_delta = result.get("peak_memory_delta")
         
-        return result
+        # A copy: the kernel keeps the result itself in cell_outputs
+        return {**result, "reclaimed": reclaimed}
+    
+    def apply_rich_output(self, message: dict) -> Optional[CellData]:
+        """
+        Attach deferred rich output delivered by the kernel to its cell.
+        
+        Args:
+            message: Dict with cell_id, run_id, rich_output and error
+        
+        Returns:
+            The updated cell, or None if the output is stale (the cell was
+            deleted or has run again since)
+        """
+        cell = self.cells.get(message["cell_id"])
+        if cell is None or not cell.rich_pending or cell.rich_run != message["run_id"]:
+            return None
+        
+        cell.rich_output = message["rich_output"]
+        cell.rich_pending = False
+        cell.rich_run = None
+        return cell
     
     def execute_all(self) -> list[dict]:
         """
@@ -236,9 +333,55 @@ class ReactiveEngine:
             results.append({"cell_id": cell_id, **result})
         return results
     
+    def set_variables(self, mapping: dict[str, Any], rerun_dependents: bool = False) -> dict:
+        """
+        Set several kernel variables at once, optionally re-running their dependents.
+        
+        Args:
+            mapping: Dict of variable name -> value
+            rerun_dependents: If True, re-execute (in dependency order) every cell
+                that reads one of the variables that were set, plus its downstream cells
+        
+        Returns:
+            Dict with keys:
+            - status: "ok" if every value was set, "error" otherwise
+            - errors: Dict of name -> error message for values that were not set
+            - results: Execution results (with cell_id) of the re-run cells
+        """
+        result = self.kernel.set_variables(mapping)
+        result["results"] = []
+        
+        if not rerun_dependents:
+            return result
+        
+        updated = set(mapping) - set(result["errors"])
+        if not updated:
+            return result
+        
+        cells_tuples = self._get_cells_as_tuples()
+        
+        # Cells that read an updated variable (without redefining it themselves)
+        dirty_cells = set()
+        for cell_id, code in cells_tuples:
+            defined, used = self.analyzer.get_dependencies(code)
+            if (used - defined) & updated:
+                dirty_cells.add(cell_id)
+        for cell_id in list(dirty_cells):
+            dirty_cells |= self.analyzer.find_downstream_cells(cell_id, cells_tuples)
+        
+        execution_order = self.analyzer.topological_sort(dirty_cells, cells_tuples)
+        for cell_id in execution_order:
+            exec_result = self.execute_cell(cell_id)
+            result["results"].append({"cell_id": cell_id, **exec_result})
+        
+        return result
+    
     def reset_kernel(self):
         """Reset the kernel namespace."""
         self.kernel.reset()
+        with self._reclaim_lock:
+            self._pending_reclaim.clear()
+            self._pending_release.clear()
         for cell in self.cells.values():
             cell.status = "idle"
             cell.output = ""
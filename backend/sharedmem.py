@@ -0,0 +1,280 @@
+"""Shared-memory transfer of large arrays and DataFrames between kernel processes."""
+import os
+from multiprocessing import shared_memory
+import weakref
+from typing import Any, Optional
+
+# Try to import data science libraries
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+try:
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+    pd = None
+
+
+# Values smaller than this go through the regular pickle path; for small
+# payloads the cost of creating a segment outweighs the copy it saves.
+SHM_MIN_BYTES = 1 << 20
+
+# dtype kinds that can be placed in shared memory as raw bytes
+# (bool, signed/unsigned int, float, complex, timedelta, datetime)
+SHM_DTYPE_KINDS = "biufcmM"
+
+# Key marking a value descriptor as shared-memory backed
+SHM_MARKER = "__shm__"
+
+
+def ensure_tracker():
+    """
+    Start the multiprocessing resource tracker in the current process.
+
+    Must be called before the worker is started so that the worker inherits
+    the same tracker. Segments created by one process and unlinked by the
+    other are then accounted in one place, and any segment that is never
+    claimed is removed when the notebook server exits.
+    """
+    if os.name != "posix":
+        return
+    from multiprocessing import resource_tracker
+    resource_tracker.ensure_running()
+
+
+def _is_shareable_array(value: Any) -> bool:
+    """Check whether an ndarray can be transferred as raw bytes."""
+    return (
+        isinstance(value, np.ndarray)
+        and value.dtype.kind in SHM_DTYPE_KINDS
+        and not value.dtype.hasobject
+    )
+
+
+def _frame_blocks(frame: Any) -> Optional[list[tuple[Any, list[int]]]]:
+    """
+    Group the numeric columns of a DataFrame by dtype.
+
+    Returns:
+        List of (dtype, column positions) or None if the frame cannot be
+        reconstructed unambiguously (duplicate or hierarchical column labels).
+    """
+    if not frame.columns.is_unique or isinstance(frame.columns, pd.MultiIndex):
+        return None
+
+    groups: dict[Any, list[int]] = {}
+    for position, dtype in enumerate(frame.dtypes):
+        if isinstance(dtype, np.dtype) and dtype.kind in SHM_DTYPE_KINDS:
+            groups.setdefault(dtype, []).append(position)
+    return list(groups.items())
+
+
+def _create_segment(nbytes: int) -> shared_memory.SharedMemory:
+    """Create a new shared memory segment of at least one byte."""
+    return shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+
+
+def _export_array(value: Any) -> dict:
+    """Copy an ndarray into a new segment and describe it."""
+    segment = _create_segment(value.nbytes)
+    try:
+        target = np.ndarray(value.shape, dtype=value.dtype, buffer=segment.buf)
+        target[...] = value
+        del target
+    finally:
+        segment.close()
+
+    return {
+        SHM_MARKER: "ndarray",
+        "name": segment.name,
+        "shape": list(value.shape),
+        "dtype": value.dtype.str,
+    }
+
+
+def _export_frame(frame: Any, blocks: list[tuple[Any, list[int]]]) -> dict:
+    """
+    Copy the numeric column blocks of a DataFrame into one segment.
+
+    Each dtype group is stored column-major as a 2-D block, so every column
+    is contiguous and can be reattached as a view without copying.
+    Remaining columns and the index travel in the descriptor and are
+    pickled as usual.
+    """
+    nrows = len(frame)
+    layout = []
+    offset = 0
+    for dtype, positions in blocks:
+        # Keep every block aligned for the widest scalar type
+        offset = (offset + 15) & ~15
+        layout.append({
+            "dtype": dtype.str,
+            "positions": positions,
+            "offset": offset,
+        })
+        offset += dtype.itemsize * nrows * len(positions)
+
+    segment = _create_segment(offset)
+    try:
+        for block in layout:
+            dtype = np.dtype(block["dtype"])
+            target = np.ndarray(
+                (len(block["positions"]), nrows),
+                dtype=dtype,
+                buffer=segment.buf,
+                offset=block["offset"],
+            )
+            for row, position in enumerate(block["positions"]):
+                target[row] = frame.iloc[:, position].to_numpy(dtype=dtype, copy=False)
+            del target
+    finally:
+        segment.close()
+
+    shared_positions = {p for _, positions in blocks for p in positions}
+    rest_positions = [p for p in range(frame.shape[1]) if p not in shared_positions]
+
+    return {
+        SHM_MARKER: "dataframe",
+        "name": segment.name,
+        "nrows": nrows,
+        "blocks": layout,
+        "columns": frame.columns,
+        "index": frame.index,
+        "rest": frame.iloc[:, rest_positions] if rest_positions else None,
+        "rest_positions": rest_positions,
+    }
+
+
+def export_value(value: Any, min_bytes: Optional[int] = SHM_MIN_BYTES) -> Optional[dict]:
+    """
+    Place a large ndarray or DataFrame in shared memory.
+
+    The created segment is owned by whoever calls import_value() on the
+    returned descriptor; if the descriptor is never imported it must be
+    passed to discard() instead.
+
+    Args:
+        value: Value to transfer
+        min_bytes: Minimum payload size for the shared-memory path
+            (None disables shared memory)
+
+    Returns:
+        A small picklable descriptor, or None if the value should be
+        transferred with pickle instead.
+    """
+    if not HAS_NUMPY or min_bytes is None:
+        return None
+
+    if _is_shareable_array(value):
+        if value.nbytes < min_bytes:
+            return None
+        return _export_array(value)
+
+    if HAS_PANDAS and isinstance(value, pd.DataFrame):
+        blocks = _frame_blocks(value)
+        if not blocks:
+            return None
+        shared_bytes = sum(
+            dtype.itemsize * len(value) * len(positions) for dtype, positions in blocks
+        )
+        if shared_bytes < min_bytes:
+            return None
+        return _export_frame(value, blocks)
+
+    return None
+
+
+def is_descriptor(value: Any) -> bool:
+    """Check whether a value is a shared-memory descriptor."""
+    return isinstance(value, dict) and SHM_MARKER in value
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a segment and immediately remove its name.
+
+    The mapping stays valid after unlinking, so the memory is released by
+    the OS as soon as the last view into it is garbage collected.
+    """
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+    return segment
+
+
+def _bind_lifetime(array: Any, segment: shared_memory.SharedMemory):
+    """Close the segment once the array (and every view of it) is gone."""
+    weakref.finalize(array, segment.close)
+
+
+def import_value(descriptor: dict) -> Any:
+    """
+    Rebuild a value from a descriptor produced by export_value().
+
+    Returns arrays and DataFrame blocks that are views backed by the shared
+    segment, so no further copy is made in the receiving process.
+    """
+    segment = _attach(descriptor["name"])
+
+    if descriptor[SHM_MARKER] == "ndarray":
+        array = np.ndarray(
+            tuple(descriptor["shape"]),
+            dtype=np.dtype(descriptor["dtype"]),
+            buffer=segment.buf,
+        )
+        _bind_lifetime(array, segment)
+        return array
+
+    nrows = descriptor["nrows"]
+    columns = descriptor["columns"]
+    # Every column is a view of one root array, so the segment is closed
+    # only after the last column has been released.
+    root = np.ndarray((segment.size,), dtype=np.uint8, buffer=segment.buf)
+    _bind_lifetime(root, segment)
+
+    arrays: list[Any] = [None] * len(columns)
+    for block in descriptor["blocks"]:
+        positions = block["positions"]
+        dtype = np.dtype(block["dtype"])
+        nbytes = dtype.itemsize * nrows * len(positions)
+        values = (
+            root[block["offset"]:block["offset"] + nbytes]
+            .view(dtype)
+            .reshape(len(positions), nrows)
+        )
+        for row, position in enumerate(positions):
+            arrays[position] = values[row]
+        del values
+
+    del root
+
+    rest = descriptor["rest"]
+    if rest is not None:
+        for i, position in enumerate(descriptor["rest_positions"]):
+            arrays[position] = rest.iloc[:, i].array
+
+    # Built from arrays rather than by concatenating frames, which copies
+    # without copy-on-write (pandas 2.x). Keys are positions since column
+    # names may repeat.
+    frame = pd.DataFrame(dict(enumerate(arrays)), index=descriptor["index"], copy=False)
+    frame.columns = columns
+    return frame
+
+
+def discard(descriptor: Optional[dict]):
+    """Release the segment of a descriptor that will never be imported."""
+    if not is_descriptor(descriptor):
+        return
+    try:
+        segment = shared_memory.SharedMemory(name=descriptor["name"])
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
@@ -0,0 +1,276 @@
+"""Notebook storage backends: the common interface and a SQLite implementation."""
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from blobstore import BlobStore
+from wire import RawJSON, dumps, loads
+
+
+# Cell fields kept with the cell itself; everything else is output
+CELL_FIELDS = ("id", "code", "status", "error", "peak_memory_delta")
+OUTPUT_FIELDS = ("output", "rich_output")
+
+# zlib level for output blobs: outputs are saved after every run, so favour
+# speed over the last few percent of size
+OUTPUT_COMPRESSION_LEVEL = 1
+
+# With a blob store, outputs at least this large (encoded) are stored there
+# and the cell keeps {BLOB_REF: digest, "size": bytes} in their place.
+# Outputs with attachments (wire.Attachment) always are, the attachments
+# as blobs of their own listed under ATTACHMENTS_REF.
+BLOB_MIN_BYTES = 4096
+BLOB_REF = "$blob"
+ATTACHMENTS_REF = "attachments"
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and BLOB_REF in value
+
+
+def externalize_outputs(cell: dict, blobs: BlobStore) -> dict:
+    """Copy of a cell with its large outputs moved to the blob store."""
+    cell = dict(cell)
+    for field in OUTPUT_FIELDS:
+        value = cell.get(field)
+        if value is None or is_blob_ref(value):
+            continue
+        attachments = None
+        if isinstance(value, RawJSON):
+            data, digest, attachments = value.data, value.digest, value.attachments
+        else:
+            data, digest = dumps(value), None
+        if attachments:
+            for attachment_digest, attachment in attachments.items():
+                # Bytes already moved to the store are only referred to
+                if attachment is not None:
+                    blobs.put(attachment, attachment_digest)
+            cell[field] = {
+                BLOB_REF: blobs.put(data, digest), "size": len(data), ATTACHMENTS_REF: list(attachments)
+            }
+        elif len(data) >= BLOB_MIN_BYTES:
+            cell[field] = {BLOB_REF: blobs.put(data, digest), "size": len(data)}
+    return cell
+
+
+def resolve_outputs(outputs: dict, blobs: Optional[BlobStore]) -> dict:
+    """
+    Copy of a dict of OUTPUT_FIELDS with blob references read back.
+
+    An output whose blob is missing or unreadable is dropped (only that
+    output; the rest of the notebook still loads).
+    """
+    resolved = dict(outputs)
+    for field in OUTPUT_FIELDS:
+        value = resolved.get(field)
+        if not is_blob_ref(value):
+            continue
+        digest = value[BLOB_REF]
+        try:
+            data = blobs.get(digest) if blobs is not None else None
+            if data is None:
+                print(f"Missing output blob {digest}")
+            elif value.get(ATTACHMENTS_REF):
+                # Kept encoded so its attachments can be found (and served) by digest
+                resolved[field] = RawJSON(data, digest, dict.fromkeys(value[ATTACHMENTS_REF]))
+                continue
+            else:
+                resolved[field] = loads(data)
+                continue
+        except Exception as e:
+            print(f"Unreadable output blob {digest}: {type(e).__name__}: {e}")
+        resolved[field] = "" if field == "output" else None
+    return resolved
+
+
+def blob_refs(cell: dict) -> Iterator[str]:
+    """Digests of the blobs a (saved) cell refers to."""
+    for field in OUTPUT_FIELDS:
+        value = cell.get(field)
+        if is_blob_ref(value):
+            yield value[BLOB_REF]
+            yield from value.get(ATTACHMENTS_REF, ())
+
+
+class NotebookStore:
+    """
+    Interface of a notebook storage backend.
+
+    Cells are dicts with the CELL_FIELDS and OUTPUT_FIELDS of a saved
+    cell. Changes arrive in batches (see autosave.NotebookSaver), always
+    with the full state of each changed cell.
+    """
+
+    def load(self, include_outputs: bool = True) -> list[dict]:
+        """
+        Read the notebook.
+
+        Args:
+            include_outputs: If False, cells come without OUTPUT_FIELDS
+                (for backends that can skip reading them)
+
+        Returns:
+            Cell dicts in display order
+        """
+        raise NotImplementedError
+
+    def load_outputs(self, cell_ids: Optional[Iterable[str]] = None) -> dict[str, dict]:
+        """Outputs (OUTPUT_FIELDS) of the given cells, or of all cells, by cell ID."""
+        raise NotImplementedError
+
+    def save_changes(self, cells: list[dict], deleted: list[str], order: Optional[list[str]]):
+        """
+        Record a batch of changes atomically.
+
+        Args:
+            cells: Full state of new or changed cells
+            deleted: IDs of deleted cells
+            order: Display order of the cells, or None if unchanged
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """Reclaim space (including unreferenced blobs) and make the stored notebook self-contained."""
+
+    def close(self):
+        """Release files and connections."""
+
+
+def _compress(value: Any) -> bytes:
+    return zlib.compress(dumps(value), OUTPUT_COMPRESSION_LEVEL)
+
+
+def _decompress(blob: bytes) -> Any:
+    return loads(zlib.decompress(blob))
+
+
+class SqliteNotebookStore(NotebookStore):
+    """
+    Notebook stored in a SQLite database.
+
+    Each cell is a row of `cells` (code, status, position); its text and
+    rich output are zlib-compressed JSON blobs in `outputs`, so the code
+    of a notebook can be read without touching its outputs. With a blob
+    store, large outputs are kept there and `outputs` holds references
+    (listed in its `blobs` column). A batch of changes is one transaction
+    that only writes the rows of changed cells. The database runs in WAL
+    mode; the connection may be used from any thread.
+    """
+
+    def __init__(self, path: Path, blobs: Optional[BlobStore] = None):
+        self.path = Path(path)
+        self.blobs = blobs
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS cells (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT NOT NULL,
+                peak_memory_delta INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS outputs (
+                cell_id TEXT PRIMARY KEY REFERENCES cells(id) ON DELETE CASCADE,
+                output BLOB NOT NULL,
+                rich_output BLOB NOT NULL,
+                blobs TEXT NOT NULL DEFAULT ''
+            );
+        """)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(outputs)")]
+        if "blobs" not in columns:
+            self._db.execute("ALTER TABLE outputs ADD COLUMN blobs TEXT NOT NULL DEFAULT ''")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM cells LIMIT 1").fetchone() is None
+
+    def load(self, include_outputs: bool = True) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, code, status, error, peak_memory_delta FROM cells ORDER BY position"
+            ).fetchall()
+        cells = [dict(zip(CELL_FIELDS, row)) for row in rows]
+        if include_outputs:
+            outputs = self.load_outputs()
+            for cell in cells:
+                cell.update(outputs.get(cell["id"], {"output": "", "rich_output": None}))
+        return cells
+
+    def load_outputs(self, cell_ids: Optional[Iterable[str]] = None) -> dict[str, dict]:
+        with self._lock:
+            if cell_ids is None:
+                rows = self._db.execute("SELECT cell_id, output, rich_output FROM outputs").fetchall()
+            else:
+                rows = []
+                for cell_id in cell_ids:
+                    rows += self._db.execute(
+                        "SELECT cell_id, output, rich_output FROM outputs WHERE cell_id = ?", (cell_id,)
+                    ).fetchall()
+        return {
+            cell_id: resolve_outputs(
+                {"output": _decompress(output), "rich_output": _decompress(rich_output)}, self.blobs
+            )
+            for cell_id, output, rich_output in rows
+        }
+
+    def save_changes(self, cells: list[dict], deleted: list[str], order: Optional[list[str]]):
+        # Store blobs and compress before taking the lock; it is the expensive part
+        if self.blobs is not None:
+            cells = [externalize_outputs(cell, self.blobs) for cell in cells]
+        rows = [
+            (cell, _compress(cell.get("output", "")), _compress(cell.get("rich_output")),
+             " ".join(blob_refs(cell)))
+            for cell in cells
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for cell, output, rich_output, refs in rows:
+                    self._db.execute(
+                        """
+                        INSERT INTO cells (id, position, code, status, error, peak_memory_delta)
+                        VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM cells), ?, ?, ?, ?)
+                        ON CONFLICT(id) DO UPDATE SET
+                            code = excluded.code, status = excluded.status,
+                            error = excluded.error, peak_memory_delta = excluded.peak_memory_delta
+                        """,
+                        (cell["id"], cell["code"], cell["status"], cell["error"], cell.get("peak_memory_delta"))
+                    )
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO outputs (cell_id, output, rich_output, blobs) VALUES (?, ?, ?, ?)",
+                        (cell["id"], output, rich_output, refs)
+                    )
+                self._db.executemany("DELETE FROM cells WHERE id = ?", [(cell_id,) for cell_id in deleted])
+                if order is not None:
+                    self._db.executemany(
+                        "UPDATE cells SET position = ? WHERE id = ?",
+                        [(position, cell_id) for position, cell_id in enumerate(order)]
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def compact(self):
+        """Fold the write-ahead log back into the database file and collect unused blobs."""
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            live = {
+                digest
+                for (refs,) in self._db.execute("SELECT blobs FROM outputs WHERE blobs != ''")
+                for digest in refs.split()
+            }
+        if self.blobs is not None:
+            self.blobs.collect(live)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,112 @@
+"""Tests for debounced background notebook saving."""
+import threading
+import time
+
+from autosave import NotebookSaver
+from journal import NotebookJournal
+
+
+class RecordingStore:
+    """Store that records each batch it is given."""
+
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.compactions = 0
+        self.fail_times = fail_times
+        self.written = threading.Event()
+
+    def save_changes(self, cells, deleted, order):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise OSError("disk full")
+        self.batches.append(([c["id"] + ":" + c["code"] for c in cells], deleted, order))
+        self.written.set()
+
+    def compact(self):
+        self.compactions += 1
+
+
+def _cell(cell_id, code=""):
+    return {"id": cell_id, "code": code}
+
+
+class TestNotebookSaver:
+    """Tests for collecting changes and writing them in batches."""
+
+    def test_burst_is_written_once_with_latest_state(self):
+        store = RecordingStore()
+        saver = NotebookSaver(store, interval=0.2)
+
+        for i in range(20):
+            saver.save_cell(_cell("a", f"x = {i}"))
+        saver.save_cell(_cell("b"))
+        saver.set_order(["b", "a"])
+
+        assert store.written.wait(timeout=5)
+        time.sleep(0.3)
+        assert store.batches == [(["a:x = 19", "b:"], [], ["b", "a"])]
+        saver.close()
+
+    def test_calls_do_not_wait_for_the_write(self):
+        store = RecordingStore()
+        saver = NotebookSaver(store, interval=5)
+
+        start = time.perf_counter()
+        saver.save_cell(_cell("a"))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.5
+        assert saver.pending
+        assert store.batches == []
+        saver.close()
+
+    def test_delete_drops_pending_state(self):
+        store = RecordingStore()
+        saver = NotebookSaver(store, interval=5)
+
+        saver.save_cell(_cell("a"))
+        saver.delete_cell("a")
+        saver.flush()
+
+        assert store.batches == [([], ["a"], None)]
+        assert not saver.pending
+        saver.close()
+
+    def test_close_flushes_and_compacts(self):
+        store = RecordingStore()
+        saver = NotebookSaver(store, interval=5)
+
+        saver.save_cell(_cell("a"))
+        saver.close()
+
+        assert store.batches == [(["a:"], [], None)]
+        assert store.compactions == 1
+
+    def test_failed_write_is_retried(self):
+        store = RecordingStore(fail_times=1)
+        saver = NotebookSaver(store, interval=5)
+
+        saver.save_cell(_cell("a", "old"))
+        saver.save_cell(_cell("b"))
+        try:
+            saver.flush()
+        except OSError:
+            pass
+        saver.save_cell(_cell("a", "new"))
+        saver.flush()
+
+        assert store.batches == [(["a:new", "b:"], [], None)]
+        saver.close()
+
+    def test_writes_to_journal(self, tmp_path):
+        journal = NotebookJournal(tmp_path / "nb.json")
+        journal.load()
+        saver = NotebookSaver(journal, interval=5)
+
+        saver.save_cell(_cell("a", "x = 1"))
+        saver.flush()
+        journal.close()
+        replayed = NotebookJournal(tmp_path / "nb.json").load()
+
+        assert replayed == [_cell("a", "x = 1")]
+        saver.close()
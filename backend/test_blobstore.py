@@ -0,0 +1,75 @@
+"""Tests for the content-addressed blob store."""
+import os
+import time
+
+from blobstore import BlobStore, digest_of
+from wire import encode_json
+
+
+class TestBlobStore:
+    """Tests for storing, deduplicating and collecting blobs."""
+
+    def test_round_trip(self, tmp_path):
+        blobs = BlobStore(tmp_path)
+        data = b'{"values": [1, 2, 3]}' * 100
+
+        digest = blobs.put(data)
+
+        assert digest == digest_of(data)
+        assert digest in blobs
+        assert blobs.get(digest) == data
+
+    def test_identical_content_is_stored_once(self, tmp_path):
+        blobs = BlobStore(tmp_path)
+
+        first = blobs.put(b"x" * 10_000)
+        second = blobs.put(b"x" * 10_000)
+
+        files = [p for p in tmp_path.rglob("*") if p.is_file()]
+        assert first == second
+        assert len(files) == 1
+        assert files[0].stat().st_size < 1000
+
+    def test_blob_and_directory_are_synced_before_put_returns(self, tmp_path, monkeypatch):
+        synced = []
+        real_fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: synced.append(os.fstat(fd).st_mode) or real_fsync(fd))
+
+        BlobStore(tmp_path).put(b"x" * 10_000)
+
+        assert any(os.path.stat.S_ISREG(mode) for mode in synced)
+        assert any(os.path.stat.S_ISDIR(mode) for mode in synced)
+
+    def test_unknown_digest(self, tmp_path):
+        assert BlobStore(tmp_path).get("0" * 64) is None
+
+    def test_digest_matches_encoded_json(self, tmp_path):
+        encoded = encode_json({"type": "ndarray", "data": [1.5]})
+
+        assert BlobStore(tmp_path).put(encoded.data, encoded.digest) == digest_of(encoded.data)
+
+    def test_collect_keeps_live_and_recent_blobs(self, tmp_path):
+        blobs = BlobStore(tmp_path)
+        live = blobs.put(b"live")
+        dead = blobs.put(b"dead")
+        recent = blobs.put(b"recent")
+        old = time.time() - 3600
+        for digest in (live, dead):
+            path = next(tmp_path.rglob(digest[2:] + ".*"))
+            os.utime(path, (old, old))
+
+        removed = blobs.collect([live])
+
+        assert removed == 1
+        assert live in blobs and recent in blobs
+        assert dead not in blobs
+
+    def test_put_refreshes_age(self, tmp_path):
+        blobs = BlobStore(tmp_path)
+        digest = blobs.put(b"again")
+        path = next(tmp_path.rglob(digest[2:] + ".*"))
+        os.utime(path, (0, 0))
+
+        blobs.put(b"again")
+
+        assert blobs.collect([]) == 0
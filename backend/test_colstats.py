@@ -0,0 +1,159 @@
+"""Tests for DataFrame column statistics."""
+import time
+
+import pytest
+
+from colstats import column_stats, STATS_BINS, STATS_SAMPLE_ROWS, HAS_PANDAS
+from kernel import serialize_rich_output, NotebookKernel
+
+if HAS_PANDAS:
+    import numpy as np
+    import pandas as pd
+
+
+def _by_column(stats):
+    return {entry["column"]: entry for entry in stats}
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestColumnStats:
+    """Tests for per-column summaries of small (unsampled) frames."""
+
+    def test_numeric_column(self):
+        df = pd.DataFrame({'x': [1.0, 2.0, None, 4.0, 2.0]})
+
+        stats = column_stats(df)[0]
+
+        assert stats['column'] == 'x'
+        assert stats['count'] == 4
+        assert stats['null_count'] == 1
+        assert stats['min'] == 1.0
+        assert stats['max'] == 4.0
+        assert stats['mean'] == pytest.approx(2.25)
+        assert stats['distinct'] == 3
+        assert stats['distinct_exact'] is True
+        assert stats['sampled'] is False
+        assert len(stats['histogram']['edges']) == STATS_BINS + 1
+        assert sum(stats['histogram']['counts']) == 4
+
+    def test_integer_min_max_stay_integers(self):
+        stats = column_stats(pd.DataFrame({'i': [5, -3, 10]}))[0]
+
+        assert stats['min'] == -3 and isinstance(stats['min'], int)
+        assert stats['max'] == 10 and isinstance(stats['max'], int)
+
+    def test_infinity_is_excluded_from_numeric_stats(self):
+        stats = column_stats(pd.DataFrame({'x': [1.0, float('inf'), 3.0]}))[0]
+
+        assert stats['max'] == 3.0
+        assert sum(stats['histogram']['counts']) == 2
+
+    def test_string_column_top_values(self):
+        df = pd.DataFrame({'s': ['a', 'b', 'a', None, 'a']})
+
+        stats = column_stats(df)[0]
+
+        assert stats['null_count'] == 1
+        assert stats['distinct'] == 2
+        assert stats['histogram'] is None
+        assert stats['top_values'][0] == {'value': 'a', 'count': 3}
+
+    def test_bool_column(self):
+        stats = column_stats(pd.DataFrame({'b': [True, False, True, True]}))[0]
+
+        assert stats['mean'] == 0.75
+        assert stats['top_values'][0] == {'value': True, 'count': 3}
+
+    def test_datetime_column(self):
+        df = pd.DataFrame({'d': pd.to_datetime(['2021-03-01', None, '2020-01-01'])})
+
+        stats = column_stats(df)[0]
+
+        assert stats['min'].startswith('2020-01-01')
+        assert stats['max'].startswith('2021-03-01')
+        assert stats['null_count'] == 1
+
+    def test_unhashable_values(self):
+        stats = column_stats(pd.DataFrame({'l': [[1], [2]]}))[0]
+
+        assert stats['distinct'] is None
+        assert stats['count'] == 2
+
+    def test_time_budget_skips_remaining_columns(self):
+        df = pd.DataFrame({'a': [1], 'b': [2]})
+
+        assert column_stats(df, time_budget=-1) == []
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestLargeFrameStats:
+    """Tests for sampled and sketched statistics of large frames."""
+
+    def test_distinct_estimate(self):
+        n = STATS_SAMPLE_ROWS * 3
+        df = pd.DataFrame({'k': np.arange(n) % 200_000})
+
+        stats = column_stats(df, time_budget=30)[0]
+
+        assert stats['distinct_exact'] is False
+        assert stats['distinct'] == pytest.approx(200_000, rel=0.1)
+
+    def test_sampled_nulls_and_exact_extremes(self):
+        n = STATS_SAMPLE_ROWS * 4
+        values = np.arange(n, dtype=np.float64)
+        values[::4] = np.nan
+        df = pd.DataFrame({'v': values})
+
+        stats = column_stats(df, time_budget=30)[0]
+
+        assert stats['sampled'] is True
+        assert stats['null_count'] == pytest.approx(n / 4, rel=0.05)
+        assert stats['min'] == 1.0
+        assert stats['max'] == n - 1
+        assert sum(stats['histogram']['counts']) <= STATS_SAMPLE_ROWS
+
+
+    def test_many_columns_stay_within_budget(self):
+        df = pd.DataFrame(np.random.rand(STATS_SAMPLE_ROWS + 50_000, 200).astype(np.float32))
+
+        start = time.monotonic()
+        stats = column_stats(df, time_budget=0.1)
+        elapsed = time.monotonic() - start
+
+        assert elapsed < 0.2
+        assert len(stats) < 200
+        # Columns are either complete or omitted
+        assert all(entry['distinct'] is not None and entry['mean'] is not None for entry in stats)
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestRichOutputStats:
+    """Tests for statistics attached to DataFrame rich output."""
+
+    def test_stats_are_optional(self):
+        df = pd.DataFrame({'a': [1, 2]})
+
+        assert 'column_stats' not in serialize_rich_output(df)
+        assert len(serialize_rich_output(df, column_stats=True)['column_stats']) == 1
+
+    def test_stats_cover_whole_frame(self):
+        df = pd.DataFrame({'a': range(1000)})
+
+        result = serialize_rich_output(df, column_stats=True)
+
+        assert result['truncated'] is True
+        assert result['column_stats'][0]['max'] == 999
+
+    def test_kernel_attaches_stats(self):
+        kernel = NotebookKernel(column_stats=True)
+
+        result = kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': [1, 2, 3]})")
+
+        assert _by_column(result['rich_output']['column_stats'])['a']['mean'] == 2.0
+
+    def test_kernel_stats_off_by_default(self):
+        kernel = NotebookKernel()
+
+        result = kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': [1]})")
+
+        assert 'column_stats' not in result['rich_output']
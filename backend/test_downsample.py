@@ -0,0 +1,176 @@
+"""Tests for shape-preserving downsampling of large array previews."""
+import tracemalloc
+
+import pytest
+
+from downsample import (
+    downsample_1d, downsample_2d, minmax_positions, lttb_positions, block_mean,
+    ARRAY_1D_MODES, HAS_NUMPY
+)
+from kernel import serialize_rich_output, NotebookKernel, MAX_ARRAY_ELEMENTS
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestDownsample1D:
+    """Tests for minmax and LTTB reduction of 1-D arrays."""
+
+    @pytest.mark.parametrize("mode", ARRAY_1D_MODES)
+    @pytest.mark.parametrize("n", [1001, 12_345, 1_000_000])
+    def test_payload_is_bounded(self, mode, n):
+        values, positions, _ = downsample_1d(np.random.rand(n), 1000, mode)
+
+        assert len(values) <= 1000
+        assert np.all(np.diff(positions) > 0)
+
+    def test_minmax_keeps_extremes(self):
+        values = np.sin(np.linspace(0, 100, 1_000_000))
+        values[123_457] = 50.0
+        values[876_543] = -50.0
+
+        positions = minmax_positions(values, 1000)
+
+        assert 123_457 in positions
+        assert 876_543 in positions
+
+    def test_minmax_skips_nan(self):
+        values = np.arange(5000.0)
+        values[::2] = np.nan
+
+        positions = minmax_positions(values, 100)
+
+        assert not np.isnan(values[positions]).any()
+
+    def test_lttb_keeps_endpoints_and_spike(self):
+        values = np.zeros(100_000)
+        values[54_321] = 1.0
+
+        positions = lttb_positions(values, 500)
+
+        assert len(positions) == 500
+        assert positions[0] == 0 and positions[-1] == 99_999
+        assert 54_321 in positions
+
+    def test_minmax_keeps_all_nan_bucket_and_inf(self):
+        values = np.arange(1000.0)
+        values[:100] = np.nan
+        values[500] = np.inf
+
+        positions = minmax_positions(values, 20)
+
+        assert 0 in positions
+        assert 500 in positions
+
+    @pytest.mark.parametrize("reduce", [minmax_positions, lttb_positions])
+    @pytest.mark.parametrize("dtype", ["float64", "int64"])
+    def test_no_array_sized_temporaries(self, reduce, dtype):
+        values = (np.random.rand(2_000_000) * 1000).astype(dtype)
+        if dtype == "float64":
+            values[::97] = np.nan
+
+        tracemalloc.start()
+        try:
+            reduce(values, 1000)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert peak < values.nbytes / 10
+
+    def test_non_numeric_falls_back_to_stride(self):
+        values = np.array([f"s{i}" for i in range(5000)])
+
+        result, positions, mode = downsample_1d(values, 100, "lttb")
+
+        assert mode == "stride"
+        assert positions[0] == 0 and positions[-1] == 4999
+        assert result[-1] == "s4999"
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            downsample_1d(np.arange(10), 5, "median")
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestDownsample2D:
+    """Tests for stride and block-mean reduction of 2-D arrays."""
+
+    def test_block_mean(self):
+        values = np.arange(16.0).reshape(4, 4)
+
+        result = block_mean(values, np.array([0, 2]), np.array([0, 2]))
+
+        assert result.tolist() == [[2.5, 4.5], [10.5, 12.5]]
+
+    def test_blockmean_covers_whole_array(self):
+        values = np.ones((1000, 700))
+        values[-1, -1] = 1 + 400 * 30  # one element lifts the last block's mean
+
+        result, rows, cols, mode = downsample_2d(values, 31, "blockmean")
+
+        assert mode == "blockmean"
+        assert result.shape == (31, 31)
+        assert result[-1, -1] > 1
+        assert rows[0] == 0 and cols[0] == 0
+
+    def test_stride_includes_last_row_and_column(self):
+        values = np.arange(200 * 100).reshape(200, 100)
+
+        result, rows, cols, _ = downsample_2d(values, 31, "stride")
+
+        assert result.shape == (31, 31)
+        assert rows[-1] == 199 and cols[-1] == 99
+        assert result[-1, -1] == values[-1, -1]
+
+    def test_blockmean_non_numeric_falls_back_to_stride(self):
+        values = np.full((50, 50), "x")
+
+        _, _, _, mode = downsample_2d(values, 31, "blockmean")
+
+        assert mode == "stride"
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestArrayPreviewSampling:
+    """Tests for downsampled ndarray rich output."""
+
+    def test_head_mode_has_no_sampling(self):
+        result = serialize_rich_output(np.arange(MAX_ARRAY_ELEMENTS * 2))
+
+        assert 'sampling' not in result
+
+    def test_1d_sampling_metadata(self):
+        arr = np.arange(MAX_ARRAY_ELEMENTS * 10)
+
+        result = serialize_rich_output(arr, array_1d_mode="minmax")
+
+        assert result['truncated'] is True
+        assert result['sampling']['method'] == 'minmax'
+        positions = result['sampling']['positions'][0]
+        assert len(positions) == len(result['data']) <= MAX_ARRAY_ELEMENTS
+        assert positions[-1] == len(arr) - 1
+        assert result['data'][-1] == len(arr) - 1
+
+    def test_2d_sampling_metadata(self):
+        result = serialize_rich_output(np.ones((500, 20)), array_2d_mode="blockmean")
+
+        assert len(result['data']) == 31
+        assert len(result['data'][0]) == 20
+        assert [len(axis) for axis in result['sampling']['positions']] == [31, 20]
+
+    def test_small_arrays_unchanged(self):
+        result = serialize_rich_output(np.arange(10), array_1d_mode="lttb")
+
+        assert result['data'] == list(range(10))
+        assert 'sampling' not in result
+
+    def test_kernel_downsamples_by_default(self):
+        kernel = NotebookKernel()
+
+        result = kernel.execute_cell("c1", "import numpy as np\nnp.arange(100_000.0)")
+
+        rich = result['rich_output']
+        assert rich['sampling']['method'] == 'minmax'
+        assert rich['data'][-1] == 99_999.0
@@ -0,0 +1,152 @@
+"""Tests for snapshot plus journal notebook persistence."""
+import json
+
+import journal
+from blobstore import BlobStore
+from journal import NotebookJournal
+from wire import encode_json
+
+
+def _cell(cell_id, code="", **fields):
+    return {"id": cell_id, "code": code, "output": "", "rich_output": None,
+            "error": "", "status": "idle", **fields}
+
+
+def _reopen(notebook):
+    reopened = NotebookJournal(notebook.snapshot_path)
+    return reopened, reopened.load()
+
+
+class TestJournal:
+    """Tests for journaling cell changes and replaying them."""
+
+    def test_changes_replay_without_snapshot(self, tmp_path):
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        notebook.put_cell(_cell("a", "x = 1"))
+        notebook.put_cell(_cell("b", "y = x"))
+        notebook.put_cell(_cell("a", "x = 2", status="success"))
+        notebook.close()
+
+        _, cells = _reopen(notebook)
+
+        assert [(c["id"], c["code"]) for c in cells] == [("a", "x = 2"), ("b", "y = x")]
+        assert cells[0]["status"] == "success"
+        assert not (tmp_path / "nb.json").exists()
+
+    def test_delete_and_order(self, tmp_path):
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        for cell_id in "abc":
+            notebook.put_cell(_cell(cell_id))
+        notebook.set_order(["c", "a", "b"])
+        notebook.delete_cell("a")
+        notebook.close()
+
+        _, cells = _reopen(notebook)
+
+        assert [c["id"] for c in cells] == ["c", "b"]
+
+    def test_journal_applies_over_snapshot(self, tmp_path):
+        snapshot = tmp_path / "nb.json"
+        snapshot.write_text(json.dumps({"cells": [_cell("a", "old"), _cell("b")]}))
+        notebook = NotebookJournal(snapshot)
+        notebook.load()
+        notebook.put_cell(_cell("a", "new"))
+        notebook.close()
+
+        _, cells = _reopen(notebook)
+
+        assert [(c["id"], c["code"]) for c in cells] == [("a", "new"), ("b", "")]
+
+    def test_torn_last_record_is_dropped(self, tmp_path):
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        notebook.put_cell(_cell("a", "kept"))
+        notebook.close()
+        with open(notebook.journal_path, "ab") as f:
+            f.write(b'{"op": "cell", "cell": {"id": "b", "co')
+
+        reopened, cells = _reopen(notebook)
+        reopened.put_cell(_cell("c"))
+        reopened.close()
+        _, cells_after = _reopen(notebook)
+
+        assert [c["id"] for c in cells] == ["a"]
+        assert [c["id"] for c in cells_after] == ["a", "c"]
+
+    def test_encoded_rich_output_is_stored(self, tmp_path):
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        notebook.put_cell(_cell("a", rich_output=encode_json({"type": "ndarray", "data": [1, 2]})))
+        notebook.close()
+
+        _, cells = _reopen(notebook)
+
+        assert cells[0]["rich_output"] == {"type": "ndarray", "data": [1, 2]}
+
+
+class TestCompaction:
+    """Tests for folding the journal into a new snapshot."""
+
+    def test_compact_writes_snapshot_and_removes_journal(self, tmp_path):
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        notebook.put_cell(_cell("a", "x = 1"))
+
+        notebook.compact()
+
+        assert not notebook.journal_path.exists()
+        assert not (tmp_path / "nb.json.tmp").exists()
+        assert json.loads((tmp_path / "nb.json").read_text())["cells"][0]["code"] == "x = 1"
+        assert notebook.records == 0
+
+    def test_compacts_after_record_limit(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(journal, "COMPACT_RECORDS", 3)
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+
+        for i in range(4):
+            notebook.put_cell(_cell("a", f"x = {i}"))
+        notebook.close()
+
+        assert json.loads((tmp_path / "nb.json").read_text())["cells"][0]["code"] == "x = 2"
+        _, cells = _reopen(notebook)
+        assert cells[0]["code"] == "x = 3"
+
+    def test_replay_after_interrupted_compaction(self, tmp_path):
+        # A crash after the snapshot rename but before the journal is
+        # removed replays records that are already in the snapshot
+        notebook = NotebookJournal(tmp_path / "nb.json")
+        notebook.load()
+        notebook.put_cell(_cell("a"))
+        notebook.put_cell(_cell("b"))
+        notebook.set_order(["b", "a"])
+        notebook.delete_cell("a")
+        notebook.close()
+        journal_bytes = notebook.journal_path.read_bytes()
+        notebook.compact()
+        notebook.journal_path.write_bytes(journal_bytes)
+
+        _, cells = _reopen(notebook)
+
+        assert [c["id"] for c in cells] == ["b"]
+
+
+class TestJournalBlobs:
+    """Tests for journal and snapshot holding blob references."""
+
+    def test_snapshot_refers_to_blobs(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        notebook = NotebookJournal(tmp_path / "nb.json", blobs=blobs)
+        notebook.load()
+        notebook.put_cell(_cell("a", output="line\n" * 2000))
+        notebook.compact()
+
+        saved = json.loads((tmp_path / "nb.json").read_text())["cells"][0]
+        cells = NotebookJournal(tmp_path / "nb.json", blobs=blobs).load()
+
+        assert saved["output"]["$blob"] in blobs
+        assert saved["output"]["size"] > 4096
+        assert cells[0]["output"] == "line\n" * 2000
+        assert notebook.load(include_outputs=False)[0].keys() == {"id", "code", "error", "status"}
@@ -0,0 +1,304 @@
+"""Tests for the notebook server: WebSocket delivery, saved outputs and blobs."""
+import os
+import tempfile
+
+import pytest
+
+# The server opens (and saves to) its notebook on import; keep that out of notebooks/
+os.environ["NOTEBOOKS_DIR"] = tempfile.mkdtemp(prefix="notebook-test-")
+
+from fastapi.testclient import TestClient
+
+import main
+from journal import NotebookJournal
+from outbound import RecentMessages
+from reactive import ReactiveEngine
+
+
+def _until(ws, predicate):
+    """Receive messages until one matches predicate, and return that one."""
+    while True:
+        message = ws.receive_json()
+        if predicate(message):
+            return message
+
+
+def _finished(cell_id):
+    """Matches the message that completes a run of the cell (rich output included)."""
+    return lambda m: m.get("cell_id") == cell_id and (
+        m["type"] == "rich_output_ready" or (m["type"] == "execution_result" and not m["rich_pending"])
+    )
+
+
+def _add_and_run(ws, code):
+    """Add a cell with the given code, wait for its run to finish and return its ID."""
+    ws.send_json({"type": "add_cell", "position": 0})
+    cell_id = _until(ws, lambda m: m["type"] == "cell_added")["cell"]["id"]
+    ws.send_json({"type": "cell_updated", "cell_id": cell_id, "code": code})
+    _until(ws, _finished(cell_id))
+    return cell_id
+
+
+def _delete_cells(client, cell_ids):
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        for cell_id in cell_ids:
+            ws.send_json({"type": "delete_cell", "cell_id": cell_id})
+            _until(ws, lambda m: m["type"] == "cell_deleted" and m["cell_id"] == cell_id)
+
+
+def _saved_cell(cell_id, code, output=""):
+    return {
+        "id": cell_id, "code": code, "output": output, "rich_output": None,
+        "status": "success", "error": "", "peak_memory_delta": None
+    }
+
+
+class TestLazyOutputs:
+    """Tests for reading saved outputs when first needed rather than at startup."""
+
+    def test_outputs_are_read_when_the_first_client_connects(self, tmp_path, monkeypatch):
+        NotebookJournal(tmp_path / "nb.json").save_changes(
+            [_saved_cell("lazy1", "lazy = 1", "saved output\n")], [], ["lazy1"]
+        )
+        # A fresh engine on the server's kernel (no second worker process)
+        engine = ReactiveEngine(kernel=main.engine.kernel)
+        monkeypatch.setattr(main, "engine", engine)
+        monkeypatch.setattr(main, "notebook_store", NotebookJournal(tmp_path / "nb.json"))
+        monkeypatch.setattr(main, "_outputs_loading", None)
+
+        main.load_notebook()
+
+        assert engine.cells["lazy1"].code == "lazy = 1"
+        assert engine.cells["lazy1"].output == ""
+
+        with TestClient(main.app) as client, client.websocket_connect("/ws") as ws:
+            state = ws.receive_json()
+
+        assert state["type"] == "notebook_state"
+        assert state["cells"][0]["output"] == "saved output\n"
+        assert engine.cells["lazy1"].output == "saved output\n"
+
+
+class _ServerTests:
+    """A running server; cells added to self.cell_ids are deleted afterwards."""
+
+    def setup_method(self):
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        self.cell_ids = []
+
+    def teardown_method(self):
+        _delete_cells(self.client, self.cell_ids)
+        self.client.__exit__(None, None, None)
+
+
+class TestOutputRefs(_ServerTests):
+    """Tests for large outputs sent as references and served by /api/blobs."""
+
+    def test_state_refers_to_large_outputs_served_as_blobs(self):
+        with self.client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            big = _add_and_run(ws, "import numpy as ref_np, pandas as ref_pd\nref_pd.DataFrame(ref_np.random.rand(5000, 40))")
+            small = _add_and_run(ws, "import pandas as ref_pd2\nref_pd2.Series([1, 2])")
+            self.cell_ids += [big, small]
+
+        with self.client.websocket_connect("/ws") as ws:
+            cells = {cell["id"]: cell for cell in ws.receive_json()["cells"]}
+
+        assert cells[small]["rich_output"]["type"] == "series"
+        assert cells[small]["rich_output_ref"] is None
+        ref = cells[big]["rich_output_ref"]
+        assert cells[big]["rich_output"] is None
+        assert ref["size"] > main.INLINE_RICH_OUTPUT_BYTES
+
+        response = self.client.get(f"/api/blobs/{ref['digest']}")
+
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        rich_output = response.json()
+        assert rich_output["type"] == "dataframe"
+        assert rich_output["shape"] == [5000, 40]
+        if isinstance(rich_output["data"], dict):
+            # Rows are an Arrow attachment, served the same way
+            attachment = self.client.get(f"/api/blobs/{rich_output['data']['digest']}")
+            assert attachment.status_code == 200
+            assert attachment.headers["content-type"] == main.ARROW_STREAM_MEDIA_TYPE
+
+    def test_unknown_and_invalid_digests(self):
+        assert self.client.get(f"/api/blobs/{'0' * 64}").status_code == 404
+        assert self.client.get("/api/blobs/not-a-digest").status_code == 400
+
+
+class TestResume(_ServerTests):
+    """Tests for reconnecting clients resuming from their last seq."""
+
+    def _run_while_away(self, code):
+        with self.client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            self.cell_ids.append(_add_and_run(ws, code))
+        return self.cell_ids[-1]
+
+    def test_resume_from_known_seq_replays_what_was_missed(self):
+        with self.client.websocket_connect("/ws") as ws:
+            state = ws.receive_json()
+        cell_id = self._run_while_away("resume_x = 41 + 1\nprint(resume_x)")
+
+        with self.client.websocket_connect(f"/ws?session={state['session']}&seq={state['seq']}") as ws:
+            missed = [ws.receive_json()]
+            while missed[-1]["type"] != "execution_result":
+                missed.append(ws.receive_json())
+
+        assert missed[0]["type"] == "cell_added"
+        assert missed[0]["cell"]["id"] == cell_id
+        seqs = [m["seq"] for m in missed]
+        # Queued messages that a later one supersedes may be skipped
+        assert seqs == sorted(set(seqs))
+        assert seqs[0] == state["seq"] + 1
+        assert seqs[-1] == main.manager.seq
+        assert missed[-1]["output"].strip() == "42"
+
+    def test_resume_from_expired_seq_gets_full_state(self, monkeypatch):
+        monkeypatch.setattr(main.manager, "recent", RecentMessages(max_messages=2))
+        with self.client.websocket_connect("/ws") as ws:
+            state = ws.receive_json()
+        cell_id = self._run_while_away("expired_x = 1")
+
+        with self.client.websocket_connect(f"/ws?session={state['session']}&seq={state['seq']}") as ws:
+            fresh = ws.receive_json()
+
+        assert fresh["type"] == "notebook_state"
+        assert fresh["seq"] > state["seq"]
+        assert cell_id in [cell["id"] for cell in fresh["cells"]]
+
+    def test_unknown_session_gets_full_state(self):
+        with self.client.websocket_connect("/ws?session=restarted&seq=1") as ws:
+            assert ws.receive_json()["type"] == "notebook_state"
+
+
+class TestSubscriptions(_ServerTests):
+    """Tests for outputs sent only to clients subscribed to the cell."""
+
+    CODE = "import pandas as sub_pd\nprint('sub')\nsub_pd.DataFrame({'a': [1, 2]})"
+
+    def test_only_subscribed_clients_get_outputs(self):
+        with self.client.websocket_connect("/ws") as viewer, self.client.websocket_connect("/ws") as away:
+            viewer.receive_json()
+            away.receive_json()
+            away.send_json({"type": "subscribe", "cell_ids": []})
+
+            cell_id = _add_and_run(away, self.CODE)
+            self.cell_ids.append(cell_id)
+            result = _until(viewer, lambda m: m["type"] == "execution_result")
+            ready = _until(viewer, _finished(cell_id))
+
+            assert result["output"].startswith("sub\n")
+            assert ready["rich_output"]["shape"] == [2, 1]
+
+            # The unsubscribed client got the result as a status update only
+            away.send_json({"type": "subscribe", "cell_ids": [cell_id]})
+            caught_up = _until(away, lambda m: m["cell_id"] == cell_id and m.get("rich_output"))
+
+        assert caught_up["type"] == "cell_output"
+        assert caught_up["output"] == result["output"]
+        assert caught_up["rich_output"]["shape"] == [2, 1]
+
+    def test_unsubscribed_result_is_a_status_update(self):
+        with self.client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "subscribe", "cell_ids": []})
+            ws.send_json({"type": "add_cell", "position": 0})
+            cell_id = _until(ws, lambda m: m["type"] == "cell_added")["cell"]["id"]
+            self.cell_ids.append(cell_id)
+            ws.send_json({"type": "cell_updated", "cell_id": cell_id, "code": self.CODE})
+
+            result = _until(ws, lambda m: m["type"] == "execution_result")
+
+        assert result["status"] == "success"
+        assert result["output_omitted"] is True
+        assert result["output"] == ""
+        assert result["rich_output"] is None
+        assert result["rich_pending"] is False
+
+
+
+# Each message type the frontend sends (types.ts ClientMessage), as it sends
+# it, and with one field of the wrong type or missing (interrupt has no
+# fields that could be)
+CLIENT_MESSAGE_CASES = {
+    "cell_updated": (
+        {"type": "cell_updated", "cell_id": "c1", "code": "x = 1"},
+        {"type": "cell_updated", "cell_id": "c1"},
+    ),
+    "execute_cell": (
+        {"type": "execute_cell", "cell_id": "c1"},
+        {"type": "execute_cell", "cell_id": 1},
+    ),
+    "add_cell": (
+        {"type": "add_cell", "position": 3},
+        {"type": "add_cell", "position": "3"},
+    ),
+    "delete_cell": (
+        {"type": "delete_cell", "cell_id": "c1"},
+        {"type": "delete_cell", "cell_id": None},
+    ),
+    "interrupt": (
+        {"type": "interrupt"},
+        None,
+    ),
+    "inspect_variables": (
+        {"type": "inspect_variables", "names": ["df"]},
+        {"type": "inspect_variables", "names": "df"},
+    ),
+    "fetch_rows": (
+        {
+            "type": "fetch_rows", "cell_id": "c1", "offset": 0, "limit": 200,
+            "query": {"sort": [{"column": "a", "ascending": False}], "filters": []}
+        },
+        {"type": "fetch_rows", "cell_id": "c1", "offset": 0.5, "limit": 200, "query": None},
+    ),
+    "subscribe": (
+        {"type": "subscribe", "cell_ids": ["c1", "c2"], "missing": ["c2"]},
+        {"type": "subscribe", "cell_ids": "c1", "missing": []},
+    ),
+    "unsubscribe": (
+        {"type": "unsubscribe", "cell_ids": ["c1"]},
+        {"type": "unsubscribe"},
+    ),
+}
+
+
+class TestClientMessageValidation:
+    """Tests for the strict validation of messages from clients."""
+
+    def test_every_client_message_is_covered(self):
+        assert set(CLIENT_MESSAGE_CASES) == set(main.CLIENT_MESSAGES)
+
+    @pytest.mark.parametrize("msg_type", sorted(CLIENT_MESSAGE_CASES))
+    def test_valid_message_is_accepted(self, msg_type):
+        assert main.client_message_error(CLIENT_MESSAGE_CASES[msg_type][0]) is None
+
+    @pytest.mark.parametrize("msg_type", sorted(t for t, (_, invalid) in CLIENT_MESSAGE_CASES.items() if invalid))
+    def test_invalid_message_is_rejected(self, msg_type):
+        error = main.client_message_error(CLIENT_MESSAGE_CASES[msg_type][1])
+
+        assert error is not None
+        assert error.startswith(f"Invalid {msg_type} message: ")
+
+    def test_rejected_message_is_answered_with_an_error(self):
+        with TestClient(main.app) as client, client.websocket_connect("/ws") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "delete_cell", "cell_id": 7})
+            error = ws.receive_json()
+            # The connection is still usable
+            ws.send_json({"type": "fetch_rows", "cell_id": "nowhere", "offset": 0, "limit": 10})
+            after = ws.receive_json()
+
+        assert error["type"] == "error"
+        assert error["message"].startswith("Invalid delete_cell message: cell_id")
+        assert after["type"] == "rows_window"
+        assert after["error"].startswith("No result retained")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,51 @@
+"""Tests for building server messages without validation."""
+import pytest
+
+from models import (
+    Cell, CellAddedMessage, ErrorMessage, ExecutionResultMessage, NotebookStateMessage,
+    OutputRef, RowsWindowMessage, SubscribeMessage, VariableSummariesMessage, construct_message
+)
+
+
+class TestConstructMessage:
+    """Tests for construct_message()."""
+
+    @pytest.mark.parametrize("model, fields", [
+        (ExecutionResultMessage, {"cell_id": "a", "status": "success", "output": "1\n", "error": ""}),
+        (ErrorMessage, {"message": "Circular dependency"}),
+        (RowsWindowMessage, {"cell_id": "a", "offset": 0, "total_rows": 2, "data": [[1, 2]], "index": [0, 1]}),
+        (VariableSummariesMessage, {"variables": []}),
+        (Cell, {"id": "a", "rich_output_ref": {"digest": "d", "size": 10}}),
+    ])
+    def test_matches_model_dump(self, model, fields):
+        message = construct_message(model, **fields)
+
+        assert message == model(**fields).model_dump()
+        assert list(message) == list(model.model_fields)
+
+    def test_nested_messages(self):
+        cell = construct_message(Cell, id="a", code="x = 1")
+        state = construct_message(NotebookStateMessage, cells=[cell], session="s", seq=3)
+
+        assert state == NotebookStateMessage(cells=[Cell(id="a", code="x = 1")], session="s", seq=3).model_dump()
+        assert construct_message(CellAddedMessage, cell=cell, position=0)["cell"] is cell
+
+    def test_values_are_not_validated_or_copied(self):
+        rich_output = object()
+
+        message = construct_message(ExecutionResultMessage, cell_id="a", status="success",
+                                    output="", error="", rich_output=rich_output)
+
+        assert message["rich_output"] is rich_output
+
+    def test_mutable_defaults_are_not_shared(self):
+        first = construct_message(SubscribeMessage, cell_ids=["a"])
+        first["missing"].append("a")
+
+        assert construct_message(SubscribeMessage, cell_ids=["b"])["missing"] == []
+
+    def test_missing_and_unknown_fields_raise(self):
+        with pytest.raises(TypeError, match="missing fields \\['size'\\]"):
+            construct_message(OutputRef, digest="d")
+        with pytest.raises(TypeError, match="unknown fields \\['sise'\\]"):
+            construct_message(OutputRef, digest="d", size=1, sise=1)
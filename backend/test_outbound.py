@@ -0,0 +1,260 @@
+"""Tests for per-client outbound queues."""
+import asyncio
+
+import outbound
+from outbound import ClientConnection, OutboundMessage, RecentMessages
+
+
+def _message(type_, cell_id=None, text=None):
+    text = text or f"{type_}:{cell_id}"
+    return OutboundMessage(type=type_, cell_id=cell_id, text=text, size=len(text))
+
+
+def _sequenced(seq, size=10):
+    return OutboundMessage(type="execution_started", cell_id=str(seq), text="x" * size, size=size, seq=seq)
+
+
+def _types(client):
+    return [(m.type, m.cell_id) for m in client.pending]
+
+
+async def _noop_send(text):
+    pass
+
+
+class TestCoalescing:
+    """Tests for dropping queued messages that a newer one supersedes."""
+
+    def test_result_replaces_progress_for_same_cell(self):
+        client = ClientConnection(_noop_send)
+        client.enqueue(_message("execution_started", "a"))
+        client.enqueue(_message("execution_started", "b"))
+        client.enqueue(_message("execution_result", "a"))
+        client.enqueue(_message("rich_output_ready", "a"))
+
+        client.enqueue(_message("execution_result", "a", text="latest"))
+
+        assert _types(client) == [("execution_started", "b"), ("execution_result", "a")]
+        assert client.pending[-1].text == "latest"
+        assert client.coalesced == 3
+        assert client.pending_bytes == sum(m.size for m in client.pending)
+
+    def test_rich_output_follows_its_result(self):
+        client = ClientConnection(_noop_send)
+        client.enqueue(_message("execution_result", "a"))
+
+        client.enqueue(_message("rich_output_ready", "a"))
+
+        assert _types(client) == [("execution_result", "a"), ("rich_output_ready", "a")]
+
+    def test_deleted_cell_drops_its_updates(self):
+        client = ClientConnection(_noop_send)
+        client.enqueue(_message("cell_added", "a"))
+        client.enqueue(_message("execution_result", "a"))
+        client.enqueue(_message("execution_result", "b"))
+
+        client.enqueue(_message("cell_deleted", "a"))
+
+        assert _types(client) == [
+            ("cell_added", "a"), ("execution_result", "b"), ("cell_deleted", "a")
+        ]
+
+    def test_newer_execution_queue_replaces_older(self):
+        client = ClientConnection(_noop_send)
+        client.enqueue(_message("execution_queue"))
+        client.enqueue(_message("cell_added", "a"))
+
+        client.enqueue(_message("execution_queue", text="new plan"))
+
+        assert _types(client) == [("cell_added", "a"), ("execution_queue", None)]
+
+    def test_other_messages_are_kept(self):
+        client = ClientConnection(_noop_send)
+        for _ in range(3):
+            client.enqueue(_message("variable_summaries"))
+
+        assert len(client.pending) == 3
+        assert client.coalesced == 0
+
+
+class TestLagLimits:
+    """Tests for detecting clients that have fallen too far behind."""
+
+    def test_message_count_limit(self, monkeypatch):
+        monkeypatch.setattr(outbound, "MAX_PENDING_MESSAGES", 2)
+        client = ClientConnection(_noop_send)
+
+        assert client.enqueue(_message("cell_added", "a"))
+        assert client.enqueue(_message("cell_added", "b"))
+        assert not client.enqueue(_message("cell_added", "c"))
+
+    def test_coalesced_messages_do_not_count(self, monkeypatch):
+        monkeypatch.setattr(outbound, "MAX_PENDING_MESSAGES", 2)
+        client = ClientConnection(_noop_send)
+
+        for _ in range(5):
+            assert client.enqueue(_message("execution_result", "a"))
+
+    def test_byte_limit(self, monkeypatch):
+        monkeypatch.setattr(outbound, "MAX_PENDING_BYTES", 10)
+        client = ClientConnection(_noop_send)
+
+        assert not client.enqueue(_message("cell_added", "a", text="x" * 11))
+
+    def test_age_limit(self, monkeypatch):
+        monkeypatch.setattr(outbound, "MAX_LAG_SECONDS", 5.0)
+        client = ClientConnection(_noop_send)
+        stale = _message("cell_added", "a")
+        stale.enqueued_at -= 10
+
+        assert not client.enqueue(stale)
+
+
+class TestWriter:
+    """Tests for the writer task draining the queue."""
+
+    def test_sends_in_order_without_blocking_enqueue(self):
+        async def scenario():
+            sent = []
+            release = asyncio.Event()
+
+            async def send(text):
+                await release.wait()
+                sent.append(text)
+
+            client = ClientConnection(send)
+            writer = asyncio.create_task(client.run_writer())
+            client.enqueue(_message("cell_added", "a", text="first"))
+            client.enqueue(_message("cell_added", "b", text="second"))
+            await asyncio.sleep(0)
+            release.set()
+            while client.pending or len(sent) < 2:
+                await asyncio.sleep(0)
+            writer.cancel()
+            return sent, client.pending_bytes
+
+        sent, pending_bytes = asyncio.run(scenario())
+
+        assert sent == ["first", "second"]
+        assert pending_bytes == 0
+
+    def test_send_errors_stop_the_writer(self):
+        async def scenario():
+            async def send(text):
+                raise ConnectionError("gone")
+
+            client = ClientConnection(send)
+            writer = asyncio.create_task(client.run_writer())
+            client.enqueue(_message("cell_added", "a"))
+            try:
+                await asyncio.wait_for(writer, timeout=5)
+            except ConnectionError as e:
+                return e
+
+        assert isinstance(asyncio.run(scenario()), ConnectionError)
+
+
+    def test_binary_messages_use_send_bytes(self):
+        async def scenario():
+            sent = []
+
+            async def send(text):
+                sent.append(text)
+
+            async def send_bytes(data):
+                sent.append(data)
+
+            client = ClientConnection(send, send_bytes)
+            writer = asyncio.create_task(client.run_writer())
+            client.enqueue(_message("cell_added", "a", text="json"))
+            client.enqueue(OutboundMessage(type="cell_added", cell_id="b", text="", size=3, binary=b"\x81\xa1a"))
+            while client.pending or len(sent) < 2:
+                await asyncio.sleep(0)
+            writer.cancel()
+            return client.binary, sent
+
+        binary, sent = asyncio.run(scenario())
+
+        assert binary and not ClientConnection(_noop_send).binary
+        assert sent == ["json", b"\x81\xa1a"]
+
+
+class TestRecentMessages:
+    """Tests for the ring of broadcasts kept for reconnecting clients."""
+
+    def test_returns_messages_after_seq(self):
+        recent = RecentMessages()
+        for seq in range(1, 6):
+            recent.append(_sequenced(seq))
+
+        assert [m.seq for m in recent.since(2)] == [3, 4, 5]
+        assert recent.since(5) == []
+        assert [m.seq for m in recent.since(0)] == [1, 2, 3, 4, 5]
+
+    def test_gap_too_old_needs_snapshot(self):
+        recent = RecentMessages(max_messages=3)
+        for seq in range(1, 6):
+            recent.append(_sequenced(seq))
+
+        assert [m.seq for m in recent.since(2)] == [3, 4, 5]
+        assert recent.since(1) is None
+        assert recent.since(9) is None
+
+    def test_byte_limit(self):
+        recent = RecentMessages(max_bytes=25)
+        for seq in range(1, 4):
+            recent.append(_sequenced(seq))
+
+        assert [m.seq for m in recent.messages] == [2, 3]
+        assert recent.size == 20
+        assert recent.since(1) is not None
+        assert recent.since(0) is None
+
+    def test_replayed_messages_are_not_counted_as_lagging(self):
+        recent = RecentMessages()
+        old = _sequenced(1)
+        old.enqueued_at -= 3600
+        recent.append(old)
+        client = ClientConnection(_noop_send)
+
+        replayed = recent.since(0)
+
+        assert client.enqueue(replayed[0])
+        assert recent.messages[0].enqueued_at == old.enqueued_at
+
+
+class TestSubscriptions:
+    """Tests for tracking which cells' outputs a client wants."""
+
+    def test_all_cells_until_first_subscribe(self):
+        client = ClientConnection(_noop_send)
+        client.unsubscribe(["a"])
+
+        assert client.wants_output("a")
+        client.subscribe(["b"])
+        assert not client.wants_output("a")
+        assert client.wants_output("b")
+
+    def test_subscribe_reports_omitted_outputs_once(self):
+        client = ClientConnection(_noop_send)
+        client.subscribe([])
+        client.omitted.update({"a", "c"})
+
+        assert client.subscribe(["a", "b"]) == ["a"]
+        assert client.subscribe(["a"]) == []
+        assert client.omitted == {"c"}
+
+    def test_unsubscribe(self):
+        client = ClientConnection(_noop_send)
+        client.subscribe(["a", "b"])
+
+        client.unsubscribe(["a", "x"])
+
+        assert client.subscribed == {"b"}
+
+    def test_result_replaces_queued_cell_output(self):
+        client = ClientConnection(_noop_send)
+        client.enqueue(_message("cell_output", "a"))
+        client.enqueue(_message("execution_result", "a"))
+
+        assert _types(client) == [("execution_result", "a")]
@@ -1,4 +1,5 @@
 """Unit tests for the reactive engine and kernel."""
+import queue
 import pytest
 from reactive import ReactiveEngine, CellData
 from kernel import NotebookKernel
@@ -456,6 +457,326 @@ class TestReactiveExecution:
         assert self.engine.kernel.get_variable("d") == 50  # 20 + 30
 
 
+class TestBulkVariables:
+    """Tests for get_variables/set_variables (one round trip for many names)."""
+    
+    def setup_method(self):
+        self.engine = ReactiveEngine()
+        self.kernel = self.engine.kernel
+    
+    def test_get_variables(self):
+        self.kernel.execute_cell("cell1", "a = 1\nb = 'two'\nc = [3]")
+        
+        result = self.kernel.get_variables(["a", "b", "c"])
+        
+        assert result["values"] == {"a": 1, "b": "two", "c": [3]}
+        assert result["errors"] == {}
+    
+    def test_get_variables_reports_missing_names(self):
+        self.kernel.execute_cell("cell1", "a = 1")
+        
+        result = self.kernel.get_variables(["a", "missing"])
+        
+        assert result["values"] == {"a": 1}
+        assert "NameError" in result["errors"]["missing"]
+    
+    def test_get_variables_reports_unpicklable_values(self):
+        self.kernel.execute_cell("cell1", "a = 1\ngen = (i for i in range(3))")
+        
+        result = self.kernel.get_variables(["a", "gen"])
+        
+        assert result["values"] == {"a": 1}
+        assert "not serializable" in result["errors"]["gen"]
+    
+    def test_set_variables(self):
+        result = self.kernel.set_variables({"x": 10, "y": [1, 2]})
+        
+        assert result == {"status": "ok", "errors": {}}
+        assert self.kernel.get_variables(["x", "y"])["values"] == {"x": 10, "y": [1, 2]}
+    
+    def test_set_variables_reports_unpicklable_values(self):
+        import threading
+        
+        result = self.kernel.set_variables({"x": 10, "lock": threading.Lock()})
+        
+        assert result["status"] == "error"
+        assert "lock" in result["errors"]
+        assert "x" not in result["errors"]
+        assert self.kernel.get_variable("x") == 10
+    
+    def test_timed_out_request_does_not_answer_later_commands(self):
+        self.kernel.execute_cell("cell1", (
+            "import time\n"
+            "class Slow:\n"
+            "    def __reduce__(self):\n"
+            "        time.sleep(0.5)\n"
+            "        return (int, (7,))\n"
+            "slow = Slow()"
+        ))
+        
+        result = self.kernel.get_variables(["slow"], timeout=0.05)
+        
+        assert "Empty" in result["errors"]["slow"]
+        assert self.kernel.execute_cell("cell2", "1 + 1")["output"].strip() == "2"
+        assert self.kernel.execute_cell("cell3", "2 + 2")["output"].strip() == "4"
+        assert self.kernel.get_variables(["slow"])["values"] == {"slow": 7}
+    
+    def test_engine_set_variables_without_rerun(self):
+        self.engine.add_cell(cell_id="cell1", code="total = x + y")
+        
+        result = self.engine.set_variables({"x": 1, "y": 2})
+        
+        assert result["results"] == []
+        assert self.engine.cells["cell1"].status == "idle"
+    
+    def test_engine_set_variables_reruns_dependents(self):
+        self.engine.add_cell(cell_id="cell1", code="total = x + y")
+        self.engine.add_cell(cell_id="cell2", code="doubled = total * 2")
+        self.engine.add_cell(cell_id="cell3", code="unrelated = 1")
+        
+        result = self.engine.set_variables({"x": 1, "y": 2}, rerun_dependents=True)
+        
+        assert [r["cell_id"] for r in result["results"]] == ["cell1", "cell2"]
+        assert self.kernel.get_variable("doubled") == 6
+        assert self.engine.cells["cell3"].status == "idle"
+
+
+class TestVariableInspector:
+    """Tests for in-worker variable summaries (CMD_INSPECT)."""
+    
+    def setup_method(self):
+        self.kernel = NotebookKernel()
+    
+    def test_inspect_all_variables(self):
+        self.kernel.execute_cell("cell1", "x = 10\nname = 'abc'\nitems = list(range(1000))")
+        
+        result = self.kernel.inspect_variables()
+        
+        assert result["status"] == "ok"
+        by_name = {v["name"]: v for v in result["variables"]}
+        assert set(by_name) == {"x", "name", "items"}
+        assert by_name["x"]["type"] == "int"
+        assert by_name["x"]["repr"] == "10"
+        assert by_name["items"]["shape"] == [1000]
+        # Largest first
+        assert result["variables"][0]["name"] == "items"
+    
+    def test_inspect_selected_names(self):
+        self.kernel.execute_cell("cell1", "a = 1\nb = 2")
+        
+        result = self.kernel.inspect_variables(["b", "missing"])
+        
+        assert [v["name"] for v in result["variables"]] == ["b"]
+    
+    def test_repr_is_truncated(self):
+        self.kernel.execute_cell("cell1", "s = 'x' * 10000")
+        
+        summary = self.kernel.inspect_variables(["s"])["variables"][0]
+        
+        assert len(summary["repr"]) < 100
+        assert summary["size"] >= 10000
+    
+    def test_cache_invalidated_by_execution(self):
+        self.kernel.execute_cell("cell1", "x = 1")
+        assert self.kernel.inspect_variables(["x"])["variables"][0]["repr"] == "1"
+        
+        self.kernel.execute_cell("cell1", "x = 2")
+        
+        assert self.kernel.inspect_variables(["x"])["variables"][0]["repr"] == "2"
+    
+    def test_inspect_array(self):
+        np = pytest.importorskip("numpy")
+        self.kernel.execute_cell("cell1", "import numpy as np\narr = np.zeros((100, 10))")
+        
+        summary = self.kernel.inspect_variables(["arr"])["variables"][0]
+        
+        assert summary["type"] == "ndarray"
+        assert summary["shape"] == [100, 10]
+        assert summary["dtype"] == "float64"
+        assert summary["size"] >= 8000
+
+
+class TestKernelMemory:
+    """Tests for memory limits, per-cell accounting and worker death recovery."""
+    
+    def test_peak_memory_delta_recorded(self):
+        import platform
+        if platform.system() != 'Linux':
+            pytest.skip("Peak RSS reset requires Linux")
+        kernel = NotebookKernel()
+        
+        result = kernel.execute_cell("cell1", "buf = bytearray(64 * 1024 * 1024)\ndel buf")
+        
+        assert result["status"] == "success"
+        assert result["peak_memory_delta"] >= 60 * 1024 * 1024
+    
+    def test_peak_memory_delta_for_small_cell(self):
+        kernel = NotebookKernel()
+        
+        result = kernel.execute_cell("cell1", "x = 1")
+        
+        assert "peak_memory_delta" in result
+    
+    def test_memory_limit_raises_memory_error(self):
+        import platform
+        if platform.system() != 'Linux':
+            pytest.skip("Address-space limit test requires Linux")
+        # The forked worker starts with the parent's address space,
+        # so place the limit a little above it.
+        with open("/proc/self/statm") as f:
+            vm_bytes = int(f.read().split()[0]) * 4096
+        limit_mb = vm_bytes // (1024 * 1024) + 256
+        kernel = NotebookKernel(memory_limit_mb=limit_mb)
+        
+        result = kernel.execute_cell("cell1", "buf = bytearray(2 * 1024 * 1024 * 1024)")
+        
+        assert result["status"] == "error"
+        assert "MemoryError" in result["error"]
+        assert f"{limit_mb} MB" in result["error"]
+        
+        # The same worker keeps running
+        kernel.execute_cell("cell2", "x = 1")
+        assert kernel.get_variable("x") == 1
+    
+    def test_killed_worker_reported_as_cell_error(self):
+        import platform
+        if platform.system() == 'Windows':
+            pytest.skip("Signals not supported on Windows")
+        kernel = NotebookKernel(timeout=30)
+        kernel.execute_cell("cell1", "x = 1")
+        
+        result = kernel.execute_cell("cell2", "import os, signal\nos.kill(os.getpid(), signal.SIGKILL)")
+        
+        assert result["status"] == "error"
+        assert "MemoryError" in result["error"]
+        assert "restarted" in result["error"]
+        
+        # A fresh worker is running
+        assert kernel.get_variable("x") is None
+        kernel.execute_cell("cell3", "y = 2")
+        assert kernel.get_variable("y") == 2
+
+
+class TestNamespaceReclamation:
+    """Tests for freeing variables of deleted or edited cells."""
+    
+    def setup_method(self):
+        self.engine = ReactiveEngine()
+        self.kernel = self.engine.kernel
+    
+    def test_delete_cell_frees_its_variables(self):
+        self.engine.add_cell(cell_id="cell1", code="data = list(range(100000))\nkeep = 1")
+        self.engine.add_cell(cell_id="cell2", code="other = 2")
+        self.engine.execute_all()
+        
+        self.engine.delete_cell("cell1")
+        result = self.engine.reclaim_namespace()
+        
+        assert sorted(result["deleted"]) == ["data", "keep"]
+        assert result["approx_bytes"] > 0
+        assert self.kernel.get_variable("data") is None
+        assert self.kernel.get_variable("other") == 2
+    
+    def test_edit_frees_dropped_names(self):
+        self.engine.add_cell(cell_id="cell1", code="a = 1\nb = 2")
+        self.engine.execute_all()
+        
+        self.engine.on_cell_changed("cell1", "a = 1")
+        result = self.engine.reclaim_namespace()
+        
+        assert result["deleted"] == ["b"]
+        assert self.kernel.get_variable("a") == 1
+    
+    def test_names_redefined_elsewhere_are_kept(self):
+        self.engine.add_cell(cell_id="cell1", code="x = 1")
+        self.engine.execute_all()
+        
+        self.engine.delete_cell("cell1")
+        self.engine.on_cell_changed("cell2", "x = 5")
+        result = self.engine.reclaim_namespace()
+        
+        assert result["deleted"] == []
+        assert self.kernel.get_variable("x") == 1
+    
+    def test_delete_cell_releases_retained_result(self):
+        self.engine.add_cell(cell_id="cell1", code="import pandas as pd\npd.DataFrame({'a': range(500)})")
+        self.engine.execute_all()
+        assert self.kernel.fetch_rows("cell1", 400, 10)["status"] == "ok"
+        
+        self.engine.delete_cell("cell1")
+        self.engine.reclaim_namespace()
+        
+        assert self.kernel.fetch_rows("cell1", 400, 10)["status"] == "error"
+    
+    def test_orphans_reclaimed_before_next_execution(self):
+        self.engine.add_cell(cell_id="cell1", code="old = 1")
+        self.engine.add_cell(cell_id="cell2", code="y = old")
+        self.engine.execute_all()
+        
+        # cell1 no longer defines 'old', so cell2 must not see the stale value
+        order = self.engine.on_cell_changed("cell1", "new = 1")
+        for cell_id in order["execution_order"]:
+            self.engine.execute_cell(cell_id)
+        result = self.engine.execute_cell("cell2")
+        
+        assert result["status"] == "error"
+        assert "NameError" in result["error"]
+    
+    def test_execution_reports_what_it_reclaimed(self):
+        self.engine.add_cell(cell_id="cell1", code="a = 1\nb = [0] * 1000")
+        self.engine.execute_all()
+        
+        order = self.engine.on_cell_changed("cell1", "a = 2")
+        first = self.engine.execute_cell(order["execution_order"][0])
+        second = self.engine.execute_cell("cell1")
+        
+        assert first["reclaimed"]["deleted"] == ["b"]
+        assert first["reclaimed"]["approx_bytes"] > 0
+        assert second["reclaimed"] is None
+        assert "reclaimed" not in self.kernel.cell_outputs["cell1"]
+    
+    def test_nothing_pending(self):
+        result = self.engine.reclaim_namespace()
+        
+        assert result["deleted"] == []
+
+
+class TestDeferredRichOutput:
+    """Tests for attaching rich output that is rendered after the result."""
+    
+    def setup_method(self):
+        pytest.importorskip("pandas")
+        self.engine = ReactiveEngine(defer_rich_output=True)
+        self.delivered = queue.Queue()
+        self.engine.kernel.on_rich_output = self.delivered.put
+        self.engine.add_cell("cell1", "import pandas as pd\npd.DataFrame({'a': [1]})")
+    
+    def test_apply_rich_output(self):
+        result = self.engine.execute_cell("cell1")
+        cell = self.engine.cells["cell1"]
+        assert cell.rich_pending and cell.rich_output is None
+        
+        updated = self.engine.apply_rich_output(self.delivered.get(timeout=10))
+        
+        assert updated is cell
+        assert not cell.rich_pending
+        assert cell.rich_output["type"] == "dataframe"
+        assert result["run_id"] is not None
+    
+    def test_stale_rich_output_is_ignored(self):
+        self.engine.execute_cell("cell1")
+        stale = self.delivered.get(timeout=10)
+        self.engine.execute_cell("cell1")
+        
+        assert self.engine.apply_rich_output(stale) is None
+        assert self.engine.apply_rich_output(self.delivered.get(timeout=10)) is not None
+    
+    def test_deleted_cell_ignores_rich_output(self):
+        self.engine.execute_cell("cell1")
+        self.engine.delete_cell("cell1")
+        
+        assert self.engine.apply_rich_output(self.delivered.get(timeout=10)) is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
-
@@ -1,6 +1,12 @@
 """Tests for rich output serialization (DataFrames, arrays, etc.)."""
+import base64
+import json
 import pytest
 import math
+import queue
+import weakref
+import multiprocessing
+import time
 
 from kernel import (
     serialize_rich_output, 
@@ -11,7 +17,16 @@ from kernel import (
     HAS_PANDAS,
     MAX_ROWS,
     MAX_ARRAY_ELEMENTS,
+    FRAME_FORMAT_COLUMNAR,
+    FRAME_FORMAT_ARROW,
+    HAS_PYARROW,
+    MAX_FETCH_ROWS,
+    QueryError,
+    _query_positions,
+    _ResultStore,
+    _pump_rich_outputs,
 )
+from wire import Attachment, RawJSON, encode_json
 
 # Skip tests if libraries not available
 pytestmark_numpy = pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
@@ -21,6 +36,8 @@ if HAS_NUMPY:
     import numpy as np
 if HAS_PANDAS:
     import pandas as pd
+if HAS_PYARROW:
+    import pyarrow as pa
 
 
 class TestSafeValue:
@@ -144,6 +161,63 @@ class TestSerializeDataFrame:
         assert result is not None
         assert result['index'] == ['a', 'b', 'c']
     
+    def test_dataframe_with_infinity(self):
+        df = pd.DataFrame({'a': [float('inf'), float('-inf'), 1.5]})
+        
+        result = serialize_rich_output(df)
+        
+        assert [row['a'] for row in result['data']] == ["Infinity", "-Infinity", 1.5]
+    
+    def test_dataframe_mixed_dtypes(self):
+        df = pd.DataFrame({
+            'i': [1, 2],
+            'b': [True, False],
+            'f': [0.5, float('nan')],
+            's': ['x', None],
+            'n': pd.array([1, None], dtype='Int64'),
+            't': pd.to_datetime(['2024-01-01', None]),
+        })
+        
+        result = serialize_rich_output(df)
+        
+        first, second = result['data']
+        assert first['i'] == 1 and type(first['i']) is int
+        assert first['b'] is True and type(first['b']) is bool
+        assert second['f'] == "NaN"
+        assert first['s'] == 'x'
+        assert second['n'] is None
+        assert second['t'] is None
+    
+    def test_dataframe_datetimes_are_iso_strings(self):
+        df = pd.DataFrame({
+            't': pd.to_datetime(['2024-01-01 12:30', None]),
+            'tz': pd.to_datetime(['2024-01-01', '2024-01-02']).tz_localize('UTC'),
+            'd': pd.to_timedelta(['90s', None]),
+        }, index=pd.to_datetime(['2023-05-01', '2023-05-02']))
+        
+        result = serialize_rich_output(df)
+        
+        assert result['index'] == ['2023-05-01T00:00:00', '2023-05-02T00:00:00']
+        assert result['data'][0] == {'t': '2024-01-01T12:30:00', 'tz': '2024-01-01T00:00:00+00:00', 'd': 'P0DT0H1M30S'}
+        assert result['data'][1]['t'] is None and result['data'][1]['d'] is None
+    
+    def test_duplicate_column_names_keep_every_column(self):
+        df = pd.DataFrame([[1, 2, 3]], columns=['a', 'a', 'b'])
+        
+        result = serialize_rich_output(df)
+        
+        assert result['columns'] == ['a', 'a', 'b']
+        assert result['format'] == FRAME_FORMAT_COLUMNAR
+        assert result['data'] == [[1], [2], [3]]
+    
+    def test_dataframe_column_order_preserved(self):
+        df = pd.DataFrame({'z': [1.0], 'a': ['x'], 'm': [2], 'b': [3.0]})
+        
+        result = serialize_rich_output(df)
+        
+        assert list(result['data'][0].keys()) == ['z', 'a', 'm', 'b']
+        assert result['data'][0] == {'z': 1.0, 'a': 'x', 'm': 2, 'b': 3.0}
+    
     def test_empty_dataframe(self):
         df = pd.DataFrame()
         
@@ -155,6 +229,179 @@ class TestSerializeDataFrame:
         assert result['data'] == []
 
 
+def _decode_nulls(bitmap, length):
+    """Unpack a base64 null bitmap into a list of booleans."""
+    packed = np.frombuffer(base64.b64decode(bitmap), dtype=np.uint8)
+    return np.unpackbits(packed, bitorder="little")[:length].astype(bool).tolist()
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestSerializeDataFrameColumnar:
+    """Tests for the columnar DataFrame encoding."""
+    
+    def test_columnar_layout(self):
+        df = pd.DataFrame({'z': [1, 2, 3], 'a': ['x', 'y', 'z'], 'b': [0.5, 1.5, 2.5]})
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_COLUMNAR)
+        
+        assert result['format'] == 'columnar'
+        assert result['columns'] == ['z', 'a', 'b']
+        assert result['data'] == [[1, 2, 3], ['x', 'y', 'z'], [0.5, 1.5, 2.5]]
+        assert result['nulls'] == [None, None, None]
+        assert result['index'] == [0, 1, 2]
+    
+    def test_null_bitmap(self):
+        values = [1.0, None, 3.0] * 5
+        df = pd.DataFrame({'f': values, 's': ['a', None, 'c'] * 5, 'i': range(15)})
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_COLUMNAR)
+        
+        expected = [v is None for v in values]
+        assert _decode_nulls(result['nulls'][0], 15) == expected
+        assert _decode_nulls(result['nulls'][1], 15) == expected
+        assert result['nulls'][2] is None
+        assert result['data'][0][:3] == [1.0, None, 3.0]
+        assert result['data'][1][:3] == ['a', None, 'c']
+    
+    def test_infinity_is_not_null(self):
+        df = pd.DataFrame({'f': [float('inf'), float('-inf'), float('nan')]})
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_COLUMNAR)
+        
+        assert result['data'] == [['Infinity', '-Infinity', None]]
+        assert _decode_nulls(result['nulls'][0], 3) == [False, False, True]
+    
+    def test_matches_records(self):
+        df = pd.DataFrame({
+            'a': [1, 2, 3, 4],
+            'b': [0.1, np.nan, 0.3, 0.4],
+            'c': pd.Series(['p', 'q', None, 's'], dtype=object),
+        })
+        
+        records = serialize_rich_output(df)
+        columnar = serialize_rich_output(df, FRAME_FORMAT_COLUMNAR)
+        
+        assert 'format' not in records
+        rebuilt = [
+            {
+                col: ('NaN' if values[i] is None and col == 'b' else values[i])
+                for col, values in zip(columnar['columns'], columnar['data'])
+            }
+            for i in range(len(columnar['index']))
+        ]
+        assert rebuilt == records['data']
+    
+    def test_truncation(self):
+        df = pd.DataFrame({'a': range(MAX_ROWS + 50)})
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_COLUMNAR)
+        
+        assert result['truncated'] is True
+        assert len(result['data'][0]) == MAX_ROWS
+    
+    def test_empty_dataframe(self):
+        result = serialize_rich_output(pd.DataFrame(), FRAME_FORMAT_COLUMNAR)
+        
+        assert result['data'] == []
+        assert result['nulls'] == []
+    
+    def test_wide_frame_payload_is_smaller(self):
+        df = pd.DataFrame(
+            np.arange(MAX_ROWS * 50).reshape(MAX_ROWS, 50),
+            columns=[f"measurement_{i}" for i in range(50)]
+        )
+        
+        records = json.dumps(serialize_rich_output(df))
+        columnar = json.dumps(serialize_rich_output(df, FRAME_FORMAT_COLUMNAR))
+        
+        assert len(columnar) * 3 < len(records)
+
+
+def _read_arrow(result):
+    return pa.ipc.open_stream(result['data'].data).read_all()
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="pyarrow not installed")
+class TestSerializeDataFrameArrow:
+    """Tests for the Arrow IPC DataFrame encoding."""
+    
+    def test_arrow_layout(self):
+        df = pd.DataFrame({'z': [1, 2, 3], 'a': ['x', 'y', 'z']}, index=[10, 20, 30])
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_ARROW)
+        table = _read_arrow(result)
+        
+        assert result['format'] == 'arrow'
+        assert isinstance(result['data'], Attachment)
+        assert 'index' not in result
+        assert result['columns'] == ['z', 'a']
+        assert table.column_names == ['index', '0', '1']
+        assert table.to_pydict() == {'index': [10, 20, 30], '0': [1, 2, 3], '1': ['x', 'y', 'z']}
+    
+    def test_types_are_preserved(self):
+        df = pd.DataFrame({
+            'f': [1.5, None, 3.0],
+            'i': pd.array([1, None, 3], dtype='Int64'),
+            't': pd.to_datetime(['2024-01-01', None, '2024-03-01']),
+            'c': pd.Categorical(['a', 'b', 'a']),
+            'b': [True, False, True],
+        })
+        
+        table = _read_arrow(serialize_rich_output(df, FRAME_FORMAT_ARROW))
+        schema = table.schema
+        
+        assert pa.types.is_float64(schema.field('0').type)
+        assert pa.types.is_int64(schema.field('1').type)
+        assert pa.types.is_timestamp(schema.field('2').type)
+        assert schema.field('3').type == pa.dictionary(pa.int8(), pa.string())
+        assert pa.types.is_boolean(schema.field('4').type)
+        assert table.column('0').to_pylist() == [1.5, None, 3.0]
+        assert table.column('1').to_pylist() == [1, None, 3]
+    
+    def test_unsupported_columns_become_strings(self):
+        df = pd.DataFrame({'o': [{'a': 1}, [1, 2], None], 'd': pd.to_timedelta([1, 2, None], unit='s')})
+        
+        table = _read_arrow(serialize_rich_output(df, FRAME_FORMAT_ARROW))
+        
+        assert table.column('0').to_pylist() == ["{'a': 1}", '[1, 2]', None]
+        assert table.column('1').to_pylist() == ['0 days 00:00:01', '0 days 00:00:02', None]
+    
+    def test_duplicate_column_names(self):
+        df = pd.DataFrame([[1, 2]], columns=['a', 'a'])
+        
+        table = _read_arrow(serialize_rich_output(df, FRAME_FORMAT_ARROW))
+        
+        assert table.to_pydict() == {'index': [0], '0': [1], '1': [2]}
+    
+    def test_falls_back_to_columnar_without_pyarrow(self, monkeypatch):
+        monkeypatch.setattr('kernel.HAS_PYARROW', False)
+        df = pd.DataFrame({'a': [1, 2]})
+        
+        result = serialize_rich_output(df, FRAME_FORMAT_ARROW)
+        
+        assert result['format'] == 'columnar'
+        assert result['data'] == [[1, 2]]
+    
+    def test_encoded_output_carries_the_stream(self):
+        kernel = NotebookKernel(encode_rich_output=True, frame_format=FRAME_FORMAT_ARROW)
+        
+        encoded = kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': [1.5, 2.5]})")['rich_output']
+        ref = encoded.decode()['data']
+        
+        assert encoded.decode()['format'] == 'arrow'
+        assert pa.ipc.open_stream(encoded.attachments[ref['digest']]).read_all().column('0').to_pylist() == [1.5, 2.5]
+        assert ref['size'] == len(encoded.attachments[ref['digest']])
+    
+    def test_row_windows_are_columnar(self):
+        kernel = NotebookKernel(frame_format=FRAME_FORMAT_ARROW)
+        kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': range(500)})")
+        
+        result = kernel.fetch_rows("c1", 200, 2)
+        
+        assert result['format'] == 'columnar'
+        assert result['data'] == [[200, 201]]
+
+
 @pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
 class TestSerializeSeries:
     """Tests for Series serialization."""
@@ -179,6 +426,14 @@ class TestSerializeSeries:
         assert result['data'] == {'a': 10, 'b': 20, 'c': 30}
         assert result['index'] == ['a', 'b', 'c']
     
+    def test_series_with_datetime_index(self):
+        s = pd.Series([1.5, 2.5], index=pd.date_range('2024-01-01', periods=2, freq='h'))
+        
+        result = serialize_rich_output(s)
+        
+        assert result['data'] == {'2024-01-01T00:00:00': 1.5, '2024-01-01T01:00:00': 2.5}
+        assert json.loads(json.dumps(result)) == result
+    
     def test_series_truncation(self):
         s = pd.Series(range(MAX_ROWS + 50))
         
@@ -223,6 +478,26 @@ class TestSerializeNdarray:
         assert result is not None
         assert result['data'] == [1.0, "NaN", 3.0]
     
+    def test_2d_array_with_special_values(self):
+        arr = np.array([[1.0, np.nan], [np.inf, -np.inf]])
+        
+        result = serialize_rich_output(arr)
+        
+        assert result['data'] == [[1.0, "NaN"], ["Infinity", "-Infinity"]]
+    
+    def test_int_array_values_are_python_ints(self):
+        result = serialize_rich_output(np.array([1, 2], dtype=np.int32))
+        
+        assert all(type(v) is int for v in result['data'])
+    
+    def test_3d_array_preview(self):
+        arr = np.arange(24.0).reshape(2, 3, 4)
+        
+        result = serialize_rich_output(arr)
+        
+        assert result['data'] == list(np.arange(24.0))
+        assert result['shape'] == [2, 3, 4]
+    
     def test_array_truncation(self):
         arr = np.arange(MAX_ARRAY_ELEMENTS + 500)
         
@@ -278,6 +553,18 @@ class TestKernelDataFrameExecution:
         assert result['rich_output'] is not None
         assert result['rich_output']['type'] == 'dataframe'
         assert result['rich_output']['shape'] == [2, 2]
+        assert result['rich_output']['format'] == 'columnar'
+        assert result['rich_output']['data'] == [[1, 2], [3, 4]]
+    
+    def test_execute_dataframe_records_format(self):
+        kernel = NotebookKernel(frame_format="records")
+        
+        result = kernel.execute_cell(
+            "test-1",
+            "import pandas as pd\npd.DataFrame({'a': [1, 2]})"
+        )
+        
+        assert result['rich_output']['data'] == [{'a': 1}, {'a': 2}]
     
     def test_execute_series_creation(self):
         kernel = NotebookKernel()
@@ -305,6 +592,238 @@ class TestKernelDataFrameExecution:
         assert 'hello' in result['output']
 
 
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestKernelRowPaging:
+    """Integration tests for fetching row windows of retained DataFrame results."""
+    
+    def setup_method(self):
+        self.kernel = NotebookKernel()
+        self.kernel.execute_cell(
+            "c1",
+            "import pandas as pd\n"
+            "df = pd.DataFrame({'a': range(50_000), 'b': [0.5, None] * 25_000})\n"
+            "df"
+        )
+    
+    def test_fetch_window(self):
+        result = self.kernel.fetch_rows("c1", 40_000, 3)
+        
+        assert result['status'] == 'ok'
+        assert result['offset'] == 40_000
+        assert result['total_rows'] == 50_000
+        assert result['format'] == 'columnar'
+        assert result['index'] == [40_000, 40_001, 40_002]
+        assert result['data'] == [[40_000, 40_001, 40_002], [0.5, None, 0.5]]
+        assert result['nulls'][0] is None
+    
+    def test_window_past_end(self):
+        result = self.kernel.fetch_rows("c1", 49_998, 10)
+        
+        assert result['index'] == [49_998, 49_999]
+    
+    def test_limit_is_capped(self):
+        result = self.kernel.fetch_rows("c1", 0, MAX_FETCH_ROWS * 10)
+        
+        assert len(result['index']) == MAX_FETCH_ROWS
+    
+    def test_records_format(self):
+        kernel = NotebookKernel(frame_format="records")
+        kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': range(200)})")
+        
+        result = kernel.fetch_rows("c1", 150, 2)
+        
+        assert result['format'] == 'records'
+        assert result['data'] == [{'a': 150}, {'a': 151}]
+    
+    def test_unknown_cell(self):
+        result = self.kernel.fetch_rows("missing", 0, 10)
+        
+        assert result['status'] == 'error'
+        assert result['data'] == []
+    
+    def test_result_replaced_by_non_frame(self):
+        self.kernel.execute_cell("c1", "1 + 1")
+        
+        assert self.kernel.fetch_rows("c1", 0, 10)['status'] == 'error'
+    
+    def test_reset_releases_results(self):
+        self.kernel.reset()
+        
+        assert self.kernel.fetch_rows("c1", 0, 10)['status'] == 'error'
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestQueryPositions:
+    """Tests for sorting and filtering retained results."""
+    
+    def setup_method(self):
+        self.df = pd.DataFrame({
+            'n': [3, 1, 2, None, 5],
+            's': ['b', 'A', 'c', 'a', None],
+            2024: [10, 20, 30, 40, 50],
+        })
+    
+    def test_sort_descending_nulls_last(self):
+        positions = _query_positions(self.df, {"sort": [{"column": "n", "ascending": False}]})
+        
+        assert positions.tolist() == [4, 0, 2, 1, 3]
+    
+    def test_multi_key_sort_is_stable(self):
+        df = pd.DataFrame({'g': [1, 0, 1, 0], 'v': [4, 3, 2, 1]})
+        
+        positions = _query_positions(df, {"sort": [{"column": "g"}, {"column": "v"}]})
+        
+        assert positions.tolist() == [3, 1, 2, 0]
+    
+    def test_filters_are_combined(self):
+        query = {"filters": [
+            {"column": "n", "op": ">=", "value": 2},
+            {"column": "s", "op": "notnull"},
+        ]}
+        
+        assert _query_positions(self.df, query).tolist() == [0, 2]
+    
+    def test_contains_is_case_insensitive(self):
+        query = {"filters": [{"column": "s", "op": "contains", "value": "a"}]}
+        
+        assert _query_positions(self.df, query).tolist() == [1, 3]
+    
+    def test_numeric_value_sent_as_string(self):
+        query = {"filters": [{"column": "n", "op": "<", "value": "3"}]}
+        
+        assert _query_positions(self.df, query).tolist() == [1, 2]
+    
+    def test_non_string_column_label(self):
+        query = {"filters": [{"column": "2024", "op": ">", "value": 30}]}
+        
+        assert _query_positions(self.df, query).tolist() == [3, 4]
+    
+    def test_filter_then_sort(self):
+        query = {
+            "filters": [{"column": "n", "op": "notnull"}],
+            "sort": [{"column": "n"}],
+        }
+        
+        assert _query_positions(self.df, query).tolist() == [1, 2, 0, 4]
+    
+    def test_unknown_column(self):
+        with pytest.raises(QueryError):
+            _query_positions(self.df, {"sort": [{"column": "missing"}]})
+    
+    def test_unknown_operator(self):
+        with pytest.raises(QueryError):
+            _query_positions(self.df, {"filters": [{"column": "n", "op": "~"}]})
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestKernelRowQuery:
+    """Integration tests for fetching windows of sorted/filtered results."""
+    
+    def setup_method(self):
+        self.kernel = NotebookKernel()
+        self.kernel.execute_cell(
+            "c1",
+            "import pandas as pd\n"
+            "pd.DataFrame({'a': range(10_000), 'b': [i % 7 for i in range(10_000)]})"
+        )
+    
+    def test_sorted_window(self):
+        result = self.kernel.fetch_rows("c1", 0, 3, query={"sort": [{"column": "a", "ascending": False}]})
+        
+        assert result['status'] == 'ok'
+        assert result['total_rows'] == 10_000
+        assert result['index'] == [9_999, 9_998, 9_997]
+        assert result['data'][0] == [9_999, 9_998, 9_997]
+    
+    def test_filtered_window(self):
+        query = {"filters": [{"column": "b", "op": "==", "value": 0}]}
+        
+        result = self.kernel.fetch_rows("c1", 1, 2, query=query)
+        
+        assert result['total_rows'] == len(range(0, 10_000, 7))
+        assert result['data'][0] == [7, 14]
+    
+    def test_invalid_query(self):
+        result = self.kernel.fetch_rows("c1", 0, 10, query={"sort": [{"column": "zzz"}]})
+        
+        assert result['status'] == 'error'
+        assert result['error'].startswith('QueryError')
+    
+    def test_timed_out_query_does_not_answer_later_commands(self):
+        query = {"sort": [{"column": "b"}, {"column": "a", "ascending": False}]}
+        self.kernel.fetch_rows("c1", 0, 1000, query=query, timeout=0.001)
+        
+        assert self.kernel.execute_cell("c2", "1 + 1")['output'].strip() == "2"
+        assert self.kernel.fetch_rows("c1", 0, 2, query=query)['index'] == [9_996, 9_989]
+    
+    def test_rerun_invalidates_views(self):
+        query = {"sort": [{"column": "a", "ascending": False}]}
+        self.kernel.fetch_rows("c1", 0, 1, query=query)
+        
+        self.kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': [1, 2]})")
+        result = self.kernel.fetch_rows("c1", 0, 5, query=query)
+        
+        assert result['total_rows'] == 2
+        assert result['data'] == [[2, 1]]
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestResultStore:
+    """Tests for the worker-side result store and its view cache."""
+    
+    def test_views_are_evicted_lru(self):
+        store = _ResultStore(max_views=2)
+        store.retain("c1", pd.DataFrame({'a': [3, 1, 2]}))
+        asc = {"sort": [{"column": "a"}]}
+        desc = {"sort": [{"column": "a", "ascending": False}]}
+        flt = {"filters": [{"column": "a", "op": ">", "value": 1}]}
+        
+        store.fetch("c1", 0, 10, "records", asc)
+        store.fetch("c1", 0, 10, "records", desc)
+        store.fetch("c1", 0, 10, "records", asc)
+        store.fetch("c1", 0, 10, "records", flt)
+        
+        cached = [json.loads(key[1]) for key in store.views]
+        assert cached == [asc, flt]
+    
+    def test_views_are_bounded_by_size(self):
+        store = _ResultStore(max_view_bytes=1000)
+        store.retain("c1", pd.DataFrame({'a': range(200)}))
+        asc = {"sort": [{"column": "a"}]}
+        desc = {"sort": [{"column": "a", "ascending": False}]}
+        
+        store.fetch("c1", 0, 10, "records", asc)
+        store.fetch("c1", 0, 10, "records", desc)
+        
+        assert [json.loads(key[1]) for key in store.views] == [desc]
+        assert store.view_bytes == 800
+    
+    def test_view_larger_than_budget_is_not_cached(self):
+        store = _ResultStore(max_view_bytes=100)
+        store.retain("c1", pd.DataFrame({'a': [3, 1, 2] * 100}))
+        
+        result = store.fetch("c1", 0, 3, "records", {"sort": [{"column": "a"}]})
+        
+        assert result['data'] == [{'a': 1}] * 3
+        assert not store.views and store.view_bytes == 0
+    
+    def test_release_drops_views(self):
+        store = _ResultStore()
+        store.retain("c1", pd.DataFrame({'a': [1]}))
+        store.fetch("c1", 0, 10, "records", {"sort": [{"column": "a"}]})
+        
+        store.release(["c1"])
+        
+        assert not store.frames and not store.views
+        assert store.view_bytes == 0
+    
+    def test_non_frames_are_not_retained(self):
+        store = _ResultStore()
+        store.retain("c1", [1, 2, 3])
+        
+        assert store.fetch("c1", 0, 10, "records")['status'] == 'error'
+
+
 @pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
 class TestKernelNumpyExecution:
     """Integration tests for kernel execution with numpy arrays."""
@@ -333,3 +852,161 @@ class TestKernelNumpyExecution:
         assert result['status'] == 'success'
         assert result['rich_output'] is not None
         assert result['rich_output']['shape'] == [2, 2]
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestDeferredRichOutput:
+    """Tests for results returned before their rich output is rendered."""
+    
+    def setup_method(self):
+        self.kernel = NotebookKernel()
+        self.delivered = queue.Queue()
+        self.kernel.on_rich_output = self.delivered.put
+    
+    def test_rich_output_follows_result(self):
+        result = self.kernel.execute_cell(
+            "c1", "import pandas as pd\npd.DataFrame({'a': [1, 2, 3]})", defer_rich_output=True
+        )
+        
+        assert result['status'] == 'success'
+        assert result['rich_pending'] is True
+        assert result['rich_output'] is None
+        
+        message = self.delivered.get(timeout=10)
+        assert message['cell_id'] == 'c1'
+        assert message['run_id'] == result['run_id']
+        assert message['error'] == ''
+        assert message['rich_output']['shape'] == [3, 1]
+        assert self.kernel.cell_outputs['c1']['rich_output'] == message['rich_output']
+    
+    def test_plain_values_are_not_deferred(self):
+        result = self.kernel.execute_cell("c1", "1 + 1", defer_rich_output=True)
+        
+        assert result['rich_pending'] is False
+        assert self.delivered.empty()
+    
+    def test_next_cell_does_not_wait_for_render(self):
+        self.kernel.execute_cell("c1", "import pandas as pd\ndf = pd.DataFrame({'a': range(10)})")
+        
+        first = self.kernel.execute_cell("c2", "df", defer_rich_output=True)
+        second = self.kernel.execute_cell("c3", "len(df)")
+        
+        assert first['rich_pending'] is True
+        assert second['output'].strip() == '10'
+        assert self.delivered.get(timeout=10)['run_id'] == first['run_id']
+    
+    def test_next_cell_runs_while_render_is_slow(self):
+        code = (
+            "import time, pandas as pd\n"
+            "class Slow:\n"
+            "    def __reduce__(self):\n"
+            "        time.sleep(1)\n"
+            "        return (str, ('slow',))\n"
+            "pd.DataFrame({'a': [Slow()]})"
+        )
+        first = self.kernel.execute_cell("c1", code, defer_rich_output=True)
+        
+        start = time.monotonic()
+        second = self.kernel.execute_cell("c2", "1 + 1")
+        elapsed = time.monotonic() - start
+        
+        assert first['rich_pending'] is True
+        assert second['output'].strip() == '2'
+        assert elapsed < 0.5
+        assert self.delivered.get(timeout=10)['rich_output']['data'] == [['slow']]
+    
+    def test_mutation_after_result_does_not_tear_preview(self):
+        self.kernel.execute_cell("c1", "import numpy as np, pandas as pd\ndf = pd.DataFrame(np.zeros((100, 200)))")
+        
+        first = self.kernel.execute_cell("c2", "df", defer_rich_output=True)
+        self.kernel.execute_cell("c3", "df.iloc[:, :] = 1.0")
+        
+        message = self.delivered.get(timeout=10)
+        assert message['run_id'] == first['run_id']
+        assert {value for column in message['rich_output']['data'] for value in column} == {0.0}
+    
+    def test_array_preview_is_a_copy(self):
+        self.kernel.execute_cell("c1", "import numpy as np\narr = np.zeros(5000)")
+        
+        self.kernel.execute_cell("c2", "arr", defer_rich_output=True)
+        self.kernel.execute_cell("c3", "arr[:] = 1.0")
+        
+        assert set(self.delivered.get(timeout=10)['rich_output']['data']) == {0.0}
+    
+    def test_pending_render_reported_lost_on_restart(self):
+        pending = {7: "c1"}
+        rich_reader, rich_writer = multiprocessing.Pipe(duplex=False)
+        rich_writer.send({"cell_id": "c0", "run_id": 6, "rich_output": None, "error": ""})
+        rich_writer.close()
+        
+        _pump_rich_outputs(rich_reader, pending, weakref.ref(self.kernel))
+        
+        assert self.delivered.get_nowait()['run_id'] == 6
+        lost = self.delivered.get_nowait()
+        assert lost['run_id'] == 7
+        assert lost['error'].startswith('Interrupted')
+        assert not pending
+
+
+class TestEncodedRichOutput:
+    """Tests for rich output encoded to JSON in the worker."""
+    
+    @pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+    def test_encoded_matches_serialized(self):
+        kernel = NotebookKernel(encode_rich_output=True)
+        code = "import pandas as pd\npd.Series([1.5, None], index=[10, 20])"
+        
+        encoded = kernel.execute_cell("c1", code)['rich_output']
+        plain = NotebookKernel().execute_cell("c1", code)['rich_output']
+        
+        assert isinstance(encoded, RawJSON)
+        assert encoded.decode() == json.loads(json.dumps(plain))
+    
+    @pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+    @pytest.mark.parametrize("frame_format", ["records", FRAME_FORMAT_COLUMNAR, FRAME_FORMAT_ARROW])
+    def test_datetimes_and_complex_numbers_encode(self, frame_format):
+        if frame_format == FRAME_FORMAT_ARROW and not HAS_PYARROW:
+            pytest.skip("pyarrow not installed")
+        frame = pd.DataFrame({
+            't': pd.to_datetime(['2020-01-01 12:00', None]),
+            'tz': pd.to_datetime(['2020-01-01', '2020-01-02']).tz_localize('UTC'),
+            'd': pd.to_timedelta(['1s', None]),
+            'c': [1 + 2j, 3j],
+        })
+        
+        decoded = encode_json(serialize_rich_output(frame, frame_format)).decode()
+        
+        if frame_format == "records":
+            assert decoded['data'][0] == {
+                't': '2020-01-01T12:00:00', 'tz': '2020-01-01T00:00:00+00:00', 'd': 'P0DT0H0M1S', 'c': '(1+2j)'
+            }
+            assert decoded['data'][1]['t'] is None
+        elif frame_format == FRAME_FORMAT_COLUMNAR:
+            assert decoded['data'][0] == ['2020-01-01T12:00:00', None]
+            assert decoded['data'][3] == ['(1+2j)', '3j']
+        else:
+            assert decoded['shape'] == [2, 4]
+    
+    @pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+    def test_datetime_series_and_complex_arrays_encode(self):
+        series = pd.Series(pd.to_datetime(['2020-01-01', None]))
+        
+        assert encode_json(serialize_rich_output(series)).decode()['data'] == {
+            '0': '2020-01-01T00:00:00', '1': None
+        }
+        assert encode_json(serialize_rich_output(np.array([1 + 2j, 3]))).decode()['data'] == ['(1+2j)', '(3+0j)']
+    
+    def test_plain_values_stay_unencoded(self):
+        kernel = NotebookKernel(encode_rich_output=True)
+        
+        assert kernel.execute_cell("c1", "42")['rich_output'] is None
+    
+    @pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+    def test_deferred_output_is_encoded(self):
+        kernel = NotebookKernel(encode_rich_output=True)
+        delivered = queue.Queue()
+        kernel.on_rich_output = delivered.put
+        
+        kernel.execute_cell("c1", "import pandas as pd\npd.DataFrame({'a': [1]})", defer_rich_output=True)
+        
+        assert delivered.get(timeout=10)['rich_output'].decode()['shape'] == [1, 1]
@@ -0,0 +1,158 @@
+"""Tests for shared-memory variable transfer between the kernel and its worker."""
+import gc
+import pytest
+
+from sharedmem import export_value, import_value, discard, is_descriptor, HAS_NUMPY, HAS_PANDAS
+from kernel import NotebookKernel
+
+if HAS_NUMPY:
+    import numpy as np
+if HAS_PANDAS:
+    import pandas as pd
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestExportImport:
+    """Tests for the descriptor round trip within one process."""
+
+    def test_small_array_uses_pickle(self):
+        assert export_value(np.arange(10)) is None
+
+    def test_object_array_uses_pickle(self):
+        arr = np.array(["a", None] * 10, dtype=object)
+        assert export_value(arr, min_bytes=0) is None
+
+    def test_non_array_uses_pickle(self):
+        assert export_value([1, 2, 3], min_bytes=0) is None
+        assert export_value("hello", min_bytes=0) is None
+
+    def test_array_round_trip(self):
+        arr = np.random.rand(50, 40)
+
+        descriptor = export_value(arr, min_bytes=0)
+        assert is_descriptor(descriptor)
+
+        result = import_value(descriptor)
+        assert result.shape == (50, 40)
+        assert result.dtype == arr.dtype
+        assert np.array_equal(result, arr)
+        assert not result.flags.owndata
+
+    def test_non_contiguous_array(self):
+        arr = np.arange(200, dtype=np.int32).reshape(10, 20)[:, ::3]
+
+        result = import_value(export_value(arr, min_bytes=0))
+
+        assert np.array_equal(result, arr)
+
+    def test_views_outlive_original(self):
+        result = import_value(export_value(np.arange(1000.0), min_bytes=0))
+        view = result[10:20]
+        del result
+        gc.collect()
+
+        assert view.tolist() == [float(i) for i in range(10, 20)]
+
+    def test_discard(self):
+        descriptor = export_value(np.arange(1000), min_bytes=0)
+        discard(descriptor)
+
+        with pytest.raises(FileNotFoundError):
+            import_value(descriptor)
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestDataFrameTransfer:
+    """Tests for DataFrames with numeric column blocks in shared memory."""
+
+    def test_numeric_frame(self):
+        df = pd.DataFrame(np.random.rand(100, 5), columns=list("abcde"))
+
+        result = import_value(export_value(df, min_bytes=0))
+
+        pd.testing.assert_frame_equal(result, df)
+
+    def test_mixed_frame_keeps_column_order(self):
+        df = pd.DataFrame({
+            'x': np.arange(100),
+            'name': ['row'] * 100,
+            'y': np.linspace(0, 1, 100),
+            'z': np.arange(100, 200),
+            'flag': np.ones(100, dtype=bool),
+        }, index=np.arange(100) * 2)
+
+        result = import_value(export_value(df, min_bytes=0))
+
+        assert list(result.columns) == ['x', 'name', 'y', 'z', 'flag']
+        pd.testing.assert_frame_equal(result, df, check_dtype=True)
+
+    def test_mixed_frame_columns_are_views_of_the_segment(self):
+        df = pd.DataFrame({
+            'x': np.arange(100),
+            'name': ['row'] * 100,
+            'y': np.linspace(0, 1, 100),
+            'z': np.arange(100, 200),
+        })
+
+        result = import_value(export_value(df, min_bytes=0))
+
+        segment = result['x'].to_numpy()
+        while isinstance(segment.base, np.ndarray):
+            segment = segment.base
+        for name in ('x', 'y', 'z'):
+            assert np.shares_memory(result[name].to_numpy(), segment)
+
+    def test_frame_without_numeric_columns_uses_pickle(self):
+        df = pd.DataFrame({'s': ['a', 'b']})
+        assert export_value(df, min_bytes=0) is None
+
+    def test_duplicate_columns_use_pickle(self):
+        df = pd.DataFrame([[1, 2]], columns=['a', 'a'])
+        assert export_value(df, min_bytes=0) is None
+
+
+@pytest.mark.skipif(not HAS_PANDAS, reason="pandas not installed")
+class TestKernelSharedMemory:
+    """Integration tests for get_variable/set_variable with large values."""
+
+    def setup_method(self):
+        self.kernel = NotebookKernel()
+
+    def teardown_method(self):
+        self.kernel.shutdown()
+
+    def test_get_large_array(self):
+        self.kernel.execute_cell("c1", "import numpy as np\narr = np.arange(500_000, dtype=np.float64)")
+
+        result = self.kernel.get_variable("arr")
+
+        assert result.shape == (500_000,)
+        assert result[-1] == 499_999.0
+        assert not result.flags.owndata
+
+    def test_set_large_array(self):
+        arr = np.arange(500_000, dtype=np.int64)
+
+        self.kernel.set_variable("arr", arr)
+        result = self.kernel.execute_cell("c1", "int(arr.sum())")
+
+        assert result["status"] == "success"
+        assert str(int(arr.sum())) in result["output"]
+
+    def test_get_large_dataframe(self):
+        self.kernel.execute_cell(
+            "c1",
+            "import numpy as np, pandas as pd\n"
+            "df = pd.DataFrame({'a': np.arange(200_000), 'b': np.ones(200_000), 'c': ['x'] * 200_000})"
+        )
+
+        result = self.kernel.get_variable("df")
+
+        assert result.shape == (200_000, 3)
+        assert list(result.columns) == ['a', 'b', 'c']
+        assert result['a'].iloc[-1] == 199_999
+        assert result['c'].iloc[0] == 'x'
+
+    def test_small_values_still_pickled(self):
+        self.kernel.set_variable("x", [1, 2, 3])
+        assert self.kernel.get_variable("x") == [1, 2, 3]
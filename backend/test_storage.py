@@ -0,0 +1,184 @@
+"""Tests for the SQLite notebook storage backend."""
+import os
+import sqlite3
+import zlib
+
+import pytest
+
+from blobstore import BlobStore, digest_of
+from storage import SqliteNotebookStore
+from wire import Attachment, RawJSON, dumps, encode_json
+
+
+def _cell(cell_id, code="", **fields):
+    return {"id": cell_id, "code": code, "output": "", "rich_output": None,
+            "error": "", "status": "idle", "peak_memory_delta": None, **fields}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteNotebookStore(tmp_path / "nb.sqlite3")
+    yield store
+    store.close()
+
+
+class TestSqliteNotebookStore:
+    """Tests for per-cell rows with compressed output blobs."""
+
+    def test_round_trip(self, store):
+        rich = {"type": "ndarray", "data": [1, 2], "shape": [2]}
+        store.save_changes(
+            [_cell("a", "x = 1", output="1\n", status="success", peak_memory_delta=64),
+             _cell("b", "x", rich_output=rich)],
+            [], None
+        )
+
+        cells = store.load()
+
+        assert cells == [
+            _cell("a", "x = 1", output="1\n", status="success", peak_memory_delta=64),
+            _cell("b", "x", rich_output=rich),
+        ]
+
+    def test_load_without_outputs(self, store):
+        store.save_changes([_cell("a", "x = 1", output="big")], [], None)
+
+        cells = store.load(include_outputs=False)
+
+        assert cells == [{"id": "a", "code": "x = 1", "status": "idle",
+                          "error": "", "peak_memory_delta": None}]
+        assert store.load_outputs(["a"]) == {"a": {"output": "big", "rich_output": None}}
+
+    def test_changed_cell_keeps_its_position(self, store):
+        store.save_changes([_cell("a"), _cell("b"), _cell("c")], [], None)
+
+        store.save_changes([_cell("a", "changed")], [], None)
+
+        assert [(c["id"], c["code"]) for c in store.load()] == [("a", "changed"), ("b", ""), ("c", "")]
+
+    def test_order_and_delete(self, store):
+        store.save_changes([_cell("a"), _cell("b"), _cell("c")], [], None)
+
+        store.save_changes([], ["a"], ["c", "b"])
+
+        assert [c["id"] for c in store.load()] == ["c", "b"]
+        assert "a" not in store.load_outputs()
+
+    def test_outputs_are_compressed(self, store):
+        store.save_changes([_cell("a", output="x" * 100_000)], [], None)
+
+        with sqlite3.connect(store.path) as db:
+            blob, = db.execute("SELECT output FROM outputs WHERE cell_id = 'a'").fetchone()
+
+        assert len(blob) < 1000
+        assert zlib.decompress(blob).startswith(b'"xxx')
+
+    def test_encoded_rich_output(self, store):
+        store.save_changes([_cell("a", rich_output=encode_json({"type": "series", "data": [1.5]}))], [], None)
+
+        assert store.load()[0]["rich_output"] == {"type": "series", "data": [1.5]}
+
+    def test_failed_batch_is_rolled_back(self, store):
+        store.save_changes([_cell("a", "kept")], [], None)
+
+        with pytest.raises(KeyError):
+            store.save_changes([_cell("a", "changed"), {"id": "b"}], [], None)
+
+        assert [(c["id"], c["code"]) for c in store.load()] == [("a", "kept")]
+
+    def test_persists_across_connections(self, tmp_path):
+        first = SqliteNotebookStore(tmp_path / "nb.sqlite3")
+        first.save_changes([_cell("a", "x = 1")], [], None)
+        first.compact()
+        first.close()
+
+        second = SqliteNotebookStore(tmp_path / "nb.sqlite3")
+
+        assert not second.is_empty()
+        assert second.load()[0]["code"] == "x = 1"
+        second.close()
+
+
+class TestBlobOutputs:
+    """Tests for large outputs kept in a content-addressed blob store."""
+
+    def test_large_outputs_are_deduplicated(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+        rich = encode_json({"type": "ndarray", "data": list(range(5000)), "shape": [5000]})
+
+        store.save_changes([_cell("a", rich_output=rich), _cell("b", rich_output=rich)], [], None)
+        store.save_changes([_cell("a", rich_output=rich)], [], None)
+
+        files = [p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]
+        assert len(files) == 1
+        assert [c["rich_output"]["shape"] for c in store.load()] == [[5000], [5000]]
+        store.close()
+
+    def test_small_outputs_stay_inline(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+
+        store.save_changes([_cell("a", output="small")], [], None)
+
+        assert not (tmp_path / "blobs").exists()
+        assert store.load()[0]["output"] == "small"
+        store.close()
+
+    def test_compact_collects_unreferenced_blobs(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+        store.save_changes([_cell("a", output="old " * 2000), _cell("b", output="kept " * 2000)], [], None)
+        store.save_changes([_cell("a", output="new " * 2000)], [], None)
+
+        for path in (tmp_path / "blobs").rglob("*"):
+            os.utime(path, (0, 0))
+        store.compact()
+
+        assert {c["output"][:4] for c in store.load()} == {"new ", "kept"}
+        assert len([p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]) == 2
+        store.close()
+
+    def test_unreadable_blob_drops_only_its_output(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+        store.save_changes([_cell("a", output="torn " * 2000), _cell("b", output="kept " * 2000)], [], None)
+        digest = digest_of(dumps("torn " * 2000))
+        torn = next((tmp_path / "blobs" / digest[:2]).glob(digest[2:] + ".*"))
+        torn.write_bytes(torn.read_bytes()[:10])
+
+        outputs = store.load_outputs()
+
+        assert outputs["a"]["output"] == ""
+        assert outputs["b"]["output"].startswith("kept ")
+        store.close()
+
+    def test_attachments_are_stored_as_blobs(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+        attachment = Attachment(b"rows")
+        rich = encode_json({"type": "dataframe", "format": "arrow", "data": attachment, "shape": [1, 1]})
+
+        store.save_changes([_cell("a", rich_output=rich)], [], None)
+        loaded = store.load()[0]["rich_output"]
+
+        assert blobs.get(attachment.digest) == b"rows"
+        assert isinstance(loaded, RawJSON)
+        assert loaded.decode()["data"]["digest"] == attachment.digest
+        assert loaded.attachments == {attachment.digest: None}
+        store.close()
+
+    def test_compact_keeps_attachments_of_live_outputs(self, tmp_path):
+        blobs = BlobStore(tmp_path / "blobs")
+        store = SqliteNotebookStore(tmp_path / "nb.sqlite3", blobs=blobs)
+        attachment = Attachment(b"rows")
+        store.save_changes([_cell("a", rich_output=encode_json({"data": attachment}))], [], None)
+        # Saved again as loaded, with the attachment only in the blob store
+        store.save_changes([_cell("a", rich_output=store.load()[0]["rich_output"])], [], None)
+
+        for path in (tmp_path / "blobs").rglob("*"):
+            os.utime(path, (0, 0))
+        store.compact()
+
+        assert blobs.get(attachment.digest) == b"rows"
+        store.close()
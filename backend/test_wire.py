@@ -0,0 +1,157 @@
+"""Tests for WebSocket message encoding with pre-encoded fragments."""
+import json
+import pickle
+
+import pytest
+
+import wire
+from wire import HAS_MSGPACK, Attachment, RawJSON, dumps, encode_json, loads
+
+if HAS_MSGPACK:
+    import msgpack
+    from wire import packb, unpackb
+
+
+class TestDumps:
+    """Tests for encoding messages and splicing RawJSON fragments."""
+
+    def test_plain_message(self):
+        message = {"type": "error", "cell_id": None, "message": "ünïcode"}
+
+        assert json.loads(dumps(message)) == message
+
+    def test_fragment_is_spliced_verbatim(self):
+        fragment = RawJSON(b'{"type":"ndarray","data":[1,2]}')
+
+        encoded = dumps({"type": "execution_result", "rich_output": fragment})
+
+        assert encoded == b'{"type":"execution_result","rich_output":{"type":"ndarray","data":[1,2]}}'
+
+    def test_nested_fragments(self):
+        first = encode_json({"n": 1})
+        second = encode_json([1, "two"])
+
+        encoded = dumps({"cells": [{"rich_output": first}, {"rich_output": second}, {"rich_output": None}]})
+
+        assert json.loads(encoded) == {
+            "cells": [{"rich_output": {"n": 1}}, {"rich_output": [1, "two"]}, {"rich_output": None}]
+        }
+
+    def test_user_strings_are_not_substituted(self):
+        message = {"text": "\x00raw:0\x00", "rich_output": encode_json(1)}
+
+        assert json.loads(dumps(message)) == {"text": "\x00raw:0\x00", "rich_output": 1}
+
+    def test_non_string_keys(self):
+        assert loads(dumps({1: "a", None: "b"})) == {"1": "a", "null": "b"}
+
+    def test_indent(self):
+        encoded = dumps({"cells": [{"rich_output": encode_json({"a": 1})}]}, indent=True)
+
+        assert b"\n  " in encoded
+        assert json.loads(encoded) == {"cells": [{"rich_output": {"a": 1}}]}
+
+    def test_standard_library_fallback(self, monkeypatch):
+        monkeypatch.setattr(wire, "HAS_ORJSON", False)
+
+        encoded = dumps({"big": 2 ** 70, "rich_output": RawJSON(b"[1]")})
+
+        assert json.loads(encoded) == {"big": 2 ** 70, "rich_output": [1]}
+
+
+class TestRawJSON:
+    """Tests for the pre-encoded value wrapper."""
+
+    def test_pickle_round_trip(self):
+        fragment = encode_json({"a": [1, 2]})
+
+        restored = pickle.loads(pickle.dumps(fragment))
+
+        assert restored.data == fragment.data
+        assert restored.decode() == {"a": [1, 2]}
+
+    def test_attachments_are_kept_beside_the_json(self):
+        attachment = Attachment(b"\xff\xff\xff\xffrows")
+
+        fragment = encode_json({"format": "arrow", "data": attachment})
+        restored = pickle.loads(pickle.dumps(fragment))
+
+        assert fragment.decode() == {"format": "arrow", "data": {"digest": attachment.digest, "size": 8}}
+        assert restored.attachments == {attachment.digest: b"\xff\xff\xff\xffrows"}
+        assert len(fragment) == len(fragment.data) + 8
+        assert encode_json({"a": 1}).attachments is None
+
+    def test_datetimes_and_complex_numbers_become_strings(self):
+        import datetime
+
+        import numpy as np
+        import pandas as pd
+
+        values = [
+            pd.Timestamp("2020-01-01 12:00", tz="UTC"), pd.NaT, pd.Timedelta(seconds=90),
+            datetime.date(2020, 1, 2), datetime.timedelta(seconds=5),
+            np.datetime64("2020-01-01T00:00:00.5", "ns"), np.datetime64("NaT"), 1 + 2j, np.complex64(1 - 1j),
+        ]
+
+        assert encode_json(values).decode() == [
+            "2020-01-01T12:00:00+00:00", None, "P0DT0H1M30S", "2020-01-02", "0:00:05",
+            "2020-01-01T00:00:00.500000000", None, "(1+2j)", "(1-1j)",
+        ]
+
+    def test_unknown_types_still_raise(self):
+        with pytest.raises(TypeError):
+            encode_json({"value": object()})
+
+
+@pytest.mark.skipif(not HAS_MSGPACK, reason="msgpack not installed")
+class TestMsgpack:
+    """Tests for the MessagePack encoding with typed numeric arrays."""
+
+    def test_decodes_like_json(self):
+        message = {
+            "type": "execution_result",
+            "rich_output": encode_json({
+                "data": [[0.5] * 10, list(range(-5, 5)), ["NaN", "Infinity", "-Infinity"] + [1.0] * 6,
+                         [1, None] * 5, [True] * 10, ["a"] * 10],
+                "index": [0, 1],
+            }),
+            "error": "",
+        }
+
+        assert unpackb(packb(message)) == loads(dumps(message))
+
+    def test_numeric_lists_become_typed_arrays(self):
+        raw = msgpack.unpackb(packb({"ints": list(range(100)), "floats": [0.25] * 100, "short": [1, 2]}))
+
+        assert raw["ints"] == msgpack.ExtType(wire.TYPED_ARRAY_EXT, bytes([wire.TYPED_INT32]) + b"".join(
+            i.to_bytes(4, "little") for i in range(100)
+        ))
+        assert raw["floats"].data[0] == wire.TYPED_FLOAT64
+        assert len(raw["floats"].data) == 1 + 8 * 100
+        assert raw["short"] == [1, 2]
+
+    def test_large_ints_fall_back_to_float64(self):
+        values = [2 ** 40] * 10
+
+        raw = msgpack.unpackb(packb(values))
+
+        assert raw.data[0] == wire.TYPED_FLOAT64
+        assert unpackb(packb(values)) == values
+
+    def test_smaller_than_json_for_numbers(self):
+        message = {"rich_output": encode_json({"data": [[i / 7 for i in range(100)] for _ in range(50)]})}
+
+        assert len(packb(message)) < len(dumps(message)) / 2
+
+    def test_attachments_are_packed_as_binary(self):
+        attachment = Attachment(b"rows")
+        message = {"type": "rich_output_ready", "rich_output": encode_json({"data": attachment})}
+
+        unpacked = wire.unpackb(wire.packb(message))
+
+        assert unpacked["rich_output"]["attachments"] == {attachment.digest: b"rows"}
+        assert unpacked["rich_output"]["data"]["digest"] == attachment.digest
+
+    def test_ints_beyond_64_bits_raise(self):
+        with pytest.raises(OverflowError):
+            packb({"big": 2 ** 70})
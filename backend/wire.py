@@ -0,0 +1,288 @@
+"""
+Encoding of WebSocket messages: JSON with pre-encoded fragments spliced in
+verbatim, or MessagePack with numeric lists as raw buffers.
+"""
+import datetime
+import json
+import math
+import os
+import re
+import sys
+from array import array
+from typing import Any, Optional
+
+from blobstore import digest_of
+
+# orjson is much faster than the standard library for large payloads
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+# Rich output may hold NumPy scalars (datetime64, complex) that JSON has no type for
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+# MessagePack is the binary protocol; without it every client gets JSON
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+    msgpack = None
+
+
+# MessagePack extension type for numeric lists: one dtype byte, then the
+# values as little-endian float64 or int32
+TYPED_ARRAY_EXT = 1
+TYPED_FLOAT64 = 0
+TYPED_INT32 = 1
+# Shorter lists are not worth the extension header
+TYPED_ARRAY_MIN_LENGTH = 8
+
+# Stand-ins for non-finite floats in rich output (see kernel._safe_value)
+_NON_FINITE = {"NaN": math.nan, "Infinity": math.inf, "-Infinity": -math.inf}
+_NUMBER_KINDS = frozenset({int, float, str})
+_CONTAINER_KINDS = frozenset({dict, list, tuple})
+
+
+class Attachment:
+    """
+    Binary data (e.g. an Arrow IPC stream) to send beside a JSON value.
+
+    encode_json() writes {"digest", "size"} in its place and keeps the
+    bytes with the RawJSON; clients get them inline over MessagePack or
+    from GET /api/blobs/{digest}.
+    """
+    __slots__ = ("data", "digest")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.digest = digest_of(data)
+
+    def __reduce__(self):
+        return (Attachment, (self.data,))
+
+
+class RawJSON:
+    """
+    A value that is already encoded as JSON.
+
+    Produced where the data is built (e.g. rich output in the kernel worker)
+    and written into outgoing messages by dumps() without being decoded,
+    validated or encoded again. Attachments maps the digest of each
+    Attachment the value referred to to its bytes (None once the bytes
+    are only in the blob store).
+    """
+    __slots__ = ("data", "_digest", "attachments")
+
+    def __init__(
+        self,
+        data: bytes,
+        digest: Optional[str] = None,
+        attachments: Optional[dict[str, Optional[bytes]]] = None
+    ):
+        self.data = data
+        self._digest = digest
+        self.attachments = attachments
+
+    def __reduce__(self):
+        return (RawJSON, (self.data, self._digest, self.attachments))
+
+    @property
+    def digest(self) -> str:
+        """Content digest of the encoded bytes (see blobstore.digest_of)."""
+        if self._digest is None:
+            self._digest = digest_of(self.data)
+        return self._digest
+
+    def __len__(self) -> int:
+        """Encoded size, including attachments held in memory."""
+        if not self.attachments:
+            return len(self.data)
+        return len(self.data) + sum(len(data) for data in self.attachments.values() if data is not None)
+
+    def decode(self) -> Any:
+        """Parse the encoded value back into Python objects."""
+        return loads(self.data)
+
+
+# Fragments are encoded as placeholder strings first and substituted
+# afterwards; the per-process nonce keeps user strings from matching
+_NONCE = os.urandom(6).hex()
+_PLACEHOLDER = "\x00raw" + _NONCE + ":{}\x00"
+_PLACEHOLDER_PATTERN = re.compile(rb'"\\u0000raw' + _NONCE.encode() + rb':(\d+)\\u0000"')
+
+
+def _encode(value: Any, default: Any = None, indent: bool = False) -> bytes:
+    """Encode with orjson if available (non-string keys become strings, like json)."""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(value, default=default, option=option)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the standard library copes
+    return json.dumps(
+        value, default=default, ensure_ascii=False,
+        indent=2 if indent else None, separators=None if indent else (",", ":")
+    ).encode("utf-8")
+
+
+def _json_safe(item: Any) -> Any:
+    """
+    Stand-in for a value JSON has no type for: datetimes and durations as
+    ISO 8601 strings (None for NaT), complex numbers as strings.
+    """
+    if isinstance(item, (datetime.date, datetime.time, datetime.timedelta)):
+        # Also pandas Timestamp, Timedelta and NaT (which is unequal to itself)
+        if item != item:
+            return None
+        return item.isoformat() if hasattr(item, "isoformat") else str(item)
+    if isinstance(item, complex):
+        return str(item)
+    if HAS_NUMPY:
+        if isinstance(item, np.datetime64):
+            return None if np.isnat(item) else np.datetime_as_string(item)
+        if isinstance(item, np.timedelta64):
+            return None if np.isnat(item) else str(item)
+        if isinstance(item, np.complexfloating):
+            return str(item)
+    raise TypeError(f"Object of type {type(item).__name__} is not JSON serializable")
+
+
+def encode_json(value: Any) -> RawJSON:
+    """
+    Encode a value once, for later splicing into messages (digest included).
+
+    Attachments in the value are written as {"digest", "size"} and their
+    bytes kept in RawJSON.attachments. Datetimes and complex numbers are
+    written as strings (see _json_safe).
+    """
+    attachments: dict[str, Optional[bytes]] = {}
+
+    def default(item: Any) -> Any:
+        if isinstance(item, Attachment):
+            attachments[item.digest] = item.data
+            return {"digest": item.digest, "size": len(item.data)}
+        return _json_safe(item)
+
+    data = _encode(value, default)
+    return RawJSON(data, digest_of(data), attachments or None)
+
+
+def dumps(message: Any, indent: bool = False) -> bytes:
+    """
+    Encode a message as UTF-8 JSON (compact unless indent is set).
+
+    RawJSON values anywhere in the message are written out as their
+    encoded bytes (never re-indented).
+    """
+    fragments: list[bytes] = []
+
+    def default(value: Any) -> Any:
+        if isinstance(value, RawJSON):
+            fragments.append(value.data)
+            return _PLACEHOLDER.format(len(fragments) - 1)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    encoded = _encode(message, default, indent)
+    if not fragments:
+        return encoded
+    return _PLACEHOLDER_PATTERN.sub(lambda match: fragments[int(match.group(1))], encoded)
+
+
+def loads(data: Any) -> Any:
+    """Decode JSON bytes or text."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _typed_array(values: list, kinds: set) -> Optional[Any]:
+    """A TYPED_ARRAY_EXT for a list of numbers, or None if it holds anything else."""
+    if str in kinds:
+        try:
+            values = [_NON_FINITE[v] if type(v) is str else v for v in values]
+        except KeyError:
+            return None
+        kinds = {float}
+    typed = None
+    if kinds == {int}:
+        try:
+            typed, dtype = array("i", values), TYPED_INT32
+        except OverflowError:
+            pass
+    if typed is None:
+        try:
+            typed, dtype = array("d", values), TYPED_FLOAT64
+        except OverflowError:
+            return None
+    if typed.itemsize not in (4, 8):
+        return None
+    if sys.byteorder == "big":
+        typed.byteswap()
+    return msgpack.ExtType(TYPED_ARRAY_EXT, bytes([dtype]) + typed.tobytes())
+
+
+def _packable(value: Any) -> Any:
+    """
+    Prepare a message for msgpack: decode RawJSON (adding the attachments
+    it holds as an "attachments" map of digest to bytes), turn numeric
+    lists into typed arrays.
+    """
+    if isinstance(value, RawJSON):
+        decoded = _packable(value.decode())
+        if value.attachments and isinstance(decoded, dict):
+            inline = {digest: data for digest, data in value.attachments.items() if data is not None}
+            if inline:
+                decoded["attachments"] = inline
+        return decoded
+    if isinstance(value, dict):
+        return {key: _packable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        kinds = set(map(type, value))
+        if len(value) >= TYPED_ARRAY_MIN_LENGTH and kinds <= _NUMBER_KINDS:
+            typed = _typed_array(value, kinds)
+            if typed is not None:
+                return typed
+        if kinds & _CONTAINER_KINDS or RawJSON in kinds:
+            return [_packable(item) for item in value]
+    return value
+
+
+def packb(message: Any) -> bytes:
+    """
+    Encode a message as MessagePack.
+
+    RawJSON values are decoded and packed with the rest of the message,
+    their attachments as binary.
+    Lists of at least TYPED_ARRAY_MIN_LENGTH numbers (including the
+    "NaN"/"Infinity"/"-Infinity" stand-ins) become TYPED_ARRAY_EXT
+    extensions. Raises OverflowError for integers beyond 64 bits.
+    """
+    return msgpack.packb(_packable(message), use_bin_type=True)
+
+
+def _unpack_ext(code: int, data: bytes) -> Any:
+    if code != TYPED_ARRAY_EXT:
+        return msgpack.ExtType(code, data)
+    typed = array("d" if data[0] == TYPED_FLOAT64 else "i", data[1:])
+    if sys.byteorder == "big":
+        typed.byteswap()
+    if data[0] == TYPED_INT32:
+        return typed.tolist()
+    return [
+        v if math.isfinite(v) else ("NaN" if math.isnan(v) else "Infinity" if v > 0 else "-Infinity")
+        for v in typed
+    ]
+
+
+def unpackb(data: bytes) -> Any:
+    """Decode a message encoded by packb() (typed arrays become lists again)."""
+    return msgpack.unpackb(data, ext_hook=_unpack_ext, raw=False, strict_map_key=False)
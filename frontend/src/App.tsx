@@ -1,19 +1,69 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 import { Cell } from './Cell';
 import { createWebSocketClient, type WebSocketClient } from './websocket';
-import type { Cell as CellType, ServerMessage } from './types';
+import { rowQueryKey } from './RichOutputViewer';
+import { decodeArrowOutput } from './arrow';
+import type { Cell as CellType, OutputRef, RichOutput, RowQuery, RowWindows, ServerMessage } from './types';
+
+// Media type of blobs holding DataFrame rows as an Arrow IPC stream
+const ARROW_STREAM_TYPE = 'application/vnd.apache.arrow.stream';
+
+/**
+ * Decodes DataFrame rows sent as Arrow along with an output. Without the
+ * bytes (JSON protocol) or if they cannot be read, the output is kept as
+ * it is and its rows are fetched when the cell comes into view.
+ */
+function withArrowRows<T extends RichOutput | null | undefined>(output: T): T {
+  try {
+    return decodeArrowOutput(output);
+  } catch (error) {
+    console.error('Failed to decode Arrow rows:', error);
+    return output;
+  }
+}
 
 function App() {
   const [cells, setCells] = useState<CellType[]>([]);
   const [connected, setConnected] = useState(false);
+  // Row windows fetched for DataFrame outputs, by cell ID
+  const [rowWindows, setRowWindows] = useState<Record<string, RowWindows>>({});
+  const pendingRowsRef = useRef<Set<string>>(new Set());
+  // Digests of rich outputs being fetched
+  const loadingOutputsRef = useRef<Set<string>>(new Set());
   const wsRef = useRef<WebSocketClient | null>(null);
+  // Cells in or near the viewport, and those the server was told about
+  // (null until the first subscribe on this connection)
+  const visibleCellsRef = useRef<Set<string>>(new Set());
+  const subscribedRef = useRef<Set<string> | null>(null);
+  const subscriptionTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const cellsRef = useRef<CellType[]>(cells);
+  cellsRef.current = cells;
   const debounceTimersRef = useRef<Map<string, ReturnType<typeof setTimeout>>>(new Map());
 
+  // Forget fetched rows once a cell's output is replaced or removed
+  const dropRowWindows = useCallback((cellId: string) => {
+    pendingRowsRef.current.forEach((key) => {
+      if (key.startsWith(`${cellId}:`)) {
+        pendingRowsRef.current.delete(key);
+      }
+    });
+    setRowWindows((prev) => {
+      if (!(cellId in prev)) {
+        return prev;
+      }
+      const next = { ...prev };
+      delete next[cellId];
+      return next;
+    });
+  }, []);
+
   // Handle incoming WebSocket messages
   const handleMessage = useCallback((message: ServerMessage) => {
     switch (message.type) {
       case 'notebook_state':
-        setCells(message.cells);
+        setCells(message.cells.map((c) => (c.rich_output ? { ...c, rich_output: withArrowRows(c.rich_output) } : c)));
+        pendingRowsRef.current.clear();
+        setRowWindows({});
         break;
 
       case 'cell_added':
@@ -26,6 +76,7 @@ function App() {
 
       case 'cell_deleted':
         setCells((prev) => prev.filter((c) => c.id !== message.cell_id));
+        dropRowWindows(message.cell_id);
         break;
 
       case 'execution_started':
@@ -36,7 +87,9 @@ function App() {
         );
         break;
 
-      case 'execution_result':
+      case 'execution_result': {
+        const richOutput = withArrowRows(message.rich_output);
+        dropRowWindows(message.cell_id);
         setCells((prev) =>
           prev.map((c) =>
             c.id === message.cell_id
@@ -44,13 +97,51 @@ function App() {
                   ...c,
                   status: message.status,
                   output: message.output,
-                  rich_output: message.rich_output,
+                  rich_output: richOutput,
                   error: message.error,
+                  peak_memory_delta: message.peak_memory_delta,
+                  rich_pending: message.rich_pending ?? false,
+                  rich_output_ref: null,
+                  output_omitted: message.output_omitted ?? false,
                 }
               : c
           )
         );
         break;
+      }
+
+      case 'rich_output_ready': {
+        // Only sent for the cell's latest result; the text output stays as the fallback
+        const richOutput = withArrowRows(message.rich_output);
+        setCells((prev) =>
+          prev.map((c) =>
+            c.id === message.cell_id && c.rich_pending
+              ? { ...c, rich_output: richOutput, rich_pending: false, rich_output_ref: null }
+              : c
+          )
+        );
+        break;
+      }
+
+      case 'cell_output': {
+        const richOutput = withArrowRows(message.rich_output);
+        dropRowWindows(message.cell_id);
+        setCells((prev) =>
+          prev.map((c) =>
+            c.id === message.cell_id
+              ? {
+                  ...c,
+                  output: message.output,
+                  rich_output: richOutput,
+                  rich_pending: message.rich_pending ?? false,
+                  rich_output_ref: null,
+                  output_omitted: false,
+                }
+              : c
+          )
+        );
+        break;
+      }
 
       case 'execution_queue':
         // Mark all queued cells as pending execution
@@ -82,6 +173,22 @@ function App() {
         );
         break;
 
+      case 'rows_window': {
+        const queryKey = rowQueryKey(message.query);
+        pendingRowsRef.current.delete(`${message.cell_id}:${queryKey}:${message.offset}`);
+        setRowWindows((prev) => {
+          const cellWindows = prev[message.cell_id] ?? {};
+          return {
+            ...prev,
+            [message.cell_id]: {
+              ...cellWindows,
+              [queryKey]: { ...cellWindows[queryKey], [message.offset]: message },
+            },
+          };
+        });
+        break;
+      }
+
       case 'error':
         // Handle error messages (e.g., circular dependency)
         if (message.cell_id) {
@@ -97,8 +204,46 @@ function App() {
         }
         break;
     }
+  }, [dropRowWindows]);
+
+  // Tell the server which cells' outputs are needed (batched while scrolling)
+  const syncSubscriptions = useCallback(() => {
+    subscriptionTimerRef.current = null;
+    const ws = wsRef.current;
+    if (!ws || !ws.isConnected()) {
+      return;
+    }
+    const visible = visibleCellsRef.current;
+    const subscribed = subscribedRef.current;
+    const added = [...visible].filter((id) => !subscribed?.has(id));
+    const removed = subscribed ? [...subscribed].filter((id) => !visible.has(id)) : [];
+    if (subscribed === null || added.length > 0) {
+      const missing = cellsRef.current
+        .filter((c) => c.output_omitted && visible.has(c.id))
+        .map((c) => c.id);
+      ws.send({ type: 'subscribe', cell_ids: added, missing });
+    }
+    if (removed.length > 0) {
+      ws.send({ type: 'unsubscribe', cell_ids: removed });
+    }
+    subscribedRef.current = new Set(visible);
   }, []);
 
+  const scheduleSubscriptionSync = useCallback(() => {
+    if (subscriptionTimerRef.current === null) {
+      subscriptionTimerRef.current = setTimeout(syncSubscriptions, 100);
+    }
+  }, [syncSubscriptions]);
+
+  const handleVisibilityChange = useCallback((cellId: string, visible: boolean) => {
+    if (visible) {
+      visibleCellsRef.current.add(cellId);
+    } else {
+      visibleCellsRef.current.delete(cellId);
+    }
+    scheduleSubscriptionSync();
+  }, [scheduleSubscriptionSync]);
+
   // Initialize WebSocket connection
   useEffect(() => {
     // Determine WebSocket URL based on environment
@@ -110,12 +255,26 @@ function App() {
       ? `${protocol}//${host}/ws`
       : `${protocol}//${host}/ws`;
 
-    wsRef.current = createWebSocketClient(wsUrl, handleMessage, setConnected);
+    const handleConnectionChange = (isConnected: boolean) => {
+      // Replies to requests in flight are lost with the connection (a
+      // resumed connection only replays broadcasts), so allow re-requesting
+      if (!isConnected) {
+        pendingRowsRef.current.clear();
+      }
+      // Subscriptions belong to the connection; declare them again
+      subscribedRef.current = null;
+      if (isConnected) {
+        scheduleSubscriptionSync();
+      }
+      setConnected(isConnected);
+    };
+
+    wsRef.current = createWebSocketClient(wsUrl, handleMessage, handleConnectionChange);
 
     return () => {
       wsRef.current?.close();
     };
-  }, [handleMessage]);
+  }, [handleMessage, scheduleSubscriptionSync]);
 
   // Handle cell code change with debouncing
   const handleCellChange = useCallback((cellId: string, newCode: string) => {
@@ -178,6 +337,68 @@ function App() {
     }
   }, [cells]);
 
+  // Request a window of rows of a DataFrame output (once per window and query)
+  const handleFetchRows = useCallback(
+    (cellId: string, offset: number, limit: number, query: RowQuery | null) => {
+      const key = `${cellId}:${rowQueryKey(query)}:${offset}`;
+      if (pendingRowsRef.current.has(key)) {
+        return;
+      }
+      pendingRowsRef.current.add(key);
+      wsRef.current?.send({
+        type: 'fetch_rows',
+        cell_id: cellId,
+        offset,
+        limit,
+        query,
+      });
+    },
+    []
+  );
+
+  // Fetch a rich output sent as a reference, or the Arrow rows of a
+  // DataFrame output sent without them (when its cell scrolls into view)
+  const handleLoadOutput = useCallback((cellId: string, ref: OutputRef) => {
+    if (loadingOutputsRef.current.has(ref.digest)) {
+      return;
+    }
+    loadingOutputsRef.current.add(ref.digest);
+    fetch(`/api/blobs/${ref.digest}`)
+      .then(async (response) => {
+        if (!response.ok) {
+          throw new Error(`HTTP ${response.status}`);
+        }
+        if (response.headers.get('Content-Type')?.startsWith(ARROW_STREAM_TYPE)) {
+          const stream = new Uint8Array(await response.arrayBuffer());
+          const output = cellsRef.current.find((c) => c.id === cellId)?.rich_output;
+          if (output?.format !== 'arrow' || output.data.digest !== ref.digest) {
+            return;
+          }
+          const richOutput = decodeArrowOutput(output, stream);
+          // Only if the cell still shows that output (it may have run again)
+          setCells((prev) =>
+            prev.map((c) => (c.id === cellId && c.rich_output === output ? { ...c, rich_output: richOutput } : c))
+          );
+          return;
+        }
+        const richOutput = withArrowRows((await response.json()) as RichOutput);
+        // Only if the cell still shows that output (it may have run again)
+        setCells((prev) =>
+          prev.map((c) =>
+            c.id === cellId && c.rich_output_ref?.digest === ref.digest
+              ? { ...c, rich_output: richOutput, rich_output_ref: null }
+              : c
+          )
+        );
+      })
+      .catch((error) => {
+        console.error('Failed to load output:', error);
+      })
+      .finally(() => {
+        loadingOutputsRef.current.delete(ref.digest);
+      });
+  }, []);
+
   // Handle interrupt (stop execution)
   const handleInterrupt = useCallback(() => {
     wsRef.current?.send({
@@ -255,6 +476,10 @@ function App() {
                 onDelete={handleCellDelete}
                 onExecute={handleCellExecute}
                 onInterrupt={handleInterrupt}
+                rowWindows={rowWindows[cell.id]}
+                onFetchRows={handleFetchRows}
+                onLoadOutput={handleLoadOutput}
+                onVisibilityChange={handleVisibilityChange}
               />
             ))}
             <div className="add-cell-container">
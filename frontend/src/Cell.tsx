@@ -1,5 +1,6 @@
 import Editor from '@monaco-editor/react';
-import type { Cell as CellType } from './types';
+import { useEffect, useRef } from 'react';
+import type { Cell as CellType, OutputRef, RowQuery, RowWindows } from './types';
 import { RichOutputViewer } from './RichOutputViewer';
 
 interface CellProps {
@@ -9,9 +10,50 @@ interface CellProps {
   onDelete: (cellId: string) => void;
   onExecute: (cellId: string) => void;
   onInterrupt: () => void;
+  rowWindows?: RowWindows;
+  onFetchRows: (cellId: string, offset: number, limit: number, query: RowQuery | null) => void;
+  onLoadOutput: (cellId: string, ref: OutputRef) => void;
+  onVisibilityChange: (cellId: string, visible: boolean) => void;
 }
 
-export function Cell({ cell, cellNumber, onChange, onDelete, onExecute, onInterrupt }: CellProps) {
+export function Cell({
+  cell,
+  cellNumber,
+  onChange,
+  onDelete,
+  onExecute,
+  onInterrupt,
+  rowWindows,
+  onFetchRows,
+  onLoadOutput,
+  onVisibilityChange,
+}: CellProps) {
+  // Report when the cell comes near or leaves the viewport, so only the
+  // outputs of cells on screen are sent
+  const cellRef = useRef<HTMLDivElement>(null);
+  const onVisibilityChangeRef = useRef(onVisibilityChange);
+  onVisibilityChangeRef.current = onVisibilityChange;
+  const cellId = cell.id;
+
+  useEffect(() => {
+    const element = cellRef.current;
+    if (!element) {
+      return;
+    }
+    const observer = new IntersectionObserver(
+      (entries) => {
+        const entry = entries[entries.length - 1];
+        onVisibilityChangeRef.current(cellId, entry.isIntersecting);
+      },
+      { rootMargin: '400px 0px' }
+    );
+    observer.observe(element);
+    return () => {
+      observer.disconnect();
+      onVisibilityChangeRef.current(cellId, false);
+    };
+  }, [cellId]);
+
   const handleEditorChange = (value: string | undefined) => {
     onChange(cell.id, value || '');
   };
@@ -26,6 +68,7 @@ export function Cell({ cell, cellNumber, onChange, onDelete, onExecute, onInterr
 
   return (
     <div 
+      ref={cellRef}
       className={`cell ${cell.status}`}
       onKeyDown={handleKeyDown}
     >
@@ -33,6 +76,11 @@ export function Cell({ cell, cellNumber, onChange, onDelete, onExecute, onInterr
         <div className="cell-info">
           <span className="cell-id">In [{cellNumber}]</span>
           <StatusIndicator status={cell.status} />
+          {cell.status !== 'running' && cell.peak_memory_delta != null && (
+            <span className="memory-badge" title="Peak memory growth during last run">
+              +{formatBytes(cell.peak_memory_delta)}
+            </span>
+          )}
         </div>
         <div className="cell-actions">
           {cell.status === 'running' ? (
@@ -127,13 +175,35 @@ export function Cell({ cell, cellNumber, onChange, onDelete, onExecute, onInterr
             {cell.error && (
               <pre className="output-content output-error">{cell.error}</pre>
             )}
-            {!cell.error && cell.rich_output && (
-              <RichOutputViewer data={cell.rich_output} />
+            {!cell.error && cell.rich_output && cell.rich_output.format !== 'arrow' && (
+              <RichOutputViewer
+                data={cell.rich_output}
+                rowWindows={rowWindows}
+                onFetchRows={(offset, limit, query) => onFetchRows(cell.id, offset, limit, query)}
+              />
+            )}
+            {!cell.error && cell.rich_output?.format === 'arrow' && (
+              <OutputPlaceholder
+                outputRef={cell.rich_output.data}
+                onVisible={() => onLoadOutput(cell.id, cell.rich_output!.data)}
+              />
             )}
-            {!cell.error && !cell.rich_output && cell.output && (
+            {!cell.error && !cell.rich_output && cell.rich_output_ref && (
+              <OutputPlaceholder
+                outputRef={cell.rich_output_ref}
+                onVisible={() => onLoadOutput(cell.id, cell.rich_output_ref!)}
+              />
+            )}
+            {!cell.error && !cell.rich_output && !cell.rich_output_ref && cell.output && (
               <pre className="output-content">{cell.output}</pre>
             )}
-            {!cell.output && !cell.error && !cell.rich_output && cell.status !== 'idle' && (
+            {!cell.error && cell.output_omitted && (
+              <div className="output-placeholder">Loading output…</div>
+            )}
+            {!cell.error && cell.rich_pending && (
+              <div className="rich-pending">Rendering output…</div>
+            )}
+            {!cell.output && !cell.error && !cell.rich_output && !cell.output_omitted && cell.status !== 'idle' && (
               <pre className="output-content"></pre>
             )}
           </>
@@ -143,6 +213,53 @@ export function Cell({ cell, cellNumber, onChange, onDelete, onExecute, onInterr
   );
 }
 
+/**
+ * Stands in for a large output until it scrolls near the viewport,
+ * then asks for it to be loaded.
+ */
+function OutputPlaceholder({ outputRef, onVisible }: { outputRef: OutputRef; onVisible: () => void }) {
+  const elementRef = useRef<HTMLDivElement>(null);
+  const onVisibleRef = useRef(onVisible);
+  onVisibleRef.current = onVisible;
+
+  useEffect(() => {
+    const element = elementRef.current;
+    if (!element) {
+      return;
+    }
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries.some((entry) => entry.isIntersecting)) {
+          onVisibleRef.current();
+        }
+      },
+      { rootMargin: '400px 0px' }
+    );
+    observer.observe(element);
+    return () => observer.disconnect();
+  }, [outputRef.digest]);
+
+  return (
+    <div ref={elementRef} className="output-placeholder">
+      Loading output ({formatBytes(outputRef.size)})…
+    </div>
+  );
+}
+
+/**
+ * Formats a byte count as a short human-readable string.
+ */
+function formatBytes(bytes: number): string {
+  const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+  let value = bytes;
+  let unit = 0;
+  while (value >= 1024 && unit < units.length - 1) {
+    value /= 1024;
+    unit++;
+  }
+  return `${value.toFixed(unit === 0 ? 0 : 1)} ${units[unit]}`;
+}
+
 interface StatusIndicatorProps {
   status: CellType['status'];
 }
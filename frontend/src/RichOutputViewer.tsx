@@ -1,7 +1,34 @@
-import type { RichOutput } from './types';
+import { useEffect, useMemo, useRef, useState } from 'react';
+import type { ArraySampling, ColumnStats, FilterOp, RichOutput, RowFilter, RowQuery, RowWindows } from './types';
 
 interface RichOutputViewerProps {
   data: RichOutput;
+  rowWindows?: RowWindows;  // Fetched row windows by query key and offset
+  onFetchRows?: (offset: number, limit: number, query: RowQuery | null) => void;
+}
+
+// Virtual scrolling of DataFrame rows beyond the inline preview
+const ROW_HEIGHT = 33;  // px, fixed so row positions can be computed
+const VIEWPORT_HEIGHT = 400;
+const PAGE_SIZE = 200;  // Rows per fetch_rows request
+const OVERSCAN = 10;  // Extra rows rendered above and below the viewport
+const MAX_SCROLL_HEIGHT = 10_000_000;  // px, stays well below browser element limits
+
+const FILTER_OPS: FilterOp[] = ['==', '!=', '<', '<=', '>', '>=', 'contains', 'isnull', 'notnull'];
+const EMPTY_QUERY: RowQuery = { sort: [], filters: [] };
+
+/**
+ * Canonical string for a row query, used to key fetched windows.
+ * Field order matches the query echoed back in rows_window messages.
+ */
+export function rowQueryKey(query: RowQuery | null | undefined): string {
+  if (!query || (query.sort.length === 0 && query.filters.length === 0)) {
+    return '';
+  }
+  return JSON.stringify({
+    sort: query.sort.map((key) => ({ column: key.column, ascending: key.ascending })),
+    filters: query.filters.map((f) => ({ column: f.column, op: f.op, value: f.value ?? null })),
+  });
 }
 
 /**
@@ -39,57 +66,427 @@ function formatCellValue(value: any): string {
   return String(value);
 }
 
+/**
+ * Decodes a base64 null bitmap (least significant bit first) into bytes.
+ */
+function decodeNullBitmap(bitmap: string | null | undefined): Uint8Array | null {
+  if (!bitmap) {
+    return null;
+  }
+  const binary = atob(bitmap);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+function isNullAt(bitmap: Uint8Array | null, row: number): boolean {
+  return bitmap !== null && ((bitmap[row >> 3] >> (row & 7)) & 1) === 1;
+}
+
+interface RowAccessor {
+  rowCount: number;
+  valueAt: (row: number, col: number) => any;
+  indexAt: (row: number) => any;
+}
+
+/**
+ * Returns a (row, column position) accessor for either DataFrame encoding.
+ * Missing values in float columns read as 'NaN', matching the record format.
+ */
+function frameAccessor(data: RichOutput, columns: string[]): RowAccessor {
+  const indexAt = (row: number) => data.index?.[row] ?? row;
+
+  if (data.format === 'columnar') {
+    const columnData = data.data as any[][];
+    const bitmaps = columns.map((_, col) => decodeNullBitmap(data.nulls?.[col]));
+    const isFloat = columns.map((col) => (data.dtypes?.[col] ?? '').startsWith('float'));
+    return {
+      rowCount: data.index?.length ?? columnData[0]?.length ?? 0,
+      valueAt: (row, col) => {
+        if (isNullAt(bitmaps[col], row)) {
+          return isFloat[col] ? 'NaN' : null;
+        }
+        return columnData[col][row];
+      },
+      indexAt,
+    };
+  }
+
+  const records = data.data as Record<string, any>[];
+  return {
+    rowCount: records.length,
+    valueAt: (row, col) => records[row][columns[col]],
+    indexAt,
+  };
+}
+
+interface DataFrameViewerProps {
+  data: RichOutput;
+  rowWindows?: RowWindows;
+  onFetchRows?: (offset: number, limit: number, query: RowQuery | null) => void;
+}
+
 /**
  * Renders a pandas DataFrame as a styled table.
+ *
+ * Truncated frames are virtual-scrolled: only the rows in view are
+ * rendered, and rows beyond the inline preview are fetched from the
+ * kernel in PAGE_SIZE windows as they scroll into view. Sorting (header
+ * click) and filtering run in the kernel on the full result and page
+ * through the same windows.
  */
-function DataFrameViewer({ data }: { data: RichOutput }) {
-  const { columns = [], shape, truncated, index } = data;
-  const rows = data.data as Record<string, any>[];
+function DataFrameViewer({ data, rowWindows, onFetchRows }: DataFrameViewerProps) {
+  const { columns = [], shape, truncated } = data;
+  const preview = useMemo(() => frameAccessor(data, data.columns ?? []), [data]);
+  const [scrollTop, setScrollTop] = useState(0);
+  const [query, setQuery] = useState<RowQuery>(EMPTY_QUERY);
+  const [showStats, setShowStats] = useState(false);
+  const scrollRef = useRef<HTMLDivElement>(null);
+  const statsByColumn = useMemo(
+    () => new Map((data.column_stats ?? []).map((stats) => [stats.column, stats])),
+    [data.column_stats]
+  );
+
+  const queryKey = rowQueryKey(query);
+  const querying = queryKey !== '';
+  const activeQuery = querying ? query : null;
+  const windows = rowWindows?.[queryKey];
+
+  // Accessor per fetched window (null if the kernel could not serve it)
+  const pages = useMemo(() => {
+    const accessors = new Map<number, RowAccessor | null>();
+    for (const fetched of Object.values(windows ?? {})) {
+      accessors.set(
+        fetched.offset,
+        fetched.error
+          ? null
+          : frameAccessor(
+              { ...data, format: fetched.format, data: fetched.data, nulls: fetched.nulls ?? undefined, index: fetched.index },
+              data.columns ?? []
+            )
+      );
+    }
+    return accessors;
+  }, [data, windows]);
+
+  const canQuery = onFetchRows !== undefined;
+  const pageable = canQuery && (truncated || querying);
+  // A query reorders rows, so the inline preview only applies without one
+  const previewRows = querying ? 0 : preview.rowCount;
+  const fetchedWindows = Object.values(windows ?? {});
+  const queryTotal = fetchedWindows.length > 0 ? fetchedWindows[0].total_rows : undefined;
+  const totalRows = !pageable ? preview.rowCount : querying ? queryTotal ?? 0 : shape[0];
+  const pageError = fetchedWindows.find((fetched) => fetched.error)?.error;
+
+  // Very tall frames are scrolled proportionally instead of one pixel per pixel
+  const rowPitch = ROW_HEIGHT * Math.min(1, MAX_SCROLL_HEIGHT / Math.max(1, totalRows * ROW_HEIGHT));
+  const visibleRows = Math.ceil(VIEWPORT_HEIGHT / ROW_HEIGHT);
+  const firstVisible = pageable ? Math.min(Math.floor(scrollTop / rowPitch), totalRows) : 0;
+  const first = pageable ? Math.max(0, firstVisible - OVERSCAN) : 0;
+  const last = pageable ? Math.min(totalRows, firstVisible + visibleRows + OVERSCAN) : totalRows;
+  const topSpacer = pageable ? Math.max(0, firstVisible * rowPitch - (firstVisible - first) * ROW_HEIGHT) : 0;
+  const bottomSpacer = pageable
+    ? Math.max(0, totalRows * rowPitch - topSpacer - (last - first) * ROW_HEIGHT)
+    : 0;
+
+  // Request the windows covering the rendered rows that the preview lacks
+  useEffect(() => {
+    if (!pageable || !onFetchRows) {
+      return;
+    }
+    if (querying && queryTotal === undefined) {
+      // Row count of the query result is unknown until the first window
+      onFetchRows(0, PAGE_SIZE, activeQuery);
+      return;
+    }
+    const start = Math.floor(Math.max(first, previewRows) / PAGE_SIZE) * PAGE_SIZE;
+    for (let offset = start; offset < last; offset += PAGE_SIZE) {
+      if (!pages.has(offset)) {
+        onFetchRows(offset, PAGE_SIZE, activeQuery);
+      }
+    }
+  }, [pageable, onFetchRows, querying, queryTotal, activeQuery, first, last, pages, previewRows]);
+
+  const rowAt = (row: number): { accessor: RowAccessor; local: number } | null => {
+    if (row < previewRows) {
+      return { accessor: preview, local: row };
+    }
+    const offset = Math.floor(row / PAGE_SIZE) * PAGE_SIZE;
+    const page = pages.get(offset);
+    if (!page || row - offset >= page.rowCount) {
+      return null;
+    }
+    return { accessor: page, local: row - offset };
+  };
+
+  const changeQuery = (next: RowQuery) => {
+    setQuery(next);
+    setScrollTop(0);
+    scrollRef.current?.scrollTo({ top: 0 });
+  };
+
+  // Header click cycles ascending -> descending -> unsorted
+  const toggleSort = (column: string) => {
+    const current = query.sort.find((key) => key.column === column);
+    const sort = !current
+      ? [{ column, ascending: true }]
+      : current.ascending
+        ? [{ column, ascending: false }]
+        : [];
+    changeQuery({ ...query, sort });
+  };
+
+  const rowNumbers = Array.from({ length: last - first }, (_, i) => first + i);
 
   return (
     <div className="rich-output dataframe-viewer">
       <div className="rich-output-header">
         <span className="rich-output-type">DataFrame</span>
         <span className="rich-output-shape">
-          {shape[0].toLocaleString()} rows × {shape[1]} columns
-          {truncated && <span className="truncated-badge">truncated</span>}
+          {query.filters.length > 0 && queryTotal !== undefined
+            ? `${queryTotal.toLocaleString()} of ${shape[0].toLocaleString()} rows`
+            : `${shape[0].toLocaleString()} rows`}{' '}
+          × {shape[1]} columns
+          {truncated && !pageable && <span className="truncated-badge">truncated</span>}
         </span>
+        {statsByColumn.size > 0 && (
+          <button
+            className={`stats-toggle${showStats ? ' active' : ''}`}
+            onClick={() => setShowStats(!showStats)}
+            title="Column statistics of the full result"
+          >
+            Σ Stats
+          </button>
+        )}
       </div>
-      <div className="dataframe-table-wrapper">
+      {canQuery && (
+        <FilterBar
+          columns={columns.map(String)}
+          filters={query.filters}
+          onChange={(filters) => changeQuery({ ...query, filters })}
+        />
+      )}
+      <div
+        ref={scrollRef}
+        className={`dataframe-table-wrapper${pageable ? ' dataframe-virtual' : ''}`}
+        style={pageable ? { maxHeight: VIEWPORT_HEIGHT } : undefined}
+        onScroll={pageable ? (e) => setScrollTop(e.currentTarget.scrollTop) : undefined}
+      >
         <table className="dataframe-table">
           <thead>
             <tr>
               <th className="index-header">#</th>
-              {columns.map((col) => (
-                <th key={col} title={data.dtypes?.[col]}>
-                  {col}
-                </th>
-              ))}
+              {columns.map((col) => {
+                const sortKey = query.sort.find((key) => key.column === String(col));
+                return (
+                  <th
+                    key={col}
+                    title={data.dtypes?.[col]}
+                    className={canQuery ? 'sortable' : undefined}
+                    onClick={canQuery ? () => toggleSort(String(col)) : undefined}
+                  >
+                    {col}
+                    {sortKey && <span className="sort-indicator">{sortKey.ascending ? ' ▲' : ' ▼'}</span>}
+                  </th>
+                );
+              })}
             </tr>
-          </thead>
-          <tbody>
-            {rows.map((row, i) => (
-              <tr key={i}>
-                <td className="index-cell">{index ? formatCellValue(index[i]) : i}</td>
+            {showStats && (
+              <tr className="stats-row">
+                <th className="index-header" />
                 {columns.map((col) => (
-                  <td key={col} className={getCellClassName(row[col])}>
-                    {formatCellValue(row[col])}
-                  </td>
+                  <th key={col}>
+                    <ColumnStatsSummary stats={statsByColumn.get(String(col))} />
+                  </th>
                 ))}
               </tr>
-            ))}
+            )}
+          </thead>
+          <tbody>
+            {topSpacer > 0 && <tr className="virtual-spacer" style={{ height: topSpacer }} />}
+            {rowNumbers.map((i) => {
+              const located = rowAt(i);
+              if (!located) {
+                return (
+                  <tr key={i} style={pageable ? { height: ROW_HEIGHT } : undefined}>
+                    <td className="index-cell">{querying ? '' : i}</td>
+                    {columns.map((col) => (
+                      <td key={col} className="cell-null row-placeholder">…</td>
+                    ))}
+                  </tr>
+                );
+              }
+              const { accessor, local } = located;
+              return (
+                <tr key={i} style={pageable ? { height: ROW_HEIGHT } : undefined}>
+                  <td className="index-cell">{formatCellValue(accessor.indexAt(local))}</td>
+                  {columns.map((col, j) => {
+                    const value = accessor.valueAt(local, j);
+                    return (
+                      <td key={col} className={getCellClassName(value)}>
+                        {formatCellValue(value)}
+                      </td>
+                    );
+                  })}
+                </tr>
+              );
+            })}
+            {bottomSpacer > 0 && <tr className="virtual-spacer" style={{ height: bottomSpacer }} />}
           </tbody>
         </table>
       </div>
-      {truncated && (
+      {truncated && !pageable && (
         <div className="truncated-notice">
           Showing first 100 of {shape[0].toLocaleString()} rows
         </div>
       )}
+      {pageable && pageError && (
+        <div className="truncated-notice">
+          {pageError.startsWith('QueryError')
+            ? pageError
+            : 'The full result is no longer held by the kernel; re-run the cell to browse it'}
+        </div>
+      )}
     </div>
   );
 }
 
+/**
+ * Formats a count, marking estimates with ≈.
+ */
+function formatCount(value: number, exact: boolean): string {
+  return `${exact ? '' : '≈'}${value.toLocaleString()}`;
+}
+
+/**
+ * Compact per-column summary: histogram or top values, plus key figures.
+ * The full figures are in the tooltip.
+ */
+function ColumnStatsSummary({ stats }: { stats?: ColumnStats }) {
+  if (!stats) {
+    return <span className="cell-null">—</span>;
+  }
+
+  const details = [
+    `${formatCount(stats.count, !stats.sampled)} non-null`,
+    `${formatCount(stats.null_count, !stats.sampled)} null`,
+    stats.distinct != null ? `${formatCount(stats.distinct, stats.distinct_exact)} distinct` : null,
+    stats.min != null ? `min ${formatCellValue(stats.min)}` : null,
+    stats.max != null ? `max ${formatCellValue(stats.max)}` : null,
+    stats.mean != null ? `mean ${formatCellValue(stats.mean)}` : null,
+    stats.sampled ? 'histogram/top values from a sample' : null,
+  ].filter((line): line is string => line !== null);
+
+  return (
+    <div className="column-stats" title={details.join('\n')}>
+      {stats.histogram && <MiniHistogram counts={stats.histogram.counts} />}
+      {stats.top_values && (
+        <div className="column-stats-top">
+          {stats.top_values.slice(0, 3).map((entry, i) => (
+            <div key={i}>
+              {formatCellValue(entry.value)} <span className="column-stats-count">{entry.count.toLocaleString()}</span>
+            </div>
+          ))}
+        </div>
+      )}
+      <div className="column-stats-figures">
+        {stats.null_count > 0 ? `${formatCount(stats.null_count, !stats.sampled)} null` : 'no nulls'}
+        {stats.distinct != null && ` · ${formatCount(stats.distinct, stats.distinct_exact)} distinct`}
+      </div>
+    </div>
+  );
+}
+
+/**
+ * Renders histogram counts as an inline bar chart.
+ */
+function MiniHistogram({ counts }: { counts: number[] }) {
+  const width = 96;
+  const height = 28;
+  const peak = Math.max(1, ...counts);
+  const barWidth = width / Math.max(1, counts.length);
+
+  return (
+    <svg className="mini-histogram" width={width} height={height} viewBox={`0 0 ${width} ${height}`}>
+      {counts.map((count, i) => {
+        const barHeight = count === 0 ? 0 : Math.max(1, (count / peak) * height);
+        return (
+          <rect
+            key={i}
+            x={i * barWidth}
+            y={height - barHeight}
+            width={Math.max(1, barWidth - 1)}
+            height={barHeight}
+          />
+        );
+      })}
+    </svg>
+  );
+}
+
+interface FilterBarProps {
+  columns: string[];
+  filters: RowFilter[];
+  onChange: (filters: RowFilter[]) => void;
+}
+
+/**
+ * Lists the active row filters and adds new ones (combined with AND).
+ */
+function FilterBar({ columns, filters, onChange }: FilterBarProps) {
+  const [column, setColumn] = useState(columns[0] ?? '');
+  const [op, setOp] = useState<FilterOp>('==');
+  const [value, setValue] = useState('');
+  const needsValue = needsValueFor(op);
+
+  const addFilter = (e: React.FormEvent) => {
+    e.preventDefault();
+    if (!column || (needsValue && value === '')) {
+      return;
+    }
+    onChange([...filters, { column, op, value: needsValue ? value : null }]);
+    setValue('');
+  };
+
+  return (
+    <form className="dataframe-filter-bar" onSubmit={addFilter}>
+      {filters.map((f, i) => (
+        <span key={i} className="filter-chip">
+          {f.column} {f.op}{needsValueFor(f.op) ? ` ${f.value}` : ''}
+          <button
+            type="button"
+            className="filter-chip-remove"
+            onClick={() => onChange(filters.filter((_, j) => j !== i))}
+            title="Remove filter"
+          >
+            ✕
+          </button>
+        </span>
+      ))}
+      <select value={column} onChange={(e) => setColumn(e.target.value)}>
+        {columns.map((col) => (
+          <option key={col} value={col}>{col}</option>
+        ))}
+      </select>
+      <select value={op} onChange={(e) => setOp(e.target.value as FilterOp)}>
+        {FILTER_OPS.map((filterOp) => (
+          <option key={filterOp} value={filterOp}>{filterOp}</option>
+        ))}
+      </select>
+      {needsValue && (
+        <input value={value} onChange={(e) => setValue(e.target.value)} placeholder="value" />
+      )}
+      <button type="submit" className="btn">Filter</button>
+    </form>
+  );
+}
+
+function needsValueFor(op: FilterOp): boolean {
+  return op !== 'isnull' && op !== 'notnull';
+}
+
 /**
  * Renders a pandas Series as a styled table.
  */
@@ -134,15 +531,24 @@ function SeriesViewer({ data }: { data: RichOutput }) {
   );
 }
 
+const SAMPLING_LABELS: Record<ArraySampling['method'], string> = {
+  minmax: 'min/max per bucket',
+  lttb: 'largest-triangle-three-buckets',
+  stride: 'evenly spaced',
+  blockmean: 'block means',
+};
+
 /**
  * Renders a numpy ndarray.
  */
 function NdarrayViewer({ data }: { data: RichOutput }) {
-  const { shape, truncated, dtype } = data;
+  const { shape, truncated, dtype, sampling } = data;
   const arrayData = data.data;
 
   // Check if 2D array
   const is2D = Array.isArray(arrayData[0]);
+  const rowPositions = sampling?.positions[0];
+  const colPositions = is2D ? sampling?.positions[1] : undefined;
 
   return (
     <div className="rich-output ndarray-viewer">
@@ -150,7 +556,12 @@ function NdarrayViewer({ data }: { data: RichOutput }) {
         <span className="rich-output-type">ndarray</span>
         <span className="rich-output-shape">
           shape=({shape.join(', ')}) dtype={dtype}
-          {truncated && <span className="truncated-badge">truncated</span>}
+          {truncated && !sampling && <span className="truncated-badge">truncated</span>}
+          {sampling && (
+            <span className="sampled-badge" title={SAMPLING_LABELS[sampling.method]}>
+              downsampled: {sampling.method}
+            </span>
+          )}
         </span>
       </div>
       {is2D ? (
@@ -160,14 +571,14 @@ function NdarrayViewer({ data }: { data: RichOutput }) {
               <tr>
                 <th className="index-header">#</th>
                 {(arrayData[0] as any[]).map((_, colIdx) => (
-                  <th key={colIdx}>[{colIdx}]</th>
+                  <th key={colIdx}>[{colPositions ? colPositions[colIdx] : colIdx}]</th>
                 ))}
               </tr>
             </thead>
             <tbody>
               {(arrayData as any[][]).map((row, rowIdx) => (
                 <tr key={rowIdx}>
-                  <td className="index-cell">{rowIdx}</td>
+                  <td className="index-cell">{rowPositions ? rowPositions[rowIdx] : rowIdx}</td>
                   {row.map((val, colIdx) => (
                     <td key={colIdx} className={getCellClassName(val)}>
                       {formatCellValue(val)}
@@ -180,21 +591,76 @@ function NdarrayViewer({ data }: { data: RichOutput }) {
         </div>
       ) : (
         <div className="ndarray-1d">
+          {rowPositions && (
+            <Sparkline values={arrayData as any[]} positions={rowPositions} length={shape[0]} />
+          )}
           <code>
             [{(arrayData as any[]).slice(0, 20).map(formatCellValue).join(', ')}
             {(arrayData as any[]).length > 20 ? ', ...' : ''}]
           </code>
         </div>
       )}
-      {truncated && (
+      {truncated && !sampling && (
         <div className="truncated-notice">
           Array truncated for display
         </div>
       )}
+      {sampling && (
+        <div className="truncated-notice">
+          Preview of the whole array reduced to {SAMPLING_LABELS[sampling.method]}
+          {sampling.method === 'blockmean' ? ' (labels are block starts)' : ''}
+        </div>
+      )}
     </div>
   );
 }
 
+/**
+ * Plots a downsampled 1-D array as a line over its original positions.
+ * Non-numeric and non-finite values leave gaps.
+ */
+function Sparkline({ values, positions, length }: { values: any[]; positions: number[]; length: number }) {
+  const width = 600;
+  const height = 80;
+  const numeric = values.map((v) => (typeof v === 'number' ? v : typeof v === 'boolean' ? Number(v) : null));
+  const finite = numeric.filter((v): v is number => v !== null);
+  if (finite.length === 0) {
+    return null;
+  }
+
+  let low = Infinity;
+  let high = -Infinity;
+  for (const v of finite) {
+    low = Math.min(low, v);
+    high = Math.max(high, v);
+  }
+  const span = high - low || 1;
+  const xScale = width / Math.max(1, length - 1);
+
+  // One polyline segment per run of finite values
+  const segments: string[] = [];
+  let current: string[] = [];
+  numeric.forEach((v, i) => {
+    if (v === null) {
+      if (current.length) segments.push(current.join(' '));
+      current = [];
+      return;
+    }
+    const x = positions[i] * xScale;
+    const y = height - ((v - low) / span) * (height - 2) - 1;
+    current.push(`${x.toFixed(1)},${y.toFixed(1)}`);
+  });
+  if (current.length) segments.push(current.join(' '));
+
+  return (
+    <svg className="sparkline" viewBox={`0 0 ${width} ${height}`} preserveAspectRatio="none">
+      {segments.map((points, i) => (
+        <polyline key={i} points={points} />
+      ))}
+    </svg>
+  );
+}
+
 /**
  * Returns a CSS class based on the cell value type.
  */
@@ -214,10 +680,10 @@ function getCellClassName(value: any): string {
 /**
  * Main component that routes to the appropriate viewer based on rich output type.
  */
-export function RichOutputViewer({ data }: RichOutputViewerProps) {
+export function RichOutputViewer({ data, rowWindows, onFetchRows }: RichOutputViewerProps) {
   switch (data.type) {
     case 'dataframe':
-      return <DataFrameViewer data={data} />;
+      return <DataFrameViewer data={data} rowWindows={rowWindows} onFetchRows={onFetchRows} />;
     case 'series':
       return <SeriesViewer data={data} />;
     case 'ndarray':
@@ -0,0 +1,392 @@
+/**
+ * Reader for DataFrame rows sent as an Arrow IPC stream (see
+ * kernel._frame_to_arrow), decoded into the columnar form the
+ * DataFrame viewer reads.
+ *
+ * Only what the kernel sends is supported: one schema of flat columns of
+ * integers, floats, booleans, UTF-8 strings, timestamps and dates, any of
+ * them dictionary-encoded (categoricals), without body compression.
+ */
+
+import type { RichOutput } from './types';
+
+// Message header union
+const HEADER_SCHEMA = 1;
+const HEADER_DICTIONARY_BATCH = 2;
+const HEADER_RECORD_BATCH = 3;
+
+// Type union
+const TYPE_NULL = 1;
+const TYPE_INT = 2;
+const TYPE_FLOAT = 3;
+const TYPE_UTF8 = 5;
+const TYPE_BOOL = 6;
+const TYPE_DATE = 8;
+const TYPE_TIMESTAMP = 10;
+
+const PRECISION_SINGLE = 1;
+const PRECISION_DOUBLE = 2;
+const DATE_DAY = 0;
+const MS_PER_DAY = 86400000;
+
+// Timestamp units (second to nanosecond): ticks per second and fraction digits
+const TICKS_PER_SECOND = [BigInt(1), BigInt(1000), BigInt(1000000), BigInt(1000000000)];
+const FRACTION_DIGITS = [0, 3, 6, 9];
+
+// Marks the start of each message (streams from before Arrow 0.15 omit it)
+const CONTINUATION = 0xffffffff;
+
+const textDecoder = new TextDecoder();
+
+/**
+ * A flatbuffers table: fields are found through the table's vtable and
+ * read little-endian; absent fields read as their defaults.
+ */
+class Table {
+  private view: DataView;
+  private pos: number;
+
+  constructor(view: DataView, pos: number) {
+    this.view = view;
+    this.pos = pos;
+  }
+
+  static root(view: DataView): Table {
+    return new Table(view, view.getUint32(0, true));
+  }
+
+  private field(id: number): number {
+    const vtable = this.pos - this.view.getInt32(this.pos, true);
+    const entry = 4 + 2 * id;
+    if (entry >= this.view.getUint16(vtable, true)) {
+      return 0;
+    }
+    const offset = this.view.getUint16(vtable + entry, true);
+    return offset ? this.pos + offset : 0;
+  }
+
+  private target(id: number): number {
+    const pos = this.field(id);
+    return pos ? pos + this.view.getUint32(pos, true) : 0;
+  }
+
+  uint8(id: number, fallback = 0): number {
+    const pos = this.field(id);
+    return pos ? this.view.getUint8(pos) : fallback;
+  }
+
+  int16(id: number, fallback = 0): number {
+    const pos = this.field(id);
+    return pos ? this.view.getInt16(pos, true) : fallback;
+  }
+
+  int32(id: number, fallback = 0): number {
+    const pos = this.field(id);
+    return pos ? this.view.getInt32(pos, true) : fallback;
+  }
+
+  int64(id: number, fallback = 0): number {
+    const pos = this.field(id);
+    return pos ? Number(this.view.getBigInt64(pos, true)) : fallback;
+  }
+
+  has(id: number): boolean {
+    return this.field(id) !== 0;
+  }
+
+  table(id: number): Table | null {
+    const pos = this.target(id);
+    return pos ? new Table(this.view, pos) : null;
+  }
+
+  string(id: number): string | null {
+    const pos = this.target(id);
+    if (!pos) {
+      return null;
+    }
+    const length = this.view.getUint32(pos, true);
+    return textDecoder.decode(
+      new Uint8Array(this.view.buffer, this.view.byteOffset + pos + 4, length)
+    );
+  }
+
+  tables(id: number): Table[] {
+    const pos = this.target(id);
+    if (!pos) {
+      return [];
+    }
+    const tables = [];
+    for (let i = 0; i < this.view.getUint32(pos, true); i++) {
+      const element = pos + 4 + 4 * i;
+      tables.push(new Table(this.view, element + this.view.getUint32(element, true)));
+    }
+    return tables;
+  }
+
+  /** A vector of structs of int64 fields, as rows of numbers. */
+  int64Structs(id: number, width: number): number[][] {
+    const pos = this.target(id);
+    if (!pos) {
+      return [];
+    }
+    const rows = [];
+    for (let i = 0; i < this.view.getUint32(pos, true); i++) {
+      const start = pos + 4 + 8 * width * i;
+      const row = [];
+      for (let j = 0; j < width; j++) {
+        row.push(Number(this.view.getBigInt64(start + 8 * j, true)));
+      }
+      rows.push(row);
+    }
+    return rows;
+  }
+}
+
+interface ArrowType {
+  kind: number;
+  bitWidth: number;  // Int
+  signed: boolean;  // Int
+  precision: number;  // FloatingPoint
+  unit: number;  // Date, Timestamp
+  timezone: string | null;  // Timestamp
+}
+
+interface ArrowField {
+  type: ArrowType;
+  dictionaryId: number | null;
+  indexType: ArrowType | null;  // Of dictionary-encoded fields
+}
+
+function intType(table: Table | null): ArrowType {
+  // Dictionary indices default to int32
+  return {
+    kind: TYPE_INT,
+    bitWidth: table ? table.int32(0) : 32,
+    signed: table ? table.uint8(1) !== 0 : true,
+    precision: 0,
+    unit: 0,
+    timezone: null,
+  };
+}
+
+function readField(field: Table): ArrowField {
+  const kind = field.uint8(2);
+  const typeTable = field.table(3);
+  const type: ArrowType = kind === TYPE_INT
+    ? intType(typeTable)
+    : {
+        kind,
+        bitWidth: 0,
+        signed: false,
+        precision: kind === TYPE_FLOAT ? typeTable?.int16(0) ?? 0 : 0,
+        // Dates default to milliseconds, timestamps to seconds
+        unit: kind === TYPE_DATE ? typeTable?.int16(0, 1) ?? 1 : typeTable?.int16(0) ?? 0,
+        timezone: kind === TYPE_TIMESTAMP ? typeTable?.string(1) ?? null : null,
+      };
+  const dictionary = field.table(4);
+  return {
+    type,
+    dictionaryId: dictionary ? dictionary.int64(0) : null,
+    indexType: dictionary ? intType(dictionary.table(1)) : null,
+  };
+}
+
+function dataView(data: Uint8Array): DataView {
+  return new DataView(data.buffer, data.byteOffset, data.byteLength);
+}
+
+function readInt(view: DataView, type: ArrowType, i: number): number {
+  switch (type.bitWidth) {
+    case 8: return type.signed ? view.getInt8(i) : view.getUint8(i);
+    case 16: return type.signed ? view.getInt16(2 * i, true) : view.getUint16(2 * i, true);
+    case 32: return type.signed ? view.getInt32(4 * i, true) : view.getUint32(4 * i, true);
+    default: return Number(type.signed ? view.getBigInt64(8 * i, true) : view.getBigUint64(8 * i, true));
+  }
+}
+
+/**
+ * Formats a timestamp like the JSON encoding of a datetime: ISO 8601
+ * without trailing zero fractions, in UTC marked 'Z' if it has a time zone.
+ */
+function formatTimestamp(ticks: bigint, unit: number, timezone: string | null): string {
+  const perSecond = TICKS_PER_SECOND[unit];
+  let seconds = ticks / perSecond;
+  let fraction = ticks % perSecond;
+  if (fraction < BigInt(0)) {
+    fraction += perSecond;
+    seconds -= BigInt(1);
+  }
+  let text = new Date(Number(seconds) * 1000).toISOString().slice(0, 19);
+  if (fraction !== BigInt(0)) {
+    text += '.' + fraction.toString().padStart(FRACTION_DIGITS[unit], '0');
+  }
+  return timezone ? text + 'Z' : text;
+}
+
+/**
+ * Returns a reader of the value at a position of a column's data buffers
+ * (only called for positions that are not null).
+ */
+function valueReader(type: ArrowType, buffers: Uint8Array[]): (i: number) => any {
+  const data = buffers[0];
+  const view = dataView(data);
+  switch (type.kind) {
+    case TYPE_INT:
+      return (i) => readInt(view, type, i);
+    case TYPE_FLOAT:
+      if (type.precision === PRECISION_DOUBLE && data.byteOffset % 8 === 0) {
+        const floats = new Float64Array(data.buffer, data.byteOffset, data.byteLength / 8);
+        return (i) => floats[i];
+      }
+      if (type.precision === PRECISION_DOUBLE) {
+        return (i) => view.getFloat64(8 * i, true);
+      }
+      if (type.precision === PRECISION_SINGLE) {
+        return (i) => view.getFloat32(4 * i, true);
+      }
+      throw new Error('Unsupported Arrow half-precision column');
+    case TYPE_BOOL:
+      return (i) => ((data[i >> 3] >> (i & 7)) & 1) === 1;
+    case TYPE_UTF8: {
+      const chars = buffers[1];
+      return (i) => textDecoder.decode(chars.subarray(view.getInt32(4 * i, true), view.getInt32(4 * i + 4, true)));
+    }
+    case TYPE_DATE:
+      return type.unit === DATE_DAY
+        ? (i) => new Date(view.getInt32(4 * i, true) * MS_PER_DAY).toISOString().slice(0, 10)
+        : (i) => new Date(Number(view.getBigInt64(8 * i, true))).toISOString().slice(0, 10);
+    case TYPE_TIMESTAMP:
+      return (i) => formatTimestamp(view.getBigInt64(8 * i, true), type.unit, type.timezone);
+    default:
+      throw new Error(`Unsupported Arrow column type ${type.kind}`);
+  }
+}
+
+/**
+ * Decodes the values of one column. Missing values read as 'NaN' in
+ * float columns and null otherwise, as in the columnar JSON encoding.
+ */
+function readValues(type: ArrowType, length: number, validity: Uint8Array, buffers: Uint8Array[]): any[] {
+  const values = new Array(length);
+  if (type.kind === TYPE_NULL) {
+    return values.fill(null);
+  }
+  const read = valueReader(type, buffers);
+  const missing = type.kind === TYPE_FLOAT ? 'NaN' : null;
+  for (let i = 0; i < length; i++) {
+    values[i] = validity.length > 0 && ((validity[i >> 3] >> (i & 7)) & 1) === 0 ? missing : read(i);
+  }
+  return values;
+}
+
+/**
+ * Decodes a record batch (or a dictionary batch's values) into one value
+ * array per field.
+ */
+function readBatch(
+  batch: Table,
+  body: Uint8Array,
+  fields: ArrowField[],
+  dictionaries: Map<number, any[]>
+): any[][] {
+  if (batch.has(3)) {
+    throw new Error('Compressed Arrow record batches are not supported');
+  }
+  const nodes = batch.int64Structs(1, 2);
+  const buffers = batch.int64Structs(2, 2).map(([offset, length]) => body.subarray(offset, offset + length));
+  let nextBuffer = 0;
+  return fields.map((field, position) => {
+    const [length, nullCount] = nodes[position];
+    const type = field.indexType ?? field.type;
+    if (type.kind === TYPE_NULL) {
+      return readValues(type, length, new Uint8Array(0), []);
+    }
+    const validity = buffers[nextBuffer++];
+    const count = type.kind === TYPE_UTF8 ? 2 : 1;
+    const values = readValues(
+      type, length, nullCount > 0 ? validity : new Uint8Array(0), buffers.slice(nextBuffer, nextBuffer + count)
+    );
+    nextBuffer += count;
+    if (field.indexType === null) {
+      return values;
+    }
+    const dictionary = dictionaries.get(field.dictionaryId!) ?? [];
+    return values.map((index) => (index === null ? null : dictionary[index]));
+  });
+}
+
+/**
+ * Decodes an Arrow IPC stream into one value array per schema field.
+ */
+export function readArrowStream(bytes: Uint8Array): any[][] {
+  const view = dataView(bytes);
+  const dictionaries = new Map<number, any[]>();
+  let fields: ArrowField[] = [];
+  let columns: any[][] | null = null;
+  let pos = 0;
+
+  while (pos + 4 <= bytes.byteLength) {
+    let metadataLength = view.getUint32(pos, true);
+    pos += 4;
+    if (metadataLength === CONTINUATION) {
+      metadataLength = view.getUint32(pos, true);
+      pos += 4;
+    }
+    if (metadataLength === 0) {
+      break;  // End of stream
+    }
+    const message = Table.root(new DataView(bytes.buffer, bytes.byteOffset + pos, metadataLength));
+    pos += metadataLength;
+    const bodyLength = message.int64(3);
+    const body = bytes.subarray(pos, pos + bodyLength);
+    pos += bodyLength;
+    const header = message.table(2);
+    if (header === null) {
+      continue;
+    }
+
+    switch (message.uint8(1)) {
+      case HEADER_SCHEMA:
+        fields = header.tables(1).map(readField);
+        break;
+      case HEADER_DICTIONARY_BATCH: {
+        const id = header.int64(0);
+        const field = fields.find((f) => f.dictionaryId === id);
+        const batch = header.table(1);
+        if (field && batch) {
+          const [values] = readBatch(
+            batch, body, [{ type: field.type, dictionaryId: null, indexType: null }], dictionaries
+          );
+          const isDelta = header.uint8(2) !== 0;
+          dictionaries.set(id, isDelta ? (dictionaries.get(id) ?? []).concat(values) : values);
+        }
+        break;
+      }
+      case HEADER_RECORD_BATCH: {
+        const batchColumns = readBatch(header, body, fields, dictionaries);
+        columns = columns ? columns.map((column, i) => column.concat(batchColumns[i])) : batchColumns;
+        break;
+      }
+    }
+  }
+  return columns ?? fields.map(() => []);
+}
+
+/**
+ * Returns a DataFrame output sent as Arrow with its rows decoded into the
+ * columnar form, from `stream` or the bytes sent along with it. Outputs
+ * whose stream is not at hand yet (nor any other output) are returned as
+ * they are.
+ */
+export function decodeArrowOutput<T extends RichOutput | null | undefined>(output: T, stream?: Uint8Array): T {
+  if (!output || output.format !== 'arrow') {
+    return output;
+  }
+  const bytes = stream ?? output.attachments?.[output.data.digest];
+  if (!bytes) {
+    return output;
+  }
+  const [index, ...data] = readArrowStream(bytes);
+  const { attachments: _attachments, ...rest } = output;
+  return { ...rest, format: 'columnar', index, data, nulls: undefined } as T;
+}
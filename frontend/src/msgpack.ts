@@ -0,0 +1,166 @@
+/**
+ * MessagePack decoding of server messages (the binary WebSocket protocol)
+ *
+ * Numeric lists arrive as a typed-array extension: one dtype byte, then the
+ * values as little-endian float64 or int32. They decode to plain arrays,
+ * with non-finite floats as the "NaN" / "Infinity" / "-Infinity" strings
+ * that the JSON protocol uses, so both protocols yield the same messages.
+ */
+
+const TYPED_ARRAY_EXT = 1;
+const TYPED_FLOAT64 = 0;
+const TYPED_INT32 = 1;
+
+const SHORT_STRING_BYTES = 32;
+
+const textDecoder = new TextDecoder();
+
+function decodeTypedArray(data: Uint8Array): (number | string)[] {
+  const view = new DataView(data.buffer, data.byteOffset + 1, data.byteLength - 1);
+  if (data[0] === TYPED_INT32) {
+    const values = new Array<number>(view.byteLength / 4);
+    for (let i = 0; i < values.length; i++) {
+      values[i] = view.getInt32(i * 4, true);
+    }
+    return values;
+  }
+  if (data[0] !== TYPED_FLOAT64) {
+    throw new Error(`Unknown typed array dtype ${data[0]}`);
+  }
+  const values = new Array<number | string>(view.byteLength / 8);
+  for (let i = 0; i < values.length; i++) {
+    const value = view.getFloat64(i * 8, true);
+    if (Number.isFinite(value)) {
+      values[i] = value;
+    } else {
+      values[i] = Number.isNaN(value) ? 'NaN' : value > 0 ? 'Infinity' : '-Infinity';
+    }
+  }
+  return values;
+}
+
+export function decodeMsgpack(buffer: ArrayBuffer): unknown {
+  const bytes = new Uint8Array(buffer);
+  const view = new DataView(buffer);
+  let offset = 0;
+
+  const u8 = () => view.getUint8(offset++);
+  const u16 = () => {
+    const value = view.getUint16(offset);
+    offset += 2;
+    return value;
+  };
+  const u32 = () => {
+    const value = view.getUint32(offset);
+    offset += 4;
+    return value;
+  };
+  // 64-bit integers lose precision past 2^53, as they do in JSON.parse
+  const u64 = () => u32() * 2 ** 32 + u32();
+  const i64 = () => {
+    const high = view.getInt32(offset);
+    offset += 4;
+    return high * 2 ** 32 + u32();
+  };
+
+  const take = (length: number) => {
+    const data = bytes.subarray(offset, offset + length);
+    offset += length;
+    return data;
+  };
+  const str = (length: number) => {
+    const data = take(length);
+    // TextDecoder has a fixed cost that dominates for short keys and values
+    if (length <= SHORT_STRING_BYTES) {
+      let ascii = '';
+      for (let i = 0; i < length; i++) {
+        if (data[i] >= 0x80) {
+          return textDecoder.decode(data);
+        }
+        ascii += String.fromCharCode(data[i]);
+      }
+      return ascii;
+    }
+    return textDecoder.decode(data);
+  };
+  const ext = (length: number) => {
+    const type = view.getInt8(offset++);
+    const data = take(length);
+    return type === TYPED_ARRAY_EXT ? decodeTypedArray(data) : data.slice();
+  };
+  const array = (length: number) => {
+    const values = new Array<unknown>(length);
+    for (let i = 0; i < length; i++) {
+      values[i] = read();
+    }
+    return values;
+  };
+  const map = (length: number) => {
+    const object: Record<string, unknown> = {};
+    for (let i = 0; i < length; i++) {
+      const key = String(read());
+      object[key] = read();
+    }
+    return object;
+  };
+
+  function read(): unknown {
+    const byte = u8();
+    if (byte <= 0x7f) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if (byte >= 0xa0 && byte <= 0xbf) return str(byte & 0x1f);
+    if (byte >= 0x90 && byte <= 0x9f) return array(byte & 0x0f);
+    if (byte >= 0x80 && byte <= 0x8f) return map(byte & 0x0f);
+
+    let value: number;
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return take(u8()).slice();
+      case 0xc5: return take(u16()).slice();
+      case 0xc6: return take(u32()).slice();
+      case 0xc7: return ext(u8());
+      case 0xc8: return ext(u16());
+      case 0xc9: return ext(u32());
+      case 0xca:
+        value = view.getFloat32(offset);
+        offset += 4;
+        return value;
+      case 0xcb:
+        value = view.getFloat64(offset);
+        offset += 8;
+        return value;
+      case 0xcc: return u8();
+      case 0xcd: return u16();
+      case 0xce: return u32();
+      case 0xcf: return u64();
+      case 0xd0: return view.getInt8(offset++);
+      case 0xd1:
+        value = view.getInt16(offset);
+        offset += 2;
+        return value;
+      case 0xd2:
+        value = view.getInt32(offset);
+        offset += 4;
+        return value;
+      case 0xd3: return i64();
+      case 0xd4: return ext(1);
+      case 0xd5: return ext(2);
+      case 0xd6: return ext(4);
+      case 0xd7: return ext(8);
+      case 0xd8: return ext(16);
+      case 0xd9: return str(u8());
+      case 0xda: return str(u16());
+      case 0xdb: return str(u32());
+      case 0xdc: return array(u16());
+      case 0xdd: return array(u32());
+      case 0xde: return map(u16());
+      case 0xdf: return map(u32());
+      default:
+        throw new Error(`Invalid MessagePack byte 0x${byte.toString(16)} at ${offset - 1}`);
+    }
+  }
+
+  return read();
+}
@@ -6,9 +6,46 @@ export type CellStatus = 'idle' | 'running' | 'success' | 'error';
 
 export type RichOutputType = 'dataframe' | 'series' | 'ndarray';
 
+export interface Histogram {
+  edges: number[];  // One more entry than counts
+  counts: number[];
+}
+
+export interface ValueCount {
+  value: any;
+  count: number;
+}
+
+// How a large ndarray preview was reduced from the full array
+export interface ArraySampling {
+  method: 'minmax' | 'lttb' | 'stride' | 'blockmean';
+  positions: number[][];  // Original position of each element per axis (block start for blockmean)
+}
+
+// Summary of one DataFrame column, computed in the kernel
+export interface ColumnStats {
+  column: string;
+  dtype: string;
+  count: number;  // Non-null values
+  null_count: number;
+  min?: any;
+  max?: any;
+  mean?: number | string | null;
+  distinct?: number | null;  // null if the time budget ran out
+  distinct_exact: boolean;  // false for sketch estimates
+  histogram?: Histogram | null;  // Numeric columns
+  top_values?: ValueCount[] | null;  // Other columns
+  sampled: boolean;  // Nulls, histogram and top values from a row sample
+}
+
+// DataFrame data encodings
+export type FrameFormat = 'records' | 'columnar' | 'arrow';
+
 export interface RichOutput {
   type: RichOutputType;
-  data: any;  // Array of records for DataFrame, dict for Series, array for ndarray
+  data: any;  // Array of records (or column arrays, or an Arrow stream's OutputRef) for DataFrame, dict for Series, array for ndarray
+  format?: FrameFormat;  // DataFrame data encoding (defaults to 'records'; 'arrow' is decoded to 'columnar', see arrow.ts)
+  nulls?: (string | null)[];  // Columnar: base64 null bitmap per column, null if no missing values
   columns?: string[];  // Column names for DataFrame
   dtypes?: Record<string, string>;  // Data types per column
   dtype?: string;  // Single dtype for Series or ndarray
@@ -16,6 +53,24 @@ export interface RichOutput {
   name?: string | null;  // Series name
   shape: number[];  // Shape of the data
   truncated: boolean;  // Whether data was truncated
+  column_stats?: ColumnStats[] | null;  // DataFrame column summaries
+  sampling?: ArraySampling | null;  // Downsampled ndarray previews
+  attachments?: Record<string, Uint8Array>;  // Binary data referred to by digest (MessagePack protocol only)
+}
+
+export interface VariableSummary {
+  name: string;
+  type: string;
+  shape?: number[] | null;
+  dtype?: string | null;
+  size: number;  // Approximate deep size in bytes
+  repr: string;  // Short, truncated repr
+}
+
+// Output left out of a message; fetched from GET /api/blobs/{digest}
+export interface OutputRef {
+  digest: string;
+  size: number;  // Encoded size in bytes
 }
 
 export interface Cell {
@@ -25,6 +80,10 @@ export interface Cell {
   rich_output?: RichOutput | null;  // Structured output for DataFrames etc.
   error: string;
   status: CellStatus;
+  peak_memory_delta?: number | null;  // Peak memory growth in bytes during last run
+  rich_pending?: boolean;  // Rich output is still being rendered
+  rich_output_ref?: OutputRef | null;  // Set instead of rich_output when it is large
+  output_omitted?: boolean;  // Outputs not sent: the cell was out of view when it ran
 }
 
 // Frontend → Backend Messages
@@ -54,18 +113,69 @@ export interface InterruptMessage {
   type: 'interrupt';
 }
 
+export interface InspectVariablesMessage {
+  type: 'inspect_variables';
+  names?: string[] | null;  // All variables if omitted
+}
+
+// Row queries run on a retained DataFrame result in the kernel
+export type FilterOp = '==' | '!=' | '<' | '<=' | '>' | '>=' | 'contains' | 'isnull' | 'notnull';
+
+export interface SortKey {
+  column: string;
+  ascending: boolean;
+}
+
+export interface RowFilter {
+  column: string;
+  op: FilterOp;
+  value: any;  // Unused for isnull/notnull
+}
+
+export interface RowQuery {
+  sort: SortKey[];
+  filters: RowFilter[];  // Combined with AND
+}
+
+export interface FetchRowsMessage {
+  type: 'fetch_rows';
+  cell_id: string;
+  offset: number;
+  limit: number;
+  query?: RowQuery | null;  // Sort/filter the result before windowing
+}
+
+// Cells scrolled into view: send their outputs from now on
+export interface SubscribeMessage {
+  type: 'subscribe';
+  cell_ids: string[];
+  missing: string[];  // Of those, cells without current outputs
+}
+
+// Cells scrolled out of view: status updates are enough
+export interface UnsubscribeMessage {
+  type: 'unsubscribe';
+  cell_ids: string[];
+}
+
 export type ClientMessage = 
   | CellUpdatedMessage 
   | ExecuteCellMessage 
   | AddCellMessage 
   | DeleteCellMessage
-  | InterruptMessage;
+  | InterruptMessage
+  | InspectVariablesMessage
+  | FetchRowsMessage
+  | SubscribeMessage
+  | UnsubscribeMessage;
 
 // Backend → Frontend Messages
 
 export interface NotebookStateMessage {
   type: 'notebook_state';
   cells: Cell[];
+  session: string;  // Server session; sequence numbers restart with it
+  seq: number;  // Sequence number of the latest broadcast reflected in cells
 }
 
 export interface CellAddedMessage {
@@ -91,6 +201,26 @@ export interface ExecutionResultMessage {
   output: string;
   rich_output?: RichOutput | null;
   error: string;
+  peak_memory_delta?: number | null;
+  rich_pending?: boolean;  // rich_output follows in a rich_output_ready message
+  output_omitted?: boolean;  // output and rich_output left out: the cell is not subscribed
+}
+
+// Deferred rich output of a result sent earlier with rich_pending
+export interface RichOutputReadyMessage {
+  type: 'rich_output_ready';
+  cell_id: string;
+  rich_output?: RichOutput | null;
+  error: string;  // Why no rich output could be rendered, if so
+}
+
+// Current outputs of a cell, sent on subscribing after they were left out
+export interface CellOutputMessage {
+  type: 'cell_output';
+  cell_id: string;
+  output: string;
+  rich_output?: RichOutput | null;
+  rich_pending?: boolean;
 }
 
 export interface ExecutionQueueMessage {
@@ -110,13 +240,49 @@ export interface ErrorMessage {
   message: string;
 }
 
-export type ServerMessage = 
+export interface VariableSummariesMessage {
+  type: 'variable_summaries';
+  variables: VariableSummary[];  // Largest first
+  error: string;
+}
+
+export interface NamespaceReclaimedMessage {
+  type: 'namespace_reclaimed';
+  names: string[];
+  approx_bytes: number;
+  freed_bytes?: number | null;
+}
+
+export interface RowsWindowMessage {
+  type: 'rows_window';
+  cell_id: string;
+  query?: RowQuery | null;  // Query the window was taken from
+  offset: number;  // Row number of the first row in data
+  total_rows: number;  // Rows in the (filtered) result
+  format: FrameFormat;
+  data: any;  // Records or column arrays, as in RichOutput
+  index: any[];
+  nulls?: (string | null)[] | null;
+  error: string;
+}
+
+// Fetched row windows of one DataFrame output, by query key and offset
+export type RowWindows = Record<string, Record<number, RowsWindowMessage>>;
+
+// Broadcast messages carry their sequence number (replies to one client do not)
+export type ServerMessage = (
   | NotebookStateMessage 
   | CellAddedMessage 
   | CellDeletedMessage 
   | ExecutionStartedMessage 
   | ExecutionResultMessage 
+  | RichOutputReadyMessage
+  | CellOutputMessage
   | ExecutionQueueMessage
   | ExecutionInterruptedMessage
-  | ErrorMessage;
+  | ErrorMessage
+  | VariableSummariesMessage
+  | NamespaceReclaimedMessage
+  | RowsWindowMessage
+) & { seq?: number };
 
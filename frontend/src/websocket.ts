@@ -1,8 +1,13 @@
 /**
  * WebSocket client utilities for the reactive notebook
  */
+import { decodeMsgpack } from './msgpack';
 import type { ClientMessage, ServerMessage } from './types';
 
+// Offered in order of preference; the server picks MessagePack if it can.
+// Either way it may send JSON text frames, and the client always sends JSON.
+const PROTOCOLS = ['notebook.msgpack', 'notebook.json'];
+
 export type MessageHandler = (message: ServerMessage) => void;
 
 export interface WebSocketClient {
@@ -19,13 +24,27 @@ export function createWebSocketClient(
   let ws: WebSocket | null = null;
   let reconnectTimeout: ReturnType<typeof setTimeout> | null = null;
   let isConnected = false;
+  // Position in the server's broadcast stream, so a reconnect only gets what was missed
+  let session: string | null = null;
+  let lastSeq = 0;
+
+  function resumeUrl(): string {
+    if (session === null) {
+      return url;
+    }
+    const resume = new URL(url);
+    resume.searchParams.set('session', session);
+    resume.searchParams.set('seq', String(lastSeq));
+    return resume.toString();
+  }
 
   function connect() {
     try {
-      ws = new WebSocket(url);
+      ws = new WebSocket(resumeUrl(), PROTOCOLS);
+      ws.binaryType = 'arraybuffer';
 
       ws.onopen = () => {
-        console.log('WebSocket connected');
+        console.log(`WebSocket connected (${ws?.protocol || 'json'})`);
         isConnected = true;
         onConnectionChange(true);
       };
@@ -48,7 +67,15 @@ export function createWebSocketClient(
 
       ws.onmessage = (event) => {
         try {
-          const message: ServerMessage = JSON.parse(event.data);
+          const message = (
+            typeof event.data === 'string' ? JSON.parse(event.data) : decodeMsgpack(event.data)
+          ) as ServerMessage;
+          if (message.type === 'notebook_state') {
+            session = message.session;
+            lastSeq = message.seq;
+          } else if (message.seq !== undefined) {
+            lastSeq = message.seq;
+          }
           onMessage(message);
         } catch (error) {
           console.error('Failed to parse message:', error);
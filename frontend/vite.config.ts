@@ -6,6 +6,7 @@ export default defineConfig({
   server: {
     port: 5173,
     proxy: {
+      '/api': 'http://localhost:8000',
       '/ws': {
         target: 'ws://localhost:8000',
         ws: true,